@@ -7,7 +7,7 @@ Fitbit API Library
 :license: BSD, see LICENSE for more details.
 """
 
-from .api import Fitbit, FitbitOauth2Client
+import sys
 
 # Meta.
 
@@ -23,3 +23,15 @@ __release__ = '0.3.1'
 # Module namespace.
 
 all_tests = []
+
+# fitbit.api is only imported on first use of Fitbit or FitbitOauth2Client,
+# which keeps "import fitbit" fast in short lived processes.
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in ('Fitbit', 'FitbitOauth2Client'):
+            from . import api
+            return getattr(api, name)
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name))
+else:
+    from .api import Fitbit, FitbitOauth2Client
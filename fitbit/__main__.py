@@ -0,0 +1,25 @@
+"""
+The command line tools of the library::
+
+    python -m fitbit export --help
+"""
+import argparse
+import sys
+
+
+def main(argv=None):
+    from . import export
+
+    parser = argparse.ArgumentParser(prog='python -m fitbit')
+    commands = parser.add_subparsers(dest='command')
+    export.add_arguments(commands.add_parser(
+        'export', help='export the data of the users in a token store'))
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        return export.command(args)
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,17 @@
 # -*- coding: utf-8 -*-
+import contextlib
 import datetime
+import functools
+import hashlib
 import json
-import requests
+import time
 
-try:
-    from urllib.parse import urlencode
-except ImportError:
-    # Python 2.x
-    from urllib import urlencode
+from . import endpoints, exceptions
+from .utils import atomic_write
 
-from requests.auth import HTTPBasicAuth
-from requests_oauthlib import OAuth2Session
-
-from . import exceptions
-from .compliance import fitbit_compliance_fix
-from .utils import curry
+# requests, requests_oauthlib and oauthlib are slow to import, so they are only
+# imported once a client actually needs them, e.g. when making its first
+# request. That keeps "import fitbit" cheap for short lived processes.
 
 
 class FitbitOauth2Client(object):
@@ -37,6 +34,12 @@ class FitbitOauth2Client(object):
             - client_id, client_secret are in the app configuration page
             https://dev.fitbit.com/apps
             - access_token, refresh_token are obtained after the user grants permission
+            - pool is an optional connection pool shared with other clients,
+              see fitbit.pool.connection_pool
+            - transport optionally sends the requests instead of the
+              requests_oauthlib session, see fitbit.transport
+            - http2=True is a shortcut for an HTTP/2 transport,
+              fitbit.transport.HttpxTransport(http2=True)
         """
 
         self.client_id, self.client_secret = client_id, client_secret
@@ -48,36 +51,151 @@ class FitbitOauth2Client(object):
             })
         if expires_at:
             token['expires_at'] = expires_at
-        self.session = fitbit_compliance_fix(OAuth2Session(
-            client_id,
-            auto_refresh_url=self.refresh_token_url,
-            token_updater=refresh_cb,
-            token=token,
-            redirect_uri=redirect_uri,
-        ))
+        self._token = token
+        self.refresh_cb = refresh_cb
+        self.redirect_uri = redirect_uri
         self.timeout = kwargs.get("timeout", None)
+        self.pool = kwargs.get("pool", None)
+        self.transport = kwargs.get("transport", None)
+        if self.transport is None and kwargs.get("http2"):
+            from .transport import HttpxTransport
+            self.transport = HttpxTransport(http2=True)
+        # The OAuth2Session is built on first use, so that clients which never
+        # make a request (or user handles, see for_user) stay cheap to create.
+        self._session = None
+        self._pool_owner = None
+        # Keys the user of the client, see Fitbit._user_key
+        self.user_key = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            from requests_oauthlib import OAuth2Session
+            from .compliance import fitbit_compliance_fix
+
+            session = fitbit_compliance_fix(OAuth2Session(
+                self.client_id,
+                auto_refresh_url=self.refresh_token_url,
+                token_updater=self.refresh_cb,
+                token=self._token,
+                redirect_uri=self.redirect_uri,
+            ))
+            if self.pool is not None:
+                session.mount('https://', self.pool)
+            elif self._pool_owner is not None:
+                for prefix, adapter in self._pool_owner.session.adapters.items():
+                    session.mount(prefix, adapter)
+            self._session = session
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    @property
+    def token(self):
+        """ The current token, kept by the session once there is one """
+        if self._session is not None:
+            return self._session.token
+        return self._token
+
+    @token.setter
+    def token(self, token):
+        self._token = token
+        if self._session is not None:
+            self._session.token = token
+
+    def for_user(self, access_token, refresh_token, expires_at=None,
+                 refresh_cb=None):
+        """
+        Return a new client for another user with the same app credentials
+        and settings. The new client shares this client's connection pool,
+        so it only carries its own token and is cheap to create.
+        """
+        client = self.__class__.__new__(self.__class__)
+        client.__dict__.update(self.__dict__)
+        client._session = None
+        client._token = {
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        }
+        if expires_at:
+            client._token['expires_at'] = expires_at
+        client.refresh_cb = refresh_cb
+        client._pool_owner = self._pool_owner or self
+        client.user_key = None
+        return client
 
     def _request(self, method, url, **kwargs):
         """
-        A simple wrapper around requests.
+        A simple wrapper around requests, or the transport if there is one.
         """
         if self.timeout is not None and 'timeout' not in kwargs:
             kwargs['timeout'] = self.timeout
 
+        if self.transport is not None:
+            send = self._send
+        else:
+            send = self._session_send
+        response = send(method, url, **kwargs)
+
+        # If our current token has no expires_at, or something manages to slip
+        # through that check
+        if self._expired_token(response):
+            self.refresh_token()
+            response = send(method, url, **kwargs)
+
+        return response
+
+    def _expired_token(self, response):
+        if response.status_code != 401:
+            return False
+        d = json.loads(response.content.decode('utf8'))
+        return d['errors'][0]['errorType'] == 'expired_token'
+
+    def _session_send(self, method, url, **kwargs):
+        import requests
+
         try:
-            response = self.session.request(method, url, **kwargs)
+            return self.session.request(method, url, **kwargs)
+        except requests.Timeout as e:
+            raise exceptions.Timeout(*e.args)
+
+    def _send(self, method, url, data=None, headers=None, timeout=None,
+              **kwargs):
+        """
+        Send a request with the transport, adding the bearer token ourselves
+        and refreshing it first if it is known to have expired, like the
+        requests_oauthlib session does.
+        """
+        return self.transport.send(method, url,
+                                   headers=self._auth_headers(headers),
+                                   data=data, timeout=timeout)
+
+    def _auth_headers(self, headers):
+        token = self.token
+        expires_at = token.get('expires_at')
+        if expires_at and float(expires_at) < time.time():
+            token = self.refresh_token() or token
+        headers = dict(headers or {})
+        if token.get('access_token'):
+            headers['Authorization'] = 'Bearer %s' % token['access_token']
+        return headers
 
-            # If our current token has no expires_at, or something manages to slip
-            # through that check
-            if response.status_code == 401:
-                d = json.loads(response.content.decode('utf8'))
-                if d['errors'][0]['errorType'] == 'expired_token':
-                    self.refresh_token()
-                    response = self.session.request(method, url, **kwargs)
+    @contextlib.contextmanager
+    def _session_stream(self, method, url, **kwargs):
+        import requests
 
-            return response
+        try:
+            response = self.session.request(method, url, stream=True,
+                                            **kwargs)
         except requests.Timeout as e:
             raise exceptions.Timeout(*e.args)
+        response.iter_bytes = response.iter_content
+        try:
+            yield response
+        finally:
+            response.close()
 
     def make_request(self, url, data=None, method=None, **kwargs):
         """
@@ -100,6 +218,39 @@ class FitbitOauth2Client(object):
 
         return response
 
+    @contextlib.contextmanager
+    def stream(self, url, data=None, method=None, headers=None, timeout=None):
+        """
+        Like make_request, but gives the response before its body is read, to
+        read it in chunks with ``iter_bytes(chunk_size)``
+        """
+        from .transport import Response
+
+        data = data or {}
+        method = method or ('POST' if data else 'GET')
+        if timeout is None:
+            timeout = self.timeout
+        for retry in (False, True):
+            if self.transport is not None:
+                stream = self.transport.stream(
+                    method, url, headers=self._auth_headers(headers),
+                    data=data, timeout=timeout)
+            else:
+                stream = self._session_stream(
+                    method, url, headers=headers, data=data, timeout=timeout)
+            with stream as response:
+                if response.status_code < 400:
+                    yield response
+                    return
+                # Errors are read whole, to be raised like make_request does
+                response = Response(response.status_code,
+                                    b''.join(response.iter_bytes()),
+                                    response.headers)
+            if retry or not self._expired_token(response):
+                break
+            self.refresh_token()
+        exceptions.detect_and_raise_error(response)
+
     def authorize_token_url(self, scope=None, redirect_uri=None, **kwargs):
         """Step 1: Return the URL the user needs to go to in order to grant us
         authorization to look at their data.  Then redirect the user to that
@@ -151,6 +302,8 @@ class FitbitOauth2Client(object):
         obtained in step 2. Only do the refresh if there is `token_updater(),`
         which saves the token.
         """
+        from requests.auth import HTTPBasicAuth
+
         token = {}
         if self.session.token_updater:
             token = self.session.refresh_token(
@@ -211,11 +364,39 @@ class Fitbit(object):
 
     def __init__(self, client_id, client_secret, access_token=None,
             refresh_token=None, expires_at=None, refresh_cb=None,
-            redirect_uri=None, system=US, **kwargs):
+            redirect_uri=None, system=US, coalesce=None, token_store=None,
+            rate_limiter=None, cache=None, raw=False, **kwargs):
         """
         Fitbit(<id>, <secret>, access_token=<token>, refresh_token=<token>)
+
+        Pass ``coalesce=True`` to make identical GET requests which are in
+        flight at the same time (from several threads) share one request, or
+        pass a ``fitbit.coalesce.RequestCoalescer`` to share that between
+        several Fitbit objects.
+
+        Pass a ``fitbit.tokens.TokenStore`` as ``token_store`` to get the
+        tokens of users by user id, with ``for_stored_user``.
+
+        Pass a ``fitbit.ratelimit.RateLimiter`` as ``rate_limiter`` to make
+        requests wait until the rate limit allows them.
+
+        Pass a ``fitbit.cache.ResponseCache`` as ``cache`` to answer repeated
+        GET requests of cacheable endpoints from it.
+
+        Pass ``raw=True`` to get responses undecoded, as
+        ``fitbit.transport.Response`` objects with the ``status_code``,
+        ``headers`` and ``content`` bytes, see ``make_request``.
         """
         self.system = system
+        self.raw = raw
+        self.token_store = token_store
+        self.rate_limiter = rate_limiter
+        self.rate_limit_key = None
+        self.cache = cache
+        if coalesce is True:
+            from .coalesce import RequestCoalescer
+            coalesce = RequestCoalescer()
+        self.coalesce = coalesce or None
         self.client = FitbitOauth2Client(
             client_id,
             client_secret,
@@ -227,34 +408,211 @@ class Fitbit(object):
             **kwargs
         )
 
-        # All of these use the same patterns, define the method for accessing
-        # creating and deleting records once, and use curry to make individual
-        # Methods for each
-        for resource in Fitbit.RESOURCE_LIST:
-            underscore_resource = resource.replace('/', '_')
-            setattr(self, underscore_resource,
-                    curry(self._COLLECTION_RESOURCE, resource))
+    def for_user(self, access_token, refresh_token, expires_at=None,
+                 refresh_cb=None):
+        """
+        Return a Fitbit object for another already authorized user, sharing
+        this object's app credentials, settings and connection pool. This is
+        much cheaper than creating a new Fitbit object per user, which makes
+        it suitable for services handling many users at once.
+        """
+        handle = self.__class__.__new__(self.__class__)
+        handle.__dict__.update(self.__dict__)
+        handle.rate_limit_key = None
+        handle.client = self.client.for_user(
+            access_token,
+            refresh_token,
+            expires_at=expires_at,
+            refresh_cb=refresh_cb
+        )
+        return handle
+
+    def with_raw(self, raw=True):
+        """
+        Return a Fitbit object for the same user, sharing everything with
+        this one, whose methods return raw responses (or not, if raw is
+        False)
+        """
+        handle = self.__class__.__new__(self.__class__)
+        handle.__dict__.update(self.__dict__)
+        handle.raw = raw
+        return handle
 
-            if resource not in ['body', 'glucose']:
-                # Body and Glucose entries are not currently able to be deleted
-                setattr(self, 'delete_%s' % underscore_resource, curry(
-                    self._DELETE_COLLECTION_RESOURCE, resource))
+    def for_stored_user(self, user_id, token=None):
+        """
+        Return a Fitbit object for a user whose token is in the token store,
+        like ``for_user``. Refreshed tokens are saved back to the store.
+        """
+        if token is None:
+            token = self.token_store.get(user_id)
+            if token is None:
+                raise KeyError('No token stored for user %s' % user_id)
+        handle = self.for_user(
+            token['access_token'],
+            token['refresh_token'],
+            expires_at=token.get('expires_at'),
+            refresh_cb=functools.partial(self.token_store.set, user_id)
+        )
+        handle.rate_limit_key = user_id
+        return handle
 
-        for qualifier in Fitbit.QUALIFIERS:
-            setattr(self, '%s_activities' % qualifier, curry(self.activity_stats, qualifier=qualifier))
-            setattr(self, '%s_foods' % qualifier, curry(self._food_stats,
-                                                        qualifier=qualifier))
+    def for_stored_users(self, user_ids=None):
+        """
+        Return a dict of user ids to Fitbit objects, for the given users or
+        for all users in the token store, loading their tokens at once.
+        """
+        tokens = self.token_store.get_many(user_ids)
+        return dict((user_id, self.for_stored_user(user_id, token))
+                    for user_id, token in tokens.items())
 
     def make_request(self, *args, **kwargs):
+        """
+        Make a request, and return its decoded JSON response. With
+        ``raw=True`` (or if the object was created with it), return the
+        response as a ``fitbit.transport.Response`` instead, without decoding
+        it nor going through the cache or coalescing. Errors are raised
+        either way.
+        """
         # This should handle data level errors, improper requests, and bad
         # serialization
         headers = kwargs.get('headers', {})
         headers.update({'Accept-Language': self.system})
         kwargs['headers'] = headers
+        raw = kwargs.pop('raw', self.raw)
 
         method = kwargs.get('method', 'POST' if 'data' in kwargs else 'GET')
-        response = self.client.make_request(*args, **kwargs)
+        if self.coalesce is None and self.cache is None:
+            return self._make_request(method, args, kwargs, raw)
+        if raw or not self._is_get(args, kwargs):
+            if self.cache is None or self._is_get(args, kwargs):
+                return self._make_request(method, args, kwargs, raw)
+            try:
+                return self._make_request(method, args, kwargs, raw)
+            finally:
+                # Even failed writes may have been made
+                self._invalidate_stale(args, kwargs)
+
+        if self.cache is not None:
+            user = self._user_key()
+            try:
+                return self.cache.get(user, args[0], self.system)
+            except KeyError:
+                pass
+        if self.coalesce is not None:
+            key = (
+                args[0],
+                self.client.token.get('access_token'),
+                tuple(sorted(headers.items())),
+            )
+            response = self.coalesce.call(key, self._make_request, method,
+                                          args, kwargs)
+        else:
+            response = self._make_request(method, args, kwargs)
+        if self.cache is not None:
+            endpoint, _ = endpoints.match('GET', args[0])
+            if endpoint is not None and endpoint.cacheable:
+                self.cache.set(user, args[0], self.system, response)
+        return response
+
+    def stream_to_file(self, url, target, data=None, method=None,
+                       chunk_size=65536):
+        """
+        Make a request, and write its response body to target, a file object
+        or a path (written atomically), without holding it all in memory.
+        Errors are raised like with make_request. Returns a
+        ``fitbit.transport.Response`` with the ``status_code`` and
+        ``headers``, no content, and the number of bytes written as ``size``.
+        """
+        from .transport import Response
 
+        headers = {'Accept-Language': self.system}
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(self._user_key())
+        try:
+            with self.client.stream(url, data=data, method=method,
+                                    headers=headers) as response:
+                if hasattr(target, 'write'):
+                    size = self._write_chunks(response, target, chunk_size)
+                else:
+                    # Removed on errors, e.g. a timeout mid-body
+                    with atomic_write(target, 'wb') as f:
+                        size = self._write_chunks(response, f, chunk_size)
+        except exceptions.HTTPTooManyRequests as e:
+            if self.rate_limiter is not None:
+                self.rate_limiter.block(self._user_key(),
+                                        e.retry_after_secs)
+            raise
+        finally:
+            if (self.cache is not None and
+                    (method or ('POST' if data else 'GET')) != 'GET'):
+                self._invalidate_stale((url, data), {'method': method})
+        result = Response(response.status_code, b'', dict(response.headers))
+        result.size = size
+        return result
+
+    def _write_chunks(self, response, f, chunk_size):
+        size = 0
+        for chunk in response.iter_bytes(chunk_size):
+            f.write(chunk)
+            size += len(chunk)
+        return size
+
+    def _user_key(self):
+        """
+        The key of this handle's user in the rate limiter and the cache: the
+        user id of stored users, otherwise a hash of the first access token
+        the client used, which is kept when the token is refreshed, or None
+        without a token
+        """
+        if self.rate_limit_key is not None:
+            return self.rate_limit_key
+        if self.client.user_key is None:
+            access_token = self.client.token.get('access_token')
+            if access_token is None:
+                return None
+            self.client.user_key = 'token:%s' % hashlib.sha1(
+                access_token.encode('utf8')).hexdigest()
+        return self.client.user_key
+
+    def _invalidate_stale(self, args, kwargs):
+        from .cache import stale_reads
+
+        data = kwargs.get('data', args[1] if len(args) > 1 else None)
+        method = kwargs.get('method') or ('POST' if data else 'GET')
+        match = stale_reads(method, args[0], data)
+        if match is not None:
+            self.cache.invalidate(self._user_key(), match)
+
+    def invalidate_cache(self, match=None):
+        """
+        Evict this user's cached responses, all of them, or those whose URL
+        ``match(url)`` is true
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self._user_key(), match)
+
+    def _is_get(self, args, kwargs):
+        # Mirrors how FitbitOauth2Client.make_request picks the method
+        data = kwargs.get('data', args[1] if len(args) > 1 else None)
+        return (len(args) <= 2 and
+                (kwargs.get('method') or ('POST' if data else 'GET')) == 'GET')
+
+    def _make_request(self, method, args, kwargs, raw=False):
+        if self.rate_limiter is None:
+            response = self.client.make_request(*args, **kwargs)
+        else:
+            self.rate_limiter.wait(self._user_key())
+            try:
+                response = self.client.make_request(*args, **kwargs)
+            except exceptions.HTTPTooManyRequests as e:
+                self.rate_limiter.block(self._user_key(),
+                                        e.retry_after_secs)
+                raise
+
+        if raw:
+            from .transport import Response
+            return Response(response.status_code, response.content,
+                            dict(response.headers))
         if response.status_code == 202:
             return True
         if method == 'DELETE':
@@ -281,7 +639,7 @@ class Fitbit(object):
 
         https://dev.fitbit.com/docs/user/
         """
-        url = "{0}/{1}/user/{2}/profile.json".format(*self._get_common_args(user_id))
+        url = self._url('user_profile_get', user_id)
         return self.make_request(url)
 
     def user_profile_update(self, data):
@@ -295,15 +653,17 @@ class Fitbit(object):
 
         https://dev.fitbit.com/docs/user/#update-profile
         """
-        url = "{0}/{1}/user/-/profile.json".format(*self._get_common_args())
+        url = self._url('user_profile_update')
         return self.make_request(url, data)
 
-    def _get_common_args(self, user_id=None):
-        common_args = (self.API_ENDPOINT, self.API_VERSION,)
-        if not user_id:
-            user_id = '-'
-        common_args += (user_id,)
-        return common_args
+    def _url(self, name, user_id=None, **kwargs):
+        """
+        Build the URL of the named endpoint in fitbit.endpoints, for the
+        given user (defaults to the current user, ``-``)
+        """
+        kwargs['user_id'] = user_id or '-'
+        return endpoints.BY_NAME[name].url(
+            self.API_ENDPOINT, self.API_VERSION, kwargs)
 
     def _get_date_string(self, date):
         if not isinstance(date, str):
@@ -338,13 +698,12 @@ class Fitbit(object):
             date = datetime.date.today()
         date_string = self._get_date_string(date)
 
-        kwargs = {'resource': resource, 'date': date_string}
         if not data:
-            base_url = "{0}/{1}/user/{2}/{resource}/date/{date}.json"
+            url = self._url('collection', user_id, resource=resource,
+                            date=date_string)
         else:
             data['date'] = date_string
-            base_url = "{0}/{1}/user/{2}/{resource}.json"
-        url = base_url.format(*self._get_common_args(user_id), **kwargs)
+            url = self._url('log_collection', user_id, resource=resource)
         return self.make_request(url, data)
 
     def _DELETE_COLLECTION_RESOURCE(self, resource, log_id):
@@ -366,18 +725,14 @@ class Fitbit(object):
             delete_bp(log_id)
 
         """
-        url = "{0}/{1}/user/-/{resource}/{log_id}.json".format(
-            *self._get_common_args(),
-            resource=resource,
-            log_id=log_id
-        )
+        url = self._url('delete_collection', resource=resource, log_id=log_id)
         response = self.make_request(url, method='DELETE')
         return response
 
     def _resource_goal(self, resource, data={}, period=None):
         """ Handles GETting and POSTing resource goals of all types """
-        url = "{0}/{1}/user/-/{resource}/goal{postfix}.json".format(
-            *self._get_common_args(),
+        url = self._url(
+            'update_resource_goal' if data else 'resource_goal',
             resource=resource,
             postfix=('s/' + period) if period else ''
         )
@@ -539,8 +894,9 @@ class Fitbit(object):
                                  % ','.join(Fitbit.PERIODS))
             end = period
 
-        url = "{0}/{1}/user/{2}/{resource}/date/{base_date}/{end}.json".format(
-            *self._get_common_args(user_id),
+        url = self._url(
+            'time_series',
+            user_id,
             resource=resource,
             base_date=self._get_date_string(base_date),
             end=end
@@ -572,22 +928,22 @@ class Fitbit(object):
         if not detail_level in ['1sec', '1min', '15min']:
             raise ValueError("Period must be either '1sec', '1min', or '15min'")
 
-        url = "{0}/{1}/user/-/{resource}/date/{base_date}/1d/{detail_level}".format(
-            *self._get_common_args(),
-            resource=resource,
-            base_date=self._get_date_string(base_date),
-            detail_level=detail_level
-        )
-
+        time_range = ''
         if all(time_map):
-            url = url + '/time'
+            time_range = '/time'
             for time in [start_time, end_time]:
                 time_str = time
                 if not isinstance(time_str, str):
                     time_str = time.strftime('%H:%M')
-                url = url + ('/%s' % (time_str))
+                time_range = time_range + ('/%s' % (time_str))
 
-        url = url + '.json'
+        url = self._url(
+            'intraday_time_series',
+            resource=resource,
+            base_date=self._get_date_string(base_date),
+            detail_level=detail_level,
+            time_range=time_range
+        )
 
         return self.make_request(url)
 
@@ -613,10 +969,7 @@ class Fitbit(object):
         else:
             qualifier = ''
 
-        url = "{0}/{1}/user/{2}/activities{qualifier}.json".format(
-            *self._get_common_args(user_id),
-            qualifier=qualifier
-        )
+        url = self._url('activity_stats', user_id, qualifier=qualifier)
         return self.make_request(url)
 
     def _food_stats(self, user_id=None, qualifier=''):
@@ -631,88 +984,70 @@ class Fitbit(object):
         * https://dev.fitbit.com/docs/food-logging/#get-frequent-foods
         * https://dev.fitbit.com/docs/food-logging/#get-recent-foods
         """
-        url = "{0}/{1}/user/{2}/foods/log/{qualifier}.json".format(
-            *self._get_common_args(user_id),
-            qualifier=qualifier
-        )
+        url = self._url('food_stats', user_id, qualifier=qualifier)
         return self.make_request(url)
 
     def add_favorite_activity(self, activity_id):
         """
         https://dev.fitbit.com/docs/activity/#add-favorite-activity
         """
-        url = "{0}/{1}/user/-/activities/favorite/{activity_id}.json".format(
-            *self._get_common_args(),
-            activity_id=activity_id
-        )
+        url = self._url('add_favorite_activity', activity_id=activity_id)
         return self.make_request(url, method='POST')
 
     def log_activity(self, data):
         """
         https://dev.fitbit.com/docs/activity/#log-activity
         """
-        url = "{0}/{1}/user/-/activities.json".format(*self._get_common_args())
+        url = self._url('log_activity')
         return self.make_request(url, data=data)
 
     def delete_favorite_activity(self, activity_id):
         """
         https://dev.fitbit.com/docs/activity/#delete-favorite-activity
         """
-        url = "{0}/{1}/user/-/activities/favorite/{activity_id}.json".format(
-            *self._get_common_args(),
-            activity_id=activity_id
-        )
+        url = self._url('delete_favorite_activity', activity_id=activity_id)
         return self.make_request(url, method='DELETE')
 
     def add_favorite_food(self, food_id):
         """
         https://dev.fitbit.com/docs/food-logging/#add-favorite-food
         """
-        url = "{0}/{1}/user/-/foods/log/favorite/{food_id}.json".format(
-            *self._get_common_args(),
-            food_id=food_id
-        )
+        url = self._url('add_favorite_food', food_id=food_id)
         return self.make_request(url, method='POST')
 
     def delete_favorite_food(self, food_id):
         """
         https://dev.fitbit.com/docs/food-logging/#delete-favorite-food
         """
-        url = "{0}/{1}/user/-/foods/log/favorite/{food_id}.json".format(
-            *self._get_common_args(),
-            food_id=food_id
-        )
+        url = self._url('delete_favorite_food', food_id=food_id)
         return self.make_request(url, method='DELETE')
 
     def create_food(self, data):
         """
         https://dev.fitbit.com/docs/food-logging/#create-food
         """
-        url = "{0}/{1}/user/-/foods.json".format(*self._get_common_args())
+        url = self._url('create_food')
         return self.make_request(url, data=data)
 
     def get_meals(self):
         """
         https://dev.fitbit.com/docs/food-logging/#get-meals
         """
-        url = "{0}/{1}/user/-/meals.json".format(*self._get_common_args())
+        url = self._url('get_meals')
         return self.make_request(url)
 
     def get_devices(self):
         """
 		https://dev.fitbit.com/docs/devices/#get-devices
         """
-        url = "{0}/{1}/user/-/devices.json".format(*self._get_common_args())
+        url = self._url('get_devices')
         return self.make_request(url)
 
     def get_alarms(self, device_id):
         """
         https://dev.fitbit.com/docs/devices/#get-alarms
         """
-        url = "{0}/{1}/user/-/devices/tracker/{device_id}/alarms.json".format(
-            *self._get_common_args(),
-            device_id=device_id
-        )
+        url = self._url('get_alarms', device_id=device_id)
         return self.make_request(url)
 
     def add_alarm(self, device_id, alarm_time, week_days, recurring=False,
@@ -722,10 +1057,7 @@ class Fitbit(object):
         https://dev.fitbit.com/docs/devices/#add-alarm
         alarm_time should be a timezone aware datetime object.
         """
-        url = "{0}/{1}/user/-/devices/tracker/{device_id}/alarms.json".format(
-            *self._get_common_args(),
-            device_id=device_id
-        )
+        url = self._url('add_alarm', device_id=device_id)
         alarm_time = alarm_time.strftime("%H:%M%z")
         # Check week_days list
         if not isinstance(week_days, list):
@@ -762,11 +1094,7 @@ class Fitbit(object):
         for day in week_days:
             if day not in self.WEEK_DAYS:
                 raise ValueError("Incorrect week day %s. see WEEK_DAY_LIST." % day)
-        url = "{0}/{1}/user/-/devices/tracker/{device_id}/alarms/{alarm_id}.json".format(
-            *self._get_common_args(),
-            device_id=device_id,
-            alarm_id=alarm_id
-        )
+        url = self._url('update_alarm', device_id=device_id, alarm_id=alarm_id)
         alarm_time = alarm_time.strftime("%H:%M%z")
 
         data = {
@@ -789,11 +1117,7 @@ class Fitbit(object):
         """
         https://dev.fitbit.com/docs/devices/#delete-alarm
         """
-        url = "{0}/{1}/user/-/devices/tracker/{device_id}/alarms/{alarm_id}.json".format(
-            *self._get_common_args(),
-            device_id=device_id,
-            alarm_id=alarm_id
-        )
+        url = self._url('delete_alarm', device_id=device_id, alarm_id=alarm_id)
         return self.make_request(url, method="DELETE")
 
     def get_sleep(self, date):
@@ -801,11 +1125,9 @@ class Fitbit(object):
         https://dev.fitbit.com/docs/sleep/#get-sleep-logs
         date should be a datetime.date object.
         """
-        url = "{0}/{1}/user/-/sleep/date/{year}-{month}-{day}.json".format(
-            *self._get_common_args(),
-            year=date.year,
-            month=date.month,
-            day=date.day
+        url = self._url(
+            'get_sleep',
+            date='%s-%s-%s' % (date.year, date.month, date.day)
         )
         return self.make_request(url)
 
@@ -819,51 +1141,48 @@ class Fitbit(object):
             'duration': duration,
             'date': start_time.strftime("%Y-%m-%d"),
         }
-        url = "{0}/{1}/user/-/sleep.json".format(*self._get_common_args())
+        url = self._url('log_sleep')
         return self.make_request(url, data=data, method="POST")
 
     def activities_list(self):
         """
         https://dev.fitbit.com/docs/activity/#browse-activity-types
         """
-        url = "{0}/{1}/activities.json".format(*self._get_common_args())
+        url = self._url('activities_list')
         return self.make_request(url)
 
     def activity_detail(self, activity_id):
         """
         https://dev.fitbit.com/docs/activity/#get-activity-type
         """
-        url = "{0}/{1}/activities/{activity_id}.json".format(
-            *self._get_common_args(),
-            activity_id=activity_id
-        )
+        url = self._url('activity_detail', activity_id=activity_id)
         return self.make_request(url)
 
     def search_foods(self, query):
         """
         https://dev.fitbit.com/docs/food-logging/#search-foods
         """
-        url = "{0}/{1}/foods/search.json?{encoded_query}".format(
-            *self._get_common_args(),
-            encoded_query=urlencode({'query': query})
-        )
+        try:
+            from urllib.parse import urlencode
+        except ImportError:
+            # Python 2.x
+            from urllib import urlencode
+
+        url = self._url('search_foods', query=urlencode({'query': query}))
         return self.make_request(url)
 
     def food_detail(self, food_id):
         """
         https://dev.fitbit.com/docs/food-logging/#get-food
         """
-        url = "{0}/{1}/foods/{food_id}.json".format(
-            *self._get_common_args(),
-            food_id=food_id
-        )
+        url = self._url('food_detail', food_id=food_id)
         return self.make_request(url)
 
     def food_units(self):
         """
         https://dev.fitbit.com/docs/food-logging/#get-food-units
         """
-        url = "{0}/{1}/foods/units.json".format(*self._get_common_args())
+        url = self._url('food_units')
         return self.make_request(url)
 
     def get_bodyweight(self, base_date=None, user_id=None, period=None, end_date=None):
@@ -898,27 +1217,26 @@ class Fitbit(object):
 
         base_date_string = self._get_date_string(base_date)
 
-        kwargs = {'type_': type_}
-        base_url = "{0}/{1}/user/{2}/body/log/{type_}/date/{date_string}.json"
         if period:
             if not period in Fitbit.PERIODS:
                 raise ValueError("Period must be one of %s" %
                                  ','.join(Fitbit.PERIODS))
-            kwargs['date_string'] = '/'.join([base_date_string, period])
+            date_string = '/'.join([base_date_string, period])
         elif end_date:
             end_string = self._get_date_string(end_date)
-            kwargs['date_string'] = '/'.join([base_date_string, end_string])
+            date_string = '/'.join([base_date_string, end_string])
         else:
-            kwargs['date_string'] = base_date_string
+            date_string = base_date_string
 
-        url = base_url.format(*self._get_common_args(user_id), **kwargs)
+        url = self._url('body_log', user_id, type_=type_,
+                        date_string=date_string)
         return self.make_request(url)
 
     def get_friends(self, user_id=None):
         """
         https://dev.fitbit.com/docs/friends/#get-friends
         """
-        url = "{0}/{1}/user/{2}/friends.json".format(*self._get_common_args(user_id))
+        url = self._url('get_friends', user_id)
         return self.make_request(url)
 
     def get_friends_leaderboard(self, period):
@@ -927,17 +1245,14 @@ class Fitbit(object):
         """
         if not period in ['7d', '30d']:
             raise ValueError("Period must be one of '7d', '30d'")
-        url = "{0}/{1}/user/-/friends/leaders/{period}.json".format(
-            *self._get_common_args(),
-            period=period
-        )
+        url = self._url('get_friends_leaderboard', period=period)
         return self.make_request(url)
 
     def invite_friend(self, data):
         """
         https://dev.fitbit.com/docs/friends/#invite-friend
         """
-        url = "{0}/{1}/user/-/friends/invitations.json".format(*self._get_common_args())
+        url = self._url('invite_friend')
         return self.make_request(url, data=data)
 
     def invite_friend_by_email(self, email):
@@ -958,10 +1273,7 @@ class Fitbit(object):
         """
         https://dev.fitbit.com/docs/friends/#respond-to-friend-invitation
         """
-        url = "{0}/{1}/user/-/friends/invitations/{user_id}.json".format(
-            *self._get_common_args(),
-            user_id=other_user_id
-        )
+        url = self._url('respond_to_invite', other_user_id=other_user_id)
         accept = 'true' if accept else 'false'
         return self.make_request(url, data={'accept': accept})
 
@@ -981,7 +1293,7 @@ class Fitbit(object):
         """
         https://dev.fitbit.com/docs/friends/#badges
         """
-        url = "{0}/{1}/user/{2}/badges.json".format(*self._get_common_args(user_id))
+        url = self._url('get_badges', user_id)
         return self.make_request(url)
 
     def subscription(self, subscription_id, subscriber_id, collection=None,
@@ -989,15 +1301,14 @@ class Fitbit(object):
         """
         https://dev.fitbit.com/docs/subscriptions/
         """
-        base_url = "{0}/{1}/user/-{collection}/apiSubscriptions/{end_string}.json"
-        kwargs = {'collection': '', 'end_string': subscription_id}
+        kwargs = {'collection': '', 'subscription_id': subscription_id}
         if collection:
             kwargs = {
-                'end_string': '-'.join([subscription_id, collection]),
+                'subscription_id': '-'.join([subscription_id, collection]),
                 'collection': '/' + collection
             }
         return self.make_request(
-            base_url.format(*self._get_common_args(), **kwargs),
+            self._url('subscription', **kwargs),
             method=method,
             headers={"X-Fitbit-Subscriber-id": subscriber_id}
         )
@@ -1006,8 +1317,52 @@ class Fitbit(object):
         """
         https://dev.fitbit.com/docs/subscriptions/#getting-a-list-of-subscriptions
         """
-        url = "{0}/{1}/user/-{collection}/apiSubscriptions.json".format(
-            *self._get_common_args(),
+        url = self._url(
+            'list_subscriptions',
             collection='/{0}'.format(collection) if collection else ''
         )
         return self.make_request(url)
+
+
+def _collection_resource_method(resource):
+    def method(self, *args, **kwargs):
+        return self._COLLECTION_RESOURCE(resource, *args, **kwargs)
+    method.__name__ = resource.replace('/', '_')
+    return method
+
+
+def _delete_collection_resource_method(resource):
+    def method(self, *args, **kwargs):
+        return self._DELETE_COLLECTION_RESOURCE(resource, *args, **kwargs)
+    method.__name__ = 'delete_%s' % resource.replace('/', '_')
+    return method
+
+
+def _qualified_method(name, target, qualifier):
+    def method(self, *args, **kwargs):
+        return getattr(self, target)(*args, **dict({'qualifier': qualifier}, **kwargs))
+    method.__name__ = name
+    return method
+
+
+def _add_resource_methods(cls):
+    # All of these use the same patterns, define the method for accessing
+    # creating and deleting records once, and generate individual methods for
+    # each on the class, so creating a Fitbit object doesn't have to.
+    for resource in cls.RESOURCE_LIST:
+        underscore_resource = resource.replace('/', '_')
+        setattr(cls, underscore_resource, _collection_resource_method(resource))
+
+        if resource not in ['body', 'glucose']:
+            # Body and Glucose entries are not currently able to be deleted
+            setattr(cls, 'delete_%s' % underscore_resource,
+                    _delete_collection_resource_method(resource))
+
+    for qualifier in cls.QUALIFIERS:
+        for name, target in [('%s_activities', 'activity_stats'),
+                             ('%s_foods', '_food_stats')]:
+            name = name % qualifier
+            setattr(cls, name, _qualified_method(name, target, qualifier))
+
+
+_add_resource_methods(Fitbit)
@@ -0,0 +1,140 @@
+"""
+A write-behind buffer for frequent water and food logs.
+
+An app logging water every few minutes doesn't need a POST per sip. A
+:class:`LogBuffer` collects the logs, adds up the amounts of the logs of the
+same user, date and unit (or food, meal and unit), and sends the totals from
+a background thread, every ``interval`` seconds or once ``max_entries``
+totals are waiting::
+
+    buffer = LogBuffer(interval=30)
+    buffer.add(fitbit, 'foods/log/water', {'amount': 250, 'unit': 'ml'})
+    ...
+    buffer.close()
+
+The totals are written through ``Fitbit.make_request``, which evicts the
+cached reads they make stale (see ``fitbit.cache``). The waiting logs are sent at interpreter
+exit, but call ``close`` when shutting down to be sure they are, and to see
+any error.
+"""
+import atexit
+import collections
+import datetime
+import threading
+
+from . import exceptions
+from .bulk import user_key
+
+RESOURCES = ('foods/log/water', 'foods/log')
+
+# Sending again after these errors may work
+RETRY_ERRORS = (exceptions.Timeout, exceptions.HTTPServerError,
+                exceptions.HTTPTooManyRequests)
+
+
+def _amount(amount):
+    return int(amount) if amount == int(amount) else amount
+
+
+class LogBuffer(object):
+    """
+    Collects water and food logs, and sends their totals in the background.
+
+        - interval: how often the totals are sent, in seconds
+        - max_entries: send as soon as this many totals are waiting
+
+    Logs which the API refused (other than for timeouts, server errors or
+    rate limits, which are retried) are kept in ``failed`` as
+    ``(fitbit, resource, date, data, error)`` tuples.
+    """
+
+    def __init__(self, interval=30, max_entries=100):
+        self.interval = interval
+        self.max_entries = max_entries
+        # (user, resource, date, other fields) -> [fitbit, amount]
+        self.pending = collections.OrderedDict()
+        self.failed = []
+        self.lock = threading.Lock()
+        # Held while totals are sent, so flush waits for them
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def add(self, fitbit, resource, data, date=None):
+        """
+        Log data in the collection resource, foods/log/water or foods/log,
+        on date (default the date in data, or today), like
+        ``fitbit.foods_log_water(date, data=data)``
+        """
+        if resource not in RESOURCES:
+            raise ValueError('Logs of %s can not be buffered' % resource)
+        if self.closed:
+            raise ValueError('The buffer is closed')
+        data = dict(data)
+        date = fitbit._get_date_string(
+            date or data.get('date') or datetime.date.today())
+        data.pop('date', None)
+        amount = float(data.pop('amount'))
+        key = (user_key(fitbit), resource, date, tuple(sorted(data.items())))
+        with self.lock:
+            total = self.pending.get(key)
+            if total is None:
+                self.pending[key] = [fitbit, amount]
+            else:
+                total[0] = fitbit
+                total[1] += amount
+            full = len(self.pending) >= self.max_entries
+        if full:
+            self.wakeup.set()
+
+    def _add_total(self, key, fitbit, amount):
+        with self.lock:
+            total = self.pending.setdefault(key, [fitbit, 0])
+            total[1] += amount
+
+    def flush(self):
+        """
+        Send the totals waiting now. Totals which failed with an error worth
+        retrying are kept for the next flush, and the first such error is
+        raised.
+        """
+        error = None
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, collections.OrderedDict()
+            for key, (fitbit, amount) in batch.items():
+                _, resource, date, fields = key
+                data = dict(fields, amount=_amount(amount))
+                try:
+                    fitbit._COLLECTION_RESOURCE(resource, date=date, data=data)
+                except RETRY_ERRORS as e:
+                    self._add_total(key, fitbit, amount)
+                    error = error or e
+                except Exception as e:
+                    self.failed.append((fitbit, resource, date, data, e))
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Retried with the next flush
+                pass
+
+    def close(self):
+        """ Stop the background thread, and send the waiting totals """
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        atexit.unregister(self.flush)
+        self.flush()
@@ -0,0 +1,194 @@
+"""
+Bulk writes, e.g. to import the history of logs kept by another app.
+
+A :class:`BulkWriter` takes an iterable of entries, each a call of a write
+method (``log_activity``, ``foods_log``, ``foods_log_water``, ``body``,
+``log_sleep``, ...) on a user's ``Fitbit`` handle, and makes the calls with
+bounded concurrency. It yields a :class:`Result` per entry as it finishes,
+and carries on past failures::
+
+    writer = BulkWriter(max_workers=16)
+    entries = (entry(fitbit, 'log_activity', data) for data in activities)
+    for result in writer.write(entries):
+        if result.error is not None:
+            failed.append(result.entry)
+
+The calls of each user are made one at a time, in the order of the entries,
+so the user's daily totals are updated consistently. Calls of different
+users run concurrently. Pass a ``rate_limiter`` to ``Fitbit`` to keep the
+writes within the rate limit.
+
+:func:`delete_logs` deletes many logs of a collection at once, given their
+ids or a date range, e.g. to clean up after a bad import::
+
+    report = delete_logs(fitbit, 'activities', start='2017-01-01',
+                         end='2017-01-31')
+    failed = [log_id for log_id, error in report.items() if error]
+"""
+import collections
+import datetime
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .utils import to_date
+
+# By collection: the key of the logs in the collection's GET response
+LOG_KEYS = {
+    'activities': 'activities',
+    'foods/log': 'foods',
+    'foods/log/water': 'water',
+    'sleep': 'sleep',
+    'heart': 'heart',
+    'bp': 'bp',
+}
+
+Entry = collections.namedtuple('Entry', ['fitbit', 'method', 'args', 'kwargs'])
+
+# The outcome of an entry: the logId of the created log, if any, the decoded
+# response, and the exception raised, or None
+Result = collections.namedtuple(
+    'Result', ['entry', 'log_id', 'response', 'error'])
+
+
+def entry(fitbit, method, *args, **kwargs):
+    """ An entry calling ``getattr(fitbit, method)(*args, **kwargs)`` """
+    return Entry(fitbit, method, args, kwargs)
+
+
+def log_id(response):
+    """
+    Return the logId of the log a write created, e.g. from
+    ``{"activityLog": {"logId": 123, ...}}``
+    """
+    if isinstance(response, dict):
+        for value in response.values():
+            if isinstance(value, dict) and 'logId' in value:
+                return value['logId']
+    return None
+
+
+def user_key(fitbit):
+    """ The key calls are ordered by, the one the rate limiter counts by """
+    key = fitbit._user_key()
+    if key is not None:
+        return key
+    return id(fitbit)
+
+
+def call(entry):
+    """ Make the call of an entry, returning its Result """
+    try:
+        response = getattr(entry.fitbit, entry.method)(
+            *entry.args, **entry.kwargs)
+    except Exception as e:
+        return Result(entry, None, None, e)
+    return Result(entry, log_id(response), response, None)
+
+
+class BulkWriter(object):
+    """
+    Makes many write calls concurrently, in order per user.
+
+        - max_workers: the most calls made at once
+        - max_pending: the most entries read ahead of the results
+        - call: the function making the call of an entry, returning its
+          Result
+    """
+
+    def __init__(self, max_workers=8, max_pending=1000, call=call):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self.call = call
+
+    def write(self, entries):
+        """
+        Make the calls of the entries. Yields a Result per entry, in the
+        order they finish.
+        """
+        entries = iter(entries)
+        exhausted = False
+        # The users with a call in flight, and their entries waiting for it
+        waiting = {}
+        futures = {}
+        pending = 0
+        executor = ThreadPoolExecutor(self.max_workers)
+        try:
+            while True:
+                while not exhausted and pending < self.max_pending:
+                    try:
+                        item = next(entries)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending += 1
+                    key = user_key(item.fitbit)
+                    if key in waiting:
+                        waiting[key].append(item)
+                    else:
+                        waiting[key] = collections.deque()
+                        futures[executor.submit(self.call, item)] = key
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures.pop(future)
+                    if waiting[key]:
+                        item = waiting[key].popleft()
+                        futures[executor.submit(self.call, item)] = key
+                    else:
+                        del waiting[key]
+                    pending -= 1
+                    yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+
+
+def find_logs(fitbit, resource, start, end, predicate=None, max_workers=8):
+    """
+    Return the ids of the logs of a collection resource (one of
+    ``LOG_KEYS``) from the start to the end date, optionally only of the logs
+    for which ``predicate(log)`` is true
+    """
+    key = LOG_KEYS[resource]
+    start, end = to_date(start), to_date(end)
+    days = [start + datetime.timedelta(days=day)
+            for day in range((end - start).days + 1)]
+    log_ids = []
+    with ThreadPoolExecutor(max_workers) as executor:
+        responses = executor.map(
+            lambda day: fitbit._COLLECTION_RESOURCE(resource, date=day), days)
+        for response in responses:
+            log_ids.extend(log['logId'] for log in response.get(key, [])
+                           if predicate is None or predicate(log))
+    return log_ids
+
+
+def delete_logs(fitbit, resource, log_ids=None, start=None, end=None,
+                predicate=None, max_workers=8):
+    """
+    Delete many logs of a collection resource (one of ``LOG_KEYS``)
+    concurrently, given their ids, or the start and end dates (and optional
+    predicate) to find them with, see find_logs. Failures don't stop the
+    other deletes. Returns an ordered dict of the log ids to None if the log
+    was deleted, or the exception the delete raised.
+    """
+    if resource not in LOG_KEYS:
+        raise ValueError('Logs of %s can not be deleted' % resource)
+    if log_ids is None:
+        log_ids = find_logs(fitbit, resource, start, end, predicate,
+                            max_workers)
+
+    def delete(log_id):
+        try:
+            fitbit._DELETE_COLLECTION_RESOURCE(resource, log_id)
+        except Exception as e:
+            return e
+        return None
+
+    log_ids = list(log_ids)
+    with ThreadPoolExecutor(max_workers) as executor:
+        return collections.OrderedDict(
+            zip(log_ids, executor.map(delete, log_ids)))
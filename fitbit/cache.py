@@ -0,0 +1,222 @@
+"""
+A cache of decoded API responses, for GET requests of cacheable endpoints.
+
+Pass a :class:`ResponseCache` to ``Fitbit`` to answer repeated reads from
+memory::
+
+    cache = ResponseCache(ttl=300)
+    fitbit = Fitbit(..., cache=cache)
+
+Responses are cached per user, URL and unit system, for ``ttl`` seconds. One
+cache can be shared by all the user handles of a ``Fitbit`` object. Entries
+are stored JSON encoded, so callers can't change the cached response by
+changing the one they got, and compressed too if given a
+``fitbit.compression.PayloadCompressor``.
+
+Writes evict the cached reads of their user they make stale, as listed in
+``DEPENDENCIES``, e.g. logging an activity evicts the activities collection
+of its date, the activity time series covering that date, and the activity
+stats. Writes of endpoints missing from ``fitbit.endpoints`` evict all the
+user's cached reads.
+"""
+import collections
+import datetime
+import json
+import re
+import threading
+import time
+
+from . import endpoints
+from .utils import to_date
+
+# The reads made stale by writes to collections. Each rule is the name of a
+# read endpoint, and the conditions a cached read of it must meet to be
+# stale: 'root', the same top level resource (e.g. 'foods' for both
+# 'foods/log' and 'foods/log/water'), 'date', a date range covering the
+# date of the write (or any date, if the write has none), or the name of a
+# field which must be the same as the write's.
+COLLECTION_WRITE = [
+    ('collection', 'root', 'date'),
+    ('get_sleep', 'root', 'date'),
+    ('time_series', 'root', 'date'),
+    ('intraday_time_series', 'root', 'date'),
+    ('body_log', 'root', 'date'),
+    ('activity_stats', 'root'),
+    ('food_stats', 'root'),
+]
+
+# Write endpoint name -> the rules of the reads it makes stale
+DEPENDENCIES = {
+    'user_profile_update': [('user_profile_get',)],
+    'respond_to_invite': [('get_friends',), ('get_friends_leaderboard',)],
+    'add_alarm': [('get_alarms', 'device_id')],
+    'update_alarm': [('get_alarms', 'device_id')],
+    'delete_alarm': [('get_alarms', 'device_id')],
+    'log_activity': COLLECTION_WRITE,
+    'log_sleep': COLLECTION_WRITE,
+    'log_collection': COLLECTION_WRITE,
+    'delete_collection': COLLECTION_WRITE,
+    'add_favorite_activity': [('activity_stats',)],
+    'delete_favorite_activity': [('activity_stats',)],
+    'add_favorite_food': [('food_stats',)],
+    'delete_favorite_food': [('food_stats',)],
+    'create_food': [('food_stats',)],
+    'update_resource_goal': [('resource_goal', 'resource'),
+                             ('collection', 'root')],
+}
+
+# Days per unit of time series periods, rounded up
+PERIOD_DAYS = {'d': 1, 'w': 7, 'm': 31, 'y': 366}
+
+
+def _date(value):
+    if value == 'today':
+        return datetime.date.today()
+    return to_date(value)
+
+
+def _window(base_date, end=None):
+    """ The (start, end) dates of a time series range """
+    base_date = _date(base_date)
+    if end is None:
+        return base_date, base_date
+    if end == 'max':
+        return datetime.date.min, base_date
+    period = re.match(r'(\d+)([dwmy])$', end)
+    if period:
+        days = int(period.group(1)) * PERIOD_DAYS[period.group(2)]
+        return base_date - datetime.timedelta(days=days), base_date
+    end = _date(end)
+    return min(base_date, end), max(base_date, end)
+
+
+def _dates(endpoint, fields):
+    """ The (start, end) dates a read covers, or None """
+    if endpoint.name in ('collection', 'get_sleep'):
+        return _window(fields['date'])
+    if endpoint.name == 'time_series':
+        return _window(fields['base_date'], fields['end'])
+    if endpoint.name == 'intraday_time_series':
+        return _window(fields['base_date'])
+    if endpoint.name == 'body_log':
+        return _window(*fields['date_string'].split('/', 1))
+    return None
+
+
+def _root(endpoint, fields):
+    return (fields.get('resource') or endpoint.family).split('/')[0]
+
+
+def stale_reads(method, url, data=None):
+    """
+    Return a ``match(url)`` function telling whether a cached read of the
+    same user is made stale by a write, or None if the write makes no read
+    stale
+    """
+    endpoint, fields = endpoints.match(method, url)
+    if endpoint is None:
+        return lambda url: True
+    rules = DEPENDENCIES.get(endpoint.name)
+    if not rules:
+        return None
+    root = _root(endpoint, fields)
+    date = (data or {}).get('date')
+    rules = dict((rule[0], rule[1:]) for rule in rules)
+
+    def match(read_url):
+        read, read_fields = endpoints.match('GET', read_url)
+        if read is None or read.name not in rules:
+            return False
+        for condition in rules[read.name]:
+            if condition == 'root':
+                if _root(read, read_fields) != root:
+                    return False
+            elif condition == 'date':
+                if date is None:
+                    continue
+                try:
+                    start, end = _dates(read, read_fields)
+                    if not start <= _date(date) <= end:
+                        return False
+                except (TypeError, ValueError):
+                    # Unknown dates may be covered
+                    pass
+            elif read_fields.get(condition) != fields.get(condition):
+                return False
+        return True
+    return match
+
+
+class ResponseCache(object):
+    """
+    Keeps up to ``max_entries`` responses, for ``ttl`` seconds each,
+    evicting the least recently used first, compressed with ``compressor``
+    if given.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300, compressor=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.compressor = compressor
+        # (user, url, system) -> (expires, encoded response)
+        self.entries = collections.OrderedDict()
+        # user -> set of (url, system), to invalidate the entries of a user
+        self.keys = collections.defaultdict(set)
+        self.lock = threading.Lock()
+
+    def encode(self, response):
+        data = json.dumps(response).encode('utf8')
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        return data
+
+    def decode(self, data):
+        if self.compressor is not None:
+            data = self.compressor.decompress(data)
+        return json.loads(data.decode('utf8'))
+
+    def get(self, user, url, system):
+        """ Return a cached response, or raise KeyError """
+        key = (user, url, system)
+        with self.lock:
+            expires, data = self.entries[key]
+            if expires < time.time():
+                self._remove(key)
+                raise KeyError(key)
+            self.entries.move_to_end(key)
+        return self.decode(data)
+
+    def set(self, user, url, system, response):
+        key = (user, url, system)
+        data = self.encode(response)
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, data)
+            self.entries.move_to_end(key)
+            self.keys[user].add((url, system))
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        del self.entries[key]
+        user_keys = self.keys[key[0]]
+        user_keys.discard(key[1:])
+        if not user_keys:
+            del self.keys[key[0]]
+
+    def invalidate(self, user, match=None):
+        """
+        Evict the responses of a user, all of them, or those whose URL
+        ``match(url)`` is true. Returns the number of evicted responses.
+        """
+        with self.lock:
+            keys = [(user, url, system)
+                    for url, system in self.keys.get(user, ())
+                    if match is None or match(url)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys.clear()
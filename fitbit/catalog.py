@@ -0,0 +1,300 @@
+"""
+Local catalogs of the foods and activities of the API, for fast lookups.
+
+A :class:`FoodCatalog` keeps every food seen in ``search_foods`` and
+``food_detail`` responses, with an index of the words of their names, so an
+autocomplete can search it locally, while the API is searched in the
+background to grow it::
+
+    catalog = FoodCatalog(fitbit, 'foods.json')
+    catalog.search('banan')  # Local results, straight away
+    catalog.detail(12345)    # Local, or fetched once
+    catalog.close()          # Saves the catalog
+
+An :class:`ActivityCatalog` is a snapshot of the whole ``activities_list``
+tree, flattened into an index of activities by id and by name, to resolve
+activities without a request each time::
+
+    catalog = ActivityCatalog(fitbit, 'activities.json')
+    catalog.find('Running')  # The activity id
+    catalog.detail(90009)    # The activity, like activity_detail
+"""
+import bisect
+import json
+import os
+import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import atomic_write
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _words(text):
+    return _WORD.findall((text or '').lower())
+
+
+def _save_json(path, data):
+    with atomic_write(path) as f:
+        json.dump(data, f)
+
+
+class FoodCatalog(object):
+    """
+    Foods seen in API responses, searchable by the words of their name and
+    brand.
+
+    Arguments:
+        fitbit, the Fitbit object to make the requests with
+        [path] the JSON file the catalog is loaded from and saved to
+        [refresh_ttl] how long, in seconds, the API results of a search are
+            trusted before the API is searched again
+    """
+
+    def __init__(self, fitbit, path=None, refresh_ttl=24 * 3600):
+        self.fitbit = fitbit
+        self.path = path
+        self.refresh_ttl = refresh_ttl
+        self.foods = {}
+        # The ids of the foods whose details were fetched
+        self.detailed = set()
+        self.units = None
+        self.units_by_id = None
+        # word -> set of food ids, and the sorted words for prefix lookups
+        self.index = {}
+        self.words = []
+        self.searched = {}
+        self.lock = threading.RLock()
+        self.executor = ThreadPoolExecutor(1)
+        self.refreshing = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.units = data.get('units')
+            self.searched = data.get('searched', {})
+            self.detailed = set(data.get('detailed', []))
+            self.add(data.get('foods', []))
+
+    def add(self, foods):
+        """ Add foods, as found in search_foods or food_detail responses """
+        with self.lock:
+            for food in foods:
+                food_id = food['foodId']
+                old = self.foods.get(food_id)
+                if old is not None:
+                    # Food details have more fields than search results
+                    food = dict(old, **food)
+                self.foods[food_id] = food
+                for word in set(_words(food.get('name')) +
+                                _words(food.get('brand'))):
+                    ids = self.index.get(word)
+                    if ids is None:
+                        ids = self.index[word] = set()
+                        bisect.insort(self.words, word)
+                    ids.add(food_id)
+
+    def _prefixed(self, prefix):
+        """ The ids of the foods with a word starting with prefix """
+        ids = set()
+        start = bisect.bisect_left(self.words, prefix)
+        for word in self.words[start:]:
+            if not word.startswith(prefix):
+                break
+            ids |= self.index[word]
+        return ids
+
+    def search(self, query, limit=20, refresh=True):
+        """
+        Return up to limit foods whose name or brand has words starting with
+        all the words of the query, those whose name starts with the query
+        first. Unless refresh is False, the API is searched in the background
+        (at most once per refresh_ttl per query), adding its results for the
+        next searches.
+        """
+        words = _words(query)
+        with self.lock:
+            ids = None
+            for word in words:
+                matches = self._prefixed(word)
+                ids = matches if ids is None else ids & matches
+                if not ids:
+                    break
+            foods = [self.foods[food_id] for food_id in ids or ()]
+        query = ' '.join(words)
+        if refresh and query:
+            self.refresh(query)
+        foods.sort(key=lambda food: (
+            not (food.get('name') or '').lower().startswith(query),
+            food.get('name') or ''))
+        return foods[:limit]
+
+    def refresh(self, query, wait=False):
+        """ Search the API for query in the background, or now if wait """
+        with self.lock:
+            if (query in self.refreshing or
+                    self.searched.get(query, 0) > time.time() - self.refresh_ttl):
+                return
+            self.refreshing.add(query)
+        future = self.executor.submit(self._refresh, query)
+        if wait:
+            future.result()
+
+    def _refresh(self, query):
+        try:
+            self.add(self.fitbit.search_foods(query).get('foods', []))
+            with self.lock:
+                self.searched[query] = time.time()
+        finally:
+            with self.lock:
+                self.refreshing.discard(query)
+
+    def detail(self, food_id):
+        """ Return a food with its details, fetching them if needed """
+        if food_id not in self.detailed:
+            self.add([self.fitbit.food_detail(food_id)['food']])
+            with self.lock:
+                self.detailed.add(food_id)
+        return self.foods[food_id]
+
+    def food_units(self, food=None):
+        """
+        Return the list of all units, fetched once, or the units of a food
+        """
+        if self.units is None:
+            self.units = self.fitbit.food_units()
+        if food is None:
+            return self.units
+        if self.units_by_id is None:
+            self.units_by_id = dict((unit['id'], unit) for unit in self.units)
+        return [self.units_by_id[unit_id] for unit_id in food.get('units', [])
+                if unit_id in self.units_by_id]
+
+    def save(self, path=None):
+        """ Save the catalog, atomically """
+        with self.lock:
+            data = {'foods': list(self.foods.values()), 'units': self.units,
+                    'searched': self.searched,
+                    'detailed': sorted(self.detailed)}
+            _save_json(path or self.path, data)
+
+    def close(self):
+        """ Finish the background searches, and save the catalog """
+        self.executor.shutdown()
+        if self.path:
+            self.save()
+
+
+class ActivityCatalog(object):
+    """
+    A snapshot of the activity catalog from one ``activities_list`` request.
+
+    Arguments:
+        fitbit, the Fitbit object to make the requests with
+        [path] the JSON file the snapshot is loaded from and saved to
+        [ttl] how long, in seconds, a snapshot is used before it is refreshed
+            in the background
+
+    Activities are kept by id, as the records of ``activities_list`` with
+    their ``categoryId``, ``categoryName`` and, for activities of
+    subcategories, ``subCategoryId`` and ``subCategoryName``. Their activity
+    levels are kept too, with the id of their activity as ``parentId``.
+    """
+
+    def __init__(self, fitbit, path=None, ttl=7 * 24 * 3600):
+        self.fitbit = fitbit
+        self.path = path
+        self.ttl = ttl
+        self.activities = {}
+        self.names = {}
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+        # The thread of the last background refresh
+        self.refreshing = None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            # JSON keys are strings
+            activities = dict(
+                (int(activity_id), activity)
+                for activity_id, activity in data['activities'].items())
+            self._load(activities, data['fetched_at'])
+
+    def _load(self, activities, fetched_at):
+        names = {}
+        for activity in activities.values():
+            if 'parentId' not in activity:
+                names.setdefault(activity['name'].lower(), activity['id'])
+        with self.lock:
+            self.activities, self.names = activities, names
+            self.fetched_at = fetched_at
+
+    @staticmethod
+    def flatten(response):
+        """ Return a dict of id to activity, from an activities_list response """
+        activities = {}
+
+        def add(activity, **parent):
+            activity = dict(activity, **parent)
+            activities[activity['id']] = activity
+            for level in activity.get('activityLevels', []):
+                activities[level['id']] = dict(level, parentId=activity['id'])
+
+        for category in response.get('categories', []):
+            parent = {'categoryId': category['id'],
+                      'categoryName': category['name']}
+            for activity in category.get('activities', []):
+                add(activity, **parent)
+            for sub_category in category.get('subCategories', []):
+                for activity in sub_category.get('activities', []):
+                    add(activity, subCategoryId=sub_category['id'],
+                        subCategoryName=sub_category['name'], **parent)
+        return activities
+
+    def refresh(self):
+        """ Make a new snapshot now, and save it """
+        self._load(self.flatten(self.fitbit.activities_list()), time.time())
+        if self.path:
+            self.save()
+
+    def _fresh(self):
+        # The first snapshot is made straight away, later ones in the
+        # background, while the old one is still used
+        if not self.activities:
+            self.refresh()
+        elif self.fetched_at < time.time() - self.ttl:
+            with self.lock:
+                if self.refreshing is not None and self.refreshing.is_alive():
+                    return
+                self.refreshing = threading.Thread(target=self.refresh)
+                self.refreshing.daemon = True
+                self.refreshing.start()
+
+    def get(self, activity_id):
+        """ Return the activity (or activity level) with an id, or None """
+        self._fresh()
+        return self.activities.get(int(activity_id))
+
+    def find(self, name):
+        """ Return the id of the activity with a name, or None """
+        self._fresh()
+        return self.names.get(name.lower())
+
+    def detail(self, activity_id):
+        """
+        Return an activity like ``activity_detail`` does, from the snapshot
+        if it has it
+        """
+        activity = self.get(activity_id)
+        if activity is None:
+            activity = self.fitbit.activity_detail(activity_id)['activity']
+        return {'activity': activity}
+
+    def save(self, path=None):
+        """ Save the snapshot, atomically """
+        with self.lock:
+            data = {'fetched_at': self.fetched_at,
+                    'activities': self.activities}
+            _save_json(path or self.path, data)
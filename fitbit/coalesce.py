@@ -0,0 +1,66 @@
+"""
+Coalescing of identical requests which are in flight at the same time.
+
+When several threads ask for the same resource at once, only the first one
+makes the request; the others wait for it, and every caller gets its own
+copy of the result, or the same exception.
+"""
+import copy
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class RequestCoalescer(object):
+    """
+    Runs at most one call per key at a time. Pass one to ``Fitbit`` as the
+    ``coalesce`` keyword argument to share it between clients, or pass
+    ``coalesce=True`` to give the client (and its user handles) their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def call(self, key, func, *args, **kwargs):
+        """
+        Call ``func(*args, **kwargs)``, unless a call with the same key is
+        already in flight, in which case wait for that call to finish instead.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Waiters get their own copy, so no caller can change the result
+            # another one is using
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            call.done.set()
+        if not waiters:
+            return call.result
+        # The waiters copy the result while this caller may be changing it,
+        # so this caller gets a copy too
+        return copy.deepcopy(call.result)
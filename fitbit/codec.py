@@ -0,0 +1,168 @@
+"""
+A compact encoding of intraday series, e.g. a day of 1sec heart rate, which
+is megabytes as JSON.
+
+Timestamps are stored as the deltas of their deltas, mostly 0 for regular
+series, and values as their deltas, small for heart rates, all as zigzag
+varints. The rows are split into chunks of ``chunk_seconds``, each encoded
+(and compressed with zstd, if asked, which needs the ``zstandard`` package)
+on its own, so a time range only decodes the chunks it overlaps::
+
+    data = encode(series.timestamps, series.values, compress=True)
+    timestamps, values = decode(data)
+    timestamps, values = decode(data, start=ts, end=ts + 3600)
+
+Values are stored as integers, multiplied by ``scale`` (e.g. 100 to keep
+calories to two decimals). The ``fitbit.store.Series`` of a
+``TimeSeriesStore`` can be encoded as it is.
+
+The layout, all integers little endian: the magic ``FBTS``, the version and
+flags (1 if compressed) as uint8s, the scale and the number of chunks as
+uint32s, then per chunk the timestamp of its first row as an int64, its
+number of rows as a uint32, and the offset and length of its data as a
+uint64 and a uint32, followed by the chunks' data.
+"""
+import array
+import bisect
+import struct
+
+MAGIC = b'FBTS'
+VERSION = 1
+COMPRESSED = 1
+HEADER = struct.Struct('<4sBBII')
+CHUNK = struct.Struct('<qIQI')
+
+
+def _write_varints(out, values):
+    append = out.append
+    for value in values:
+        value = value * 2 if value >= 0 else -value * 2 - 1
+        while value > 0x7f:
+            append(value & 0x7f | 0x80)
+            value >>= 7
+        append(value)
+
+
+def _read_varints(data, count):
+    values = []
+    append = values.append
+    pos = 0
+    for _ in range(count):
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        append(value >> 1 if not value & 1 else -(value >> 1) - 1)
+    return values
+
+
+def _encode_chunk(timestamps, values):
+    deltas = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    fields = [timestamps[0], values[0]]
+    fields.extend(b - a for a, b in zip([0] + deltas, deltas))
+    fields.extend(b - a for a, b in zip(values, values[1:]))
+    out = bytearray()
+    _write_varints(out, fields)
+    return bytes(out)
+
+
+def _decode_chunk(data, count):
+    fields = _read_varints(data, 2 * count)
+    timestamps, values = [fields[0]], [fields[1]]
+    delta = 0
+    ts = fields[0]
+    for delta_delta in fields[2:count + 1]:
+        delta += delta_delta
+        ts += delta
+        timestamps.append(ts)
+    value = fields[1]
+    for value_delta in fields[count + 1:]:
+        value += value_delta
+        values.append(value)
+    return timestamps, values
+
+
+def encode(timestamps, values, chunk_seconds=3600, scale=1, compress=False,
+           level=3):
+    """
+    Encode sorted integer timestamps (e.g. seconds since the epoch) and their
+    values, in chunks of chunk_seconds, compressed with zstd at level if
+    compress
+    """
+    timestamps = [int(ts) for ts in timestamps]
+    values = [int(round(value * scale)) for value in values]
+    if len(timestamps) != len(values):
+        raise ValueError('There must be as many timestamps as values')
+    if compress:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level)
+
+    encoded = []
+    start = 0
+    while start < len(timestamps):
+        boundary = timestamps[start] - timestamps[start] % chunk_seconds
+        end = bisect.bisect_left(timestamps, boundary + chunk_seconds, start)
+        data = _encode_chunk(timestamps[start:end], values[start:end])
+        if compress:
+            data = compressor.compress(data)
+        encoded.append((timestamps[start], end - start, data))
+        start = end
+
+    offset = HEADER.size + CHUNK.size * len(encoded)
+    out = [HEADER.pack(MAGIC, VERSION, COMPRESSED if compress else 0, scale,
+                       len(encoded))]
+    for first, count, data in encoded:
+        out.append(CHUNK.pack(first, count, offset, len(data)))
+        offset += len(data)
+    out.extend(data for first, count, data in encoded)
+    return b''.join(out)
+
+
+def chunks(data):
+    """ Return the (first timestamp, rows, offset, length) of each chunk """
+    magic, version, flags, scale, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not an encoded series')
+    return [CHUNK.unpack_from(data, HEADER.size + i * CHUNK.size)
+            for i in range(count)]
+
+
+def decode(data, start=None, end=None):
+    """
+    Decode the rows of an encoded series, or those from timestamps start to
+    end, inclusive, as timestamps and values arrays. Values are floats if
+    the scale isn't 1.
+    """
+    magic, version, flags, scale, count = HEADER.unpack_from(data, 0)
+    index = chunks(data)
+    if flags & COMPRESSED:
+        import zstandard
+        decompressor = zstandard.ZstdDecompressor()
+    first = 0
+    if start is not None:
+        # The last chunk starting at or before start may hold it
+        first = max(bisect.bisect_right([c[0] for c in index], start) - 1, 0)
+    timestamps = array.array('q')
+    values = array.array('q' if scale == 1 else 'd')
+    for first_ts, rows, offset, length in index[first:]:
+        if end is not None and first_ts > end:
+            break
+        chunk = memoryview(data)[offset:offset + length]
+        if flags & COMPRESSED:
+            chunk = decompressor.decompress(chunk, max_output_size=rows * 20)
+        chunk_ts, chunk_values = _decode_chunk(chunk, rows)
+        lo, hi = 0, rows
+        if start is not None:
+            lo = bisect.bisect_left(chunk_ts, start)
+        if end is not None:
+            hi = bisect.bisect_right(chunk_ts, end)
+        timestamps.extend(chunk_ts[lo:hi])
+        if scale == 1:
+            values.extend(chunk_values[lo:hi])
+        else:
+            values.extend(value / float(scale) for value in chunk_values[lo:hi])
+    return timestamps, values
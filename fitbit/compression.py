@@ -0,0 +1,152 @@
+"""
+Compression of API payloads with zstd dictionaries trained on sample
+payloads, for the response cache and for archives of responses.
+
+Fitbit responses repeat the same keys over and over, which a dictionary
+trained on samples of them captures, so even small responses compress well::
+
+    dictionary = train_dictionary(sample_responses)
+    save_dictionary('fitbit.dict', dictionary)
+
+    compressor = PayloadCompressor([load_dictionary('fitbit.dict')])
+    cache = ResponseCache(compressor=compressor)
+
+or from the command line, with files of sample JSON responses::
+
+    python -m fitbit.compression train -o fitbit.dict samples/*.json
+
+Each compressed payload records the id of its dictionary. A
+:class:`PayloadCompressor` compresses with its last dictionary, and
+decompresses with any of them, so payloads compressed before a new
+dictionary was trained can still be read while both are passed. Payloads
+compressed without a dictionary have the id 0.
+
+This needs the ``zstandard`` package.
+"""
+import argparse
+import json
+import sys
+import threading
+
+from .utils import atomic_write
+
+# The default size of trained dictionaries, as recommended by zstd
+DICTIONARY_SIZE = 110 * 1024
+
+
+def _payload(sample):
+    if isinstance(sample, bytes):
+        return sample
+    return json.dumps(sample).encode('utf8')
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Train a dictionary on sample payloads, as bytes or decoded responses.
+    Returns the dictionary data. Training needs a few hundred samples at
+    least.
+    """
+    import zstandard
+
+    dictionary = zstandard.train_dictionary(
+        size, [_payload(sample) for sample in samples])
+    return dictionary.as_bytes()
+
+
+def save_dictionary(path, dictionary):
+    """ Save dictionary data, atomically """
+    with atomic_write(path, 'wb') as f:
+        f.write(dictionary)
+
+
+def load_dictionary(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def dictionary_id(dictionary):
+    """ The id of dictionary data, recorded in the payloads it compresses """
+    import zstandard
+
+    return zstandard.ZstdCompressionDict(dictionary).dict_id()
+
+
+class PayloadCompressor(object):
+    """
+    Compresses payloads with the last of a list of dictionaries, and
+    decompresses them with the one they were compressed with.
+
+    Arguments:
+        [dictionaries] dictionary data, oldest first
+        [level] the zstd compression level
+    """
+
+    def __init__(self, dictionaries=(), level=3):
+        import zstandard
+
+        self.level = level
+        self.dictionaries = dict(
+            (dictionary.dict_id(), dictionary) for dictionary in
+            (zstandard.ZstdCompressionDict(data) for data in dictionaries))
+        self.current = None
+        if dictionaries:
+            self.current = dictionary_id(dictionaries[-1])
+        # zstandard compressors can't be shared by threads
+        self.local = threading.local()
+
+    def compress(self, data):
+        import zstandard
+
+        compressor = getattr(self.local, 'compressor', None)
+        if compressor is None:
+            compressor = self.local.compressor = zstandard.ZstdCompressor(
+                level=self.level,
+                dict_data=self.dictionaries.get(self.current))
+        return compressor.compress(data)
+
+    def decompress(self, data):
+        import zstandard
+
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        decompressors = getattr(self.local, 'decompressors', None)
+        if decompressors is None:
+            decompressors = self.local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self.dictionaries:
+                raise ValueError('The dictionary %d is missing' % dict_id)
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(
+                dict_data=self.dictionaries.get(dict_id))
+        return decompressor.decompress(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m fitbit.compression',
+        description='Train a zstd dictionary on sample Fitbit responses')
+    commands = parser.add_subparsers(dest='command')
+    train = commands.add_parser('train', help='train a dictionary')
+    train.add_argument('samples', nargs='+',
+                       help='files of sample responses, one per file')
+    train.add_argument('-o', '--output', required=True,
+                       help='the dictionary file to write')
+    train.add_argument('--size', type=int, default=DICTIONARY_SIZE,
+                       help='the size of the dictionary, in bytes')
+    args = parser.parse_args(argv)
+    if args.command != 'train':
+        parser.print_help()
+        return 1
+
+    samples = []
+    for path in args.samples:
+        with open(path, 'rb') as f:
+            samples.append(f.read())
+    dictionary = train_dictionary(samples, size=args.size)
+    save_dictionary(args.output, dictionary)
+    print('Wrote dictionary %d (%d bytes) to %s' % (
+        dictionary_id(dictionary), len(dictionary), args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
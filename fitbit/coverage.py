@@ -0,0 +1,105 @@
+"""
+An index of the date ranges already held locally, so only the gaps need to be
+fetched from the API.
+
+Coverage is kept per key, usually a ``(user_id, resource, detail_level)``
+tuple, as a sorted list of merged, inclusive ``(start, end)`` date intervals::
+
+    coverage = CoverageIndex.load('coverage.json')
+    key = ('USER', 'activities/steps', None)
+    for start, end in coverage.missing(key, start_date, end_date):
+        store(fitbit.time_series('activities/steps', base_date=start,
+                                 end_date=end))
+        coverage.add(key, start, end)
+    coverage.save('coverage.json')
+"""
+import bisect
+import datetime
+import json
+import os
+
+from .utils import atomic_write, to_date
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+class CoverageIndex(object):
+    """
+    Merged date intervals per key. Keys are tuples of strings (or None), so
+    they can be persisted as JSON.
+    """
+
+    def __init__(self):
+        self.intervals = {}
+
+    def add(self, key, start, end):
+        """ Mark the dates from start to end (inclusive) as held """
+        start, end = to_date(start), to_date(end)
+        if end < start:
+            return
+        intervals = self.intervals.setdefault(tuple(key), [])
+        # Find the intervals overlapping or touching the new one, and replace
+        # them with their union
+        lo = bisect.bisect_left(intervals, (start - ONE_DAY,))
+        if lo > 0 and intervals[lo - 1][1] >= start - ONE_DAY:
+            lo -= 1
+        hi = lo
+        while hi < len(intervals) and intervals[hi][0] <= end + ONE_DAY:
+            start = min(start, intervals[hi][0])
+            end = max(end, intervals[hi][1])
+            hi += 1
+        intervals[lo:hi] = [(start, end)]
+
+    def covered(self, key, start, end):
+        """ Whether every date from start to end is held """
+        return not self.missing(key, start, end)
+
+    def missing(self, key, start, end):
+        """
+        Return the list of ``(start, end)`` date ranges between start and end
+        (inclusive) which are not held yet
+        """
+        start, end = to_date(start), to_date(end)
+        gaps = []
+        intervals = self.intervals.get(tuple(key), [])
+        i = bisect.bisect_right(intervals, (start,))
+        if i > 0 and intervals[i - 1][1] >= start:
+            i -= 1
+        for held_start, held_end in intervals[i:]:
+            if held_start > end:
+                break
+            if held_start > start:
+                gaps.append((start, held_start - ONE_DAY))
+            start = max(start, held_end + ONE_DAY)
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def to_dict(self):
+        return {
+            'intervals': [
+                [list(key), [[s.isoformat(), e.isoformat()] for s, e in intervals]]
+                for key, intervals in sorted(self.intervals.items(), key=repr)
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        for key, intervals in data.get('intervals', []):
+            index.intervals[tuple(key)] = [
+                (to_date(start), to_date(end)) for start, end in intervals]
+        return index
+
+    def save(self, path):
+        """ Write the index to a JSON file, atomically """
+        with atomic_write(path) as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        """ Read an index written by save, or start an empty one """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,210 @@
+"""
+A declarative table of the Fitbit API endpoints used by :class:`fitbit.Fitbit`.
+
+Each :class:`Endpoint` records the HTTP method, the URL path template relative
+to ``<API_ENDPOINT>/<API_VERSION>/``, the resource family it belongs to, and
+whether requests to it are idempotent and cacheable. The client builds its
+URLs from this table, and features that work across many endpoints (caching,
+retries, request coalescing, ...) can look requests up in it with
+:func:`match`.
+"""
+import operator
+import re
+import string
+
+
+class Endpoint(object):
+    """
+    A single Fitbit API endpoint.
+
+    Arguments:
+        name, the name of the endpoint, usually the client method using it
+        method, the HTTP method
+        path, the URL path template, fields in ``{braces}``
+        family, the resource family, e.g. ``activities`` or ``foods``
+        [idempotent] defaults to True for GET and DELETE requests
+        [cacheable] defaults to True for GET requests
+        [patterns] regular expressions for fields which can contain more
+            than a single path segment, used by :func:`match`
+    """
+
+    def __init__(self, name, method, path, family, idempotent=None,
+                 cacheable=None, patterns=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.family = family
+        if idempotent is None:
+            idempotent = method in ('GET', 'DELETE')
+        self.idempotent = idempotent
+        if cacheable is None:
+            cacheable = method == 'GET'
+        self.cacheable = cacheable
+
+        # Split the template once, so building a URL is a single %-format
+        literal, fields = [], []
+        for text, field, _, _ in string.Formatter().parse(path):
+            literal.append(text.replace('%', '%%'))
+            if field is not None:
+                literal.append('%s')
+                fields.append(field)
+        self.fields = tuple(fields)
+        self._format = ''.join(literal)
+        if len(fields) > 1:
+            self._values = operator.itemgetter(*fields)
+        elif fields:
+            self._values = lambda kwargs, field=fields[0]: (kwargs[field],)
+        else:
+            self._values = lambda kwargs: ()
+        self._compiled = {}
+
+        patterns = patterns or {}
+        regex = ''
+        for text, field, _, _ in string.Formatter().parse(path):
+            regex += re.escape(text)
+            if field is not None:
+                regex += '(?P<%s>%s)' % (field, patterns.get(field, '[^/?]+'))
+        self.regex = re.compile(regex + '$')
+
+    def __repr__(self):
+        return '<Endpoint %s %s %s>' % (self.name, self.method, self.path)
+
+    def url(self, api_endpoint, api_version, fields):
+        """
+        Return the full URL of this endpoint, given a dict of field values
+        """
+        key = (api_endpoint, api_version)
+        try:
+            template = self._compiled[key]
+        except KeyError:
+            prefix = '%s/%s/' % key
+            template = self._compiled[key] = (
+                prefix.replace('%', '%%') + self._format)
+        return template % self._values(fields)
+
+
+# Fields which can span several path segments, or be empty
+_RESOURCE = r'[^?]+?'
+_OPTIONAL = r'(?:/[^?]*?)?'
+
+ENDPOINTS = [
+    # User
+    Endpoint('user_profile_get', 'GET', 'user/{user_id}/profile.json', 'user'),
+    Endpoint('user_profile_update', 'POST', 'user/{user_id}/profile.json',
+             'user', idempotent=True),
+    # Friends and badges
+    Endpoint('get_friends', 'GET', 'user/{user_id}/friends.json', 'friends'),
+    Endpoint('get_friends_leaderboard', 'GET',
+             'user/{user_id}/friends/leaders/{period}.json', 'friends'),
+    Endpoint('invite_friend', 'POST',
+             'user/{user_id}/friends/invitations.json', 'friends'),
+    Endpoint('respond_to_invite', 'POST',
+             'user/{user_id}/friends/invitations/{other_user_id}.json',
+             'friends', idempotent=True),
+    Endpoint('get_badges', 'GET', 'user/{user_id}/badges.json', 'friends'),
+    # Devices and alarms
+    Endpoint('get_devices', 'GET', 'user/{user_id}/devices.json', 'devices'),
+    Endpoint('get_alarms', 'GET',
+             'user/{user_id}/devices/tracker/{device_id}/alarms.json',
+             'devices'),
+    Endpoint('add_alarm', 'POST',
+             'user/{user_id}/devices/tracker/{device_id}/alarms.json',
+             'devices'),
+    Endpoint('update_alarm', 'POST',
+             'user/{user_id}/devices/tracker/{device_id}/alarms/{alarm_id}.json',
+             'devices', idempotent=True),
+    Endpoint('delete_alarm', 'DELETE',
+             'user/{user_id}/devices/tracker/{device_id}/alarms/{alarm_id}.json',
+             'devices'),
+    # Subscriptions
+    Endpoint('list_subscriptions', 'GET',
+             'user/{user_id}{collection}/apiSubscriptions.json',
+             'subscriptions', cacheable=False,
+             patterns={'collection': _OPTIONAL}),
+    Endpoint('subscription', 'POST',
+             'user/{user_id}{collection}/apiSubscriptions/{subscription_id}.json',
+             'subscriptions', idempotent=True,
+             patterns={'collection': _OPTIONAL}),
+    # Activities
+    Endpoint('activities_list', 'GET', 'activities.json', 'activities'),
+    Endpoint('activity_detail', 'GET', 'activities/{activity_id}.json',
+             'activities'),
+    Endpoint('activity_stats', 'GET', 'user/{user_id}/activities{qualifier}.json',
+             'activities', patterns={'qualifier': r'(?:/[a-z]+)?'}),
+    Endpoint('log_activity', 'POST', 'user/{user_id}/activities.json',
+             'activities'),
+    Endpoint('add_favorite_activity', 'POST',
+             'user/{user_id}/activities/favorite/{activity_id}.json',
+             'activities', idempotent=True),
+    Endpoint('delete_favorite_activity', 'DELETE',
+             'user/{user_id}/activities/favorite/{activity_id}.json',
+             'activities'),
+    # Foods
+    Endpoint('search_foods', 'GET', 'foods/search.json?{query}', 'foods',
+             patterns={'query': r'.*'}),
+    Endpoint('food_units', 'GET', 'foods/units.json', 'foods'),
+    Endpoint('food_detail', 'GET', 'foods/{food_id}.json', 'foods'),
+    Endpoint('food_stats', 'GET', 'user/{user_id}/foods/log/{qualifier}.json',
+             'foods', patterns={'qualifier': r'recent|favorite|frequent'}),
+    Endpoint('add_favorite_food', 'POST',
+             'user/{user_id}/foods/log/favorite/{food_id}.json', 'foods',
+             idempotent=True),
+    Endpoint('delete_favorite_food', 'DELETE',
+             'user/{user_id}/foods/log/favorite/{food_id}.json', 'foods'),
+    Endpoint('create_food', 'POST', 'user/{user_id}/foods.json', 'foods'),
+    Endpoint('get_meals', 'GET', 'user/{user_id}/meals.json', 'foods'),
+    # Sleep
+    Endpoint('get_sleep', 'GET', 'user/{user_id}/sleep/date/{date}.json',
+             'sleep'),
+    Endpoint('log_sleep', 'POST', 'user/{user_id}/sleep.json', 'sleep'),
+    # Body
+    Endpoint('body_log', 'GET',
+             'user/{user_id}/body/log/{type_}/date/{date_string}.json', 'body',
+             patterns={'date_string': r'[^/]+(?:/[^/]+)?'}),
+    # Goals, for any resource
+    Endpoint('resource_goal', 'GET',
+             'user/{user_id}/{resource}/goal{postfix}.json', 'goals',
+             patterns={'resource': _RESOURCE, 'postfix': r'(?:s/[a-z]+)?'}),
+    Endpoint('update_resource_goal', 'POST',
+             'user/{user_id}/{resource}/goal{postfix}.json', 'goals',
+             idempotent=True,
+             patterns={'resource': _RESOURCE, 'postfix': r'(?:s/[a-z]+)?'}),
+    # Time series, for any resource
+    Endpoint('intraday_time_series', 'GET',
+             'user/{user_id}/{resource}/date/{base_date}/1d/{detail_level}{time_range}.json',
+             'time_series',
+             patterns={'resource': _RESOURCE,
+                       'time_range': r'(?:/time/[^/]+/[^/]+)?'}),
+    Endpoint('time_series', 'GET',
+             'user/{user_id}/{resource}/date/{base_date}/{end}.json',
+             'time_series', patterns={'resource': _RESOURCE}),
+    # Collections, for any resource in Fitbit.RESOURCE_LIST
+    Endpoint('collection', 'GET',
+             'user/{user_id}/{resource}/date/{date}.json', 'collection',
+             patterns={'resource': _RESOURCE}),
+    Endpoint('log_collection', 'POST', 'user/{user_id}/{resource}.json',
+             'collection', patterns={'resource': _RESOURCE}),
+    Endpoint('delete_collection', 'DELETE',
+             'user/{user_id}/{resource}/{log_id}.json', 'collection',
+             patterns={'resource': _RESOURCE}),
+]
+
+BY_NAME = dict((endpoint.name, endpoint) for endpoint in ENDPOINTS)
+
+_URL_PREFIX = re.compile(r'^https?://[^/]+/[^/]+/')
+
+
+def match(method, url):
+    """
+    Look up the endpoint of a request. Returns a tuple of the endpoint and
+    a dict of its field values, or ``(None, None)`` for unknown requests.
+    Endpoints are tried in table order, so the more specific ones come first.
+    """
+    path = _URL_PREFIX.sub('', url, count=1)
+    for endpoint in ENDPOINTS:
+        if endpoint.method != method:
+            continue
+        result = endpoint.regex.match(path)
+        if result:
+            return endpoint, result.groupdict()
+    return None, None
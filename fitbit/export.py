@@ -0,0 +1,503 @@
+"""
+Exports of the data of many users, as NDJSON (or Parquet), with flat memory
+use however many users there are.
+
+From the command line, with the tokens of the users in a token store (see
+``fitbit.tokens``)::
+
+    python -m fitbit export --tokens tokens.db \\
+        --start 2017-01-01 --end 2017-01-31 \\
+        --time-series activities/steps --intraday activities/heart:1min \\
+        --collection foods/log --output export.ndjson --state export.state
+
+or from Python, with an :class:`Exporter`::
+
+    exporter = Exporter(fitbit, '2017-01-01', '2017-01-31',
+                        time_series=['activities/steps'])
+    with open('export.ndjson', 'ab') as f:
+        exporter.run(user_ids, NdjsonWriter(f))
+
+Users are exported by a pool of threads, each fetching one user at a time
+into a temporary file. Only the records of users fetched without errors are
+written, from a bounded queue of those files, so a slow output holds the
+fetching back: at most ``workers + queue_size`` users are held in temporary
+files at once. The records are:
+
+* ``{"user", "resource", "date", "value"}`` per point of a ``time_series``
+* ``{"user", "resource", "date", "time", "value"}`` per point of an
+  ``intraday_time_series``
+* ``{"user", "resource", "date", "data"}`` per day of a collection, with
+  the day's collection response as data
+
+With a state file, the users whose records were all written are appended to
+it, and skipped when the export is run again, e.g. after a crash. A crash
+while a user's records are being written leaves them partly written, and
+they are written again in full by the next run.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from queue import Empty, Full, Queue
+except ImportError:
+    # Python 2.x
+    from Queue import Empty, Full, Queue
+
+from . import exceptions
+from .utils import to_date
+
+# Fetching again after these errors may work
+RETRY_ERRORS = (exceptions.Timeout, exceptions.HTTPServerError,
+                exceptions.HTTPTooManyRequests)
+
+_STOP = object()
+
+
+def _days(start, end):
+    day = to_date(start)
+    while day <= to_date(end):
+        yield day.strftime('%Y-%m-%d')
+        day += datetime.timedelta(days=1)
+
+
+class NdjsonWriter(object):
+    """ Writes records to a binary file, as one JSON object per line """
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record):
+        """ Write a record, and return the number of bytes written """
+        data = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf8')
+        self.f.write(data)
+        return len(data)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+
+
+class ParquetWriter(object):
+    """
+    Writes records to a Parquet file, in row groups of ``row_group_size``
+    records, with the columns user, resource, date, time, value (as a
+    string) and data (as JSON). This needs the ``pyarrow`` package.
+    """
+
+    COLUMNS = ('user', 'resource', 'date', 'time', 'value', 'data')
+
+    def __init__(self, path, row_group_size=10000):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema(
+            [(column, pyarrow.string()) for column in self.COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def write(self, record):
+        value = record.get('value')
+        data = record.get('data')
+        row = (str(record['user']), record['resource'], record['date'],
+               record.get('time'),
+               value if value is None or isinstance(value, str)
+               else json.dumps(value),
+               None if data is None else json.dumps(data))
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self._write_rows()
+        return sum(len(field) for field in row if field is not None)
+
+    def _write_rows(self):
+        import pyarrow
+
+        columns = list(zip(*self.rows))
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, pyarrow.string()) for column in columns],
+            schema=self.schema))
+        self.rows = []
+
+    def flush(self):
+        # Row groups are only written once full
+        pass
+
+    def close(self):
+        if self.rows:
+            self._write_rows()
+        self.writer.close()
+
+
+class ExportState(object):
+    """
+    The users an export has finished, appended to a file whose first line
+    describes the export, so a different export isn't resumed by mistake
+    """
+
+    def __init__(self, path, export):
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                lines = f.read().splitlines()
+            if lines and json.loads(lines[0]) != export:
+                raise ValueError('%s is the state of another export' % path)
+            self.done.update(lines[1:])
+            self.f = open(path, 'a')
+        else:
+            self.f = open(path, 'w')
+            self.f.write(json.dumps(export) + '\n')
+            self.f.flush()
+
+    def add(self, user_id):
+        self.done.add(str(user_id))
+        self.f.write('%s\n' % user_id)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class ExportStats(object):
+    """ Counts of an export's progress """
+
+    def __init__(self, users=None):
+        self.users = users
+        self.done = 0
+        self.skipped = 0
+        self.failed = {}
+        self.records = 0
+        self.bytes = 0
+        self.started = time.time()
+
+    def __str__(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        return ('%d%s users done, %d failed, %d skipped, %d records (%d/s), '
+                '%.1f MB (%.1f MB/s)' % (
+                    self.done,
+                    '' if self.users is None else '/%d' % self.users,
+                    len(self.failed), self.skipped, self.records,
+                    self.records / elapsed, self.bytes / 1e6,
+                    self.bytes / 1e6 / elapsed))
+
+
+class Exporter(object):
+    """
+    Exports the data of users from start to end dates.
+
+    Arguments:
+        fitbit, a Fitbit object with a token store, see ``for_stored_user``
+        start, end, the first and last dates to export
+        [time_series] the resources of ``time_series`` to export
+        [intraday] (resource, detail level) pairs of ``intraday_time_series``
+            to export
+        [collections] the collection resources to export, e.g. 'foods/log'
+        [workers] how many users are exported at once
+        [queue_size] how many fetched users may wait to be written;
+            defaults to workers
+        [state_path] the state file to resume the export with
+        [retries] how often a request is retried after a timeout, a server
+            error or a rate limit error
+    """
+
+    def __init__(self, fitbit, start, end, time_series=(), intraday=(),
+                 collections=(), workers=8, queue_size=None, state_path=None,
+                 retries=2):
+        self.fitbit = fitbit
+        self.start = to_date(start).strftime('%Y-%m-%d')
+        self.end = to_date(end).strftime('%Y-%m-%d')
+        self.time_series = list(time_series)
+        self.intraday = [tuple(pair) for pair in intraday]
+        self.collections = list(collections)
+        self.workers = workers
+        self.queue_size = queue_size or workers
+        self.state_path = state_path
+        self.retries = retries
+        self.stopped = threading.Event()
+
+    def _call(self, handle, method, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return getattr(handle, method)(*args, **kwargs)
+            except RETRY_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                if (isinstance(e, exceptions.HTTPTooManyRequests) and
+                        handle.rate_limiter is None):
+                    time.sleep(e.retry_after_secs)
+
+    def records(self, user_id):
+        """ Fetch the data of a user, and yield its records """
+        handle = self.fitbit.for_stored_user(user_id)
+        for resource in self.time_series:
+            response = self._call(handle, 'time_series', resource,
+                                  base_date=self.start, end_date=self.end)
+            for point in response.get(resource.replace('/', '-'), []):
+                yield {'user': user_id, 'resource': resource,
+                       'date': point['dateTime'], 'value': point['value']}
+        for date in _days(self.start, self.end):
+            for resource, detail_level in self.intraday:
+                response = self._call(handle, 'intraday_time_series', resource,
+                                      base_date=date, detail_level=detail_level)
+                intraday = response.get(
+                    '%s-intraday' % resource.replace('/', '-'), {})
+                for point in intraday.get('dataset', []):
+                    yield {'user': user_id, 'resource': resource,
+                           'date': date, 'time': point['time'],
+                           'value': point['value']}
+            for resource in self.collections:
+                response = self._call(handle, '_COLLECTION_RESOURCE',
+                                      resource, date=date)
+                yield {'user': user_id, 'resource': resource, 'date': date,
+                       'data': response}
+
+    def _put(self, queue, item):
+        # Gives up once the export is stopped, so no worker is left blocked
+        while not self.stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _spool(self, user_id):
+        """
+        Fetch the records of a user into a temporary file, as NDJSON, and
+        return it rewound, or None if the export was stopped meanwhile
+        """
+        spool = tempfile.TemporaryFile()
+        try:
+            for record in self.records(user_id):
+                if self.stopped.is_set():
+                    spool.close()
+                    return None
+                spool.write((json.dumps(record, separators=(',', ':')) +
+                             '\n').encode('utf8'))
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+    def _work(self, users, lock, queue):
+        try:
+            while not self.stopped.is_set():
+                with lock:
+                    user_id = next(users, None)
+                if user_id is None:
+                    return
+                try:
+                    spool = self._spool(user_id)
+                except Exception as e:
+                    self._put(queue, (_STOP, user_id, e, None))
+                    continue
+                if spool is None:
+                    return
+                if not self._put(queue, (_STOP, user_id, None, spool)):
+                    spool.close()
+                    return
+        finally:
+            self._put(queue, _STOP)
+
+    def run(self, user_ids, writer, progress=None, progress_interval=5):
+        """
+        Export the users, writing their records with writer (e.g. an
+        NdjsonWriter), and calling ``progress(stats)`` every
+        progress_interval seconds. Returns the final ``ExportStats``, whose
+        ``failed`` dict has the error of each user which failed.
+        """
+        user_ids = list(user_ids)
+        stats = ExportStats(len(user_ids))
+        state = None
+        if self.state_path:
+            state = ExportState(self.state_path, {
+                'start': self.start, 'end': self.end,
+                'time_series': self.time_series,
+                'intraday': [list(pair) for pair in self.intraday],
+                'collections': self.collections,
+            })
+            stats.skipped = len([user_id for user_id in user_ids
+                                 if str(user_id) in state.done])
+            user_ids = [user_id for user_id in user_ids
+                        if str(user_id) not in state.done]
+            stats.users = len(user_ids)
+
+        queue = Queue(self.queue_size)
+        users = iter(user_ids)
+        lock = threading.Lock()
+        self.stopped.clear()
+        threads = [threading.Thread(target=self._work,
+                                    args=(users, lock, queue))
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        running = len(threads)
+        reported = time.time()
+        try:
+            while running:
+                try:
+                    item = queue.get(timeout=0.1)
+                except Empty:
+                    item = None
+                if item is _STOP:
+                    running -= 1
+                elif item is not None:
+                    _, user_id, error, spool = item
+                    if error is None:
+                        with spool:
+                            for line in spool:
+                                stats.bytes += writer.write(
+                                    json.loads(line.decode('utf8')))
+                                stats.records += 1
+                        # The user is only done once its records are out
+                        writer.flush()
+                        stats.done += 1
+                        if state is not None:
+                            state.add(user_id)
+                    else:
+                        stats.failed[user_id] = error
+                if progress and time.time() - reported >= progress_interval:
+                    progress(stats)
+                    reported = time.time()
+            writer.flush()
+        finally:
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+            if state is not None:
+                state.close()
+        return stats
+
+
+def _token_store(path):
+    from .tokens import FileTokenStore, SqliteTokenStore
+
+    if path.endswith('.json'):
+        return FileTokenStore(path)
+    return SqliteTokenStore(path)
+
+
+def _intraday(value):
+    resource, _, detail_level = value.partition(':')
+    return resource, detail_level or '1min'
+
+
+def add_arguments(parser):
+    """ Add the arguments of the export command to an argparse parser """
+    parser.add_argument('--client-id',
+                        default=os.environ.get('FITBIT_CLIENT_ID'),
+                        help='the app client id (default $FITBIT_CLIENT_ID)')
+    parser.add_argument('--client-secret',
+                        default=os.environ.get('FITBIT_CLIENT_SECRET'),
+                        help='the app client secret '
+                             '(default $FITBIT_CLIENT_SECRET)')
+    parser.add_argument('--tokens', required=True,
+                        help='the token store, a sqlite database or a .json '
+                             'file')
+    parser.add_argument('--users',
+                        help='comma separated user ids (default all the users '
+                             'in the token store)')
+    parser.add_argument('--start', required=True, help='the first date')
+    parser.add_argument('--end', required=True, help='the last date')
+    parser.add_argument('--time-series', action='append', default=[],
+                        metavar='RESOURCE', help='a time series to export')
+    parser.add_argument('--intraday', action='append', default=[],
+                        type=_intraday, metavar='RESOURCE[:DETAIL_LEVEL]',
+                        help='an intraday time series to export')
+    parser.add_argument('--collection', action='append', default=[],
+                        metavar='RESOURCE', help='a collection to export')
+    parser.add_argument('--output', default='-',
+                        help='the file to append to (default stdout)')
+    parser.add_argument('--format', choices=('ndjson', 'parquet'),
+                        default='ndjson')
+    parser.add_argument('--state',
+                        help='the state file, to resume the export')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--queue-size', type=int,
+                        help='how many fetched users may wait to be written '
+                             '(default the number of workers)')
+    parser.add_argument('--rate-limit-db',
+                        help='a sqlite database of rate limits shared with '
+                             'other processes')
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't print the progress")
+
+
+def command(args):
+    """ Run the export command, with the parsed arguments """
+    from .api import Fitbit
+    from .ratelimit import RateLimiter, SqliteRateLimiter
+
+    if not (args.client_id and args.client_secret):
+        sys.stderr.write('The client id and secret are needed\n')
+        return 2
+    if args.format == 'parquet' and args.output == '-':
+        sys.stderr.write('Parquet exports need an --output file\n')
+        return 2
+    if (args.format == 'parquet' and args.state and
+            os.path.exists(args.output)):
+        sys.stderr.write('Parquet exports can not be resumed\n')
+        return 2
+
+    store = _token_store(args.tokens)
+    if args.rate_limit_db:
+        rate_limiter = SqliteRateLimiter(args.rate_limit_db)
+    else:
+        rate_limiter = RateLimiter()
+    fitbit = Fitbit(args.client_id, args.client_secret, token_store=store,
+                    rate_limiter=rate_limiter)
+    if args.users:
+        user_ids = args.users.split(',')
+    else:
+        user_ids = sorted(store.get_many())
+    exporter = Exporter(
+        fitbit, args.start, args.end, time_series=args.time_series,
+        intraday=args.intraday, collections=args.collection,
+        workers=args.workers, queue_size=args.queue_size,
+        state_path=args.state)
+
+    if args.format == 'parquet':
+        writer = ParquetWriter(args.output)
+        output = None
+    elif args.output == '-':
+        output = getattr(sys.stdout, 'buffer', sys.stdout)
+        writer = NdjsonWriter(output)
+    else:
+        output = open(args.output, 'ab')
+        writer = NdjsonWriter(output)
+
+    def progress(stats):
+        sys.stderr.write('%s\n' % stats)
+
+    try:
+        stats = exporter.run(user_ids, writer,
+                             progress=None if args.quiet else progress)
+        writer.close()
+    finally:
+        if output is not None and args.output != '-':
+            output.close()
+        store.close()
+        rate_limiter.close()
+    if not args.quiet:
+        progress(stats)
+    for user_id, error in sorted(stats.failed.items()):
+        sys.stderr.write('%s failed: %r\n' % (user_id, error))
+    return 1 if stats.failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m fitbit export',
+        description='Export the data of the users in a token store')
+    add_arguments(parser)
+    return command(parser.parse_args(argv))
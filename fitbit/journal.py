@@ -0,0 +1,286 @@
+"""
+A journal of collection writes, so timed out writes can be retried without
+creating duplicate logs.
+
+The API has no idempotency keys: a POST which timed out may or may not have
+created its log. A :class:`WriteJournal` records each write before it is
+sent. Before sending it again, it looks for a log matching the write in the
+day's collection (the ``_COLLECTION_RESOURCE`` GET), and only sends it again
+if there is none::
+
+    journal = WriteJournal('journal.db')
+    fitbit = Fitbit(..., timeout=5)
+    journal.write(fitbit, 'activities', data, date='2017-01-01')
+
+Writes which still failed after the retries stay pending in the journal, and
+can be finished later with :meth:`~WriteJournal.resume`. Writes the API
+rejected, e.g. with a validation error, are not sent again, and are listed by
+:meth:`~WriteJournal.rejected`. The journal's
+:meth:`~WriteJournal.call` can also be passed to a
+``fitbit.bulk.BulkWriter``.
+
+Logs are matched on the fields of the write in the ``MATCH`` table, and a log
+already claimed by an earlier identical write in the journal is not taken
+for a later one. Identical logs created outside the journal are taken as
+made by the write. Users are told apart like in ``fitbit.bulk``, by their
+user id for handles from ``Fitbit.for_stored_user``, which is needed to
+resume their writes in another process.
+"""
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+
+from . import exceptions
+from .bulk import Result, call, log_id, user_key
+from .utils import to_date
+
+# The errors after which a write may or may not have been made
+RETRY_ERRORS = (exceptions.Timeout, exceptions.HTTPServerError)
+
+# The errors after which a write wasn't made, and would fail again
+REJECT_ERRORS = (exceptions.HTTPBadRequest, exceptions.HTTPForbidden,
+                 exceptions.HTTPNotFound, exceptions.HTTPConflict)
+
+# The done column of rejected writes
+REJECTED = -1
+
+# By collection: the key of the logs in the collection's GET response, and
+# the fields of the written data mapped to the value in the logs
+MATCH = {
+    'activities': ('activities', {
+        'activityId': lambda log: log.get('activityId'),
+        'activityName': lambda log: log.get('name'),
+        'startTime': lambda log: log.get('startTime'),
+        'durationMillis': lambda log: log.get('duration'),
+    }),
+    'foods/log': ('foods', {
+        'foodId': lambda log: log['loggedFood'].get('foodId'),
+        'mealTypeId': lambda log: log['loggedFood'].get('mealTypeId'),
+        'unitId': lambda log: log['loggedFood'].get('unit', {}).get('id'),
+        'amount': lambda log: log['loggedFood'].get('amount'),
+    }),
+    'foods/log/water': ('water', {
+        'amount': lambda log: log.get('amount'),
+    }),
+    'sleep': ('sleep', {
+        'startTime': lambda log: log.get('startTime', '')[11:16],
+        'duration': lambda log: log.get('duration'),
+    }),
+}
+
+# The collections written by Fitbit methods, for WriteJournal.call
+WRITE_METHODS = {
+    'log_activity': 'activities',
+    'activities': 'activities',
+    'foods_log': 'foods/log',
+    'foods_log_water': 'foods/log/water',
+    'sleep': 'sleep',
+    'log_sleep': 'sleep',
+}
+
+# The positional arguments of the collection methods, after the resource
+COLLECTION_ARGS = ('date', 'user_id', 'data')
+
+
+def _same(a, b):
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+
+def fingerprint(user, resource, date, data):
+    """ A hash identifying a write by its user, collection, date and data """
+    payload = json.dumps([str(user), resource, date, data], sort_keys=True,
+                         default=str)
+    return hashlib.sha1(payload.encode('utf8')).hexdigest()
+
+
+class WriteJournal(object):
+    """
+    Records collection writes in a sqlite database, to retry them safely.
+
+        - path: the database file, or ':memory:'
+        - retries: how often a write is retried after a timeout or a server
+          error
+    """
+
+    def __init__(self, path=':memory:', retries=2):
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS fitbit_writes ('
+                'id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL, '
+                'user TEXT NOT NULL, resource TEXT NOT NULL, '
+                'date TEXT NOT NULL, data TEXT NOT NULL, log_id INTEGER, '
+                'done INTEGER NOT NULL DEFAULT 0)')
+            self.db.execute(
+                'CREATE INDEX IF NOT EXISTS fitbit_writes_fingerprint '
+                'ON fitbit_writes (fingerprint)')
+
+    def _execute(self, query, args=()):
+        with self.lock, self.db:
+            return self.db.execute(query, args).fetchall()
+
+    def write(self, fitbit, resource, data, date=None):
+        """
+        Log data in the collection resource (one of ``MATCH``) on date,
+        which defaults to today, retrying timed out writes. Returns the
+        response of the write, or ``{'log': <log>}`` with the matching log
+        if a timed out write turned out to have been made.
+        """
+        if resource not in MATCH:
+            raise ValueError('Writes to %s can not be journaled' % resource)
+        date = fitbit._get_date_string(date or datetime.date.today())
+        user = str(user_key(fitbit))
+        data = dict(data)
+        data.pop('date', None)
+        with self.lock, self.db:
+            write_id = self.db.execute(
+                'INSERT INTO fitbit_writes (fingerprint, user, resource, '
+                'date, data) VALUES (?, ?, ?, ?, ?)',
+                (fingerprint(user, resource, date, data), user, resource,
+                 date, json.dumps(data))).lastrowid
+        return self._send(fitbit, write_id, resource, date, data, check=False)
+
+    def _send(self, fitbit, write_id, resource, date, data, check=True):
+        for attempt in range(self.retries + 1):
+            if check:
+                log = self.find(fitbit, write_id)
+                if log is not None:
+                    return {'log': log}
+            try:
+                response = fitbit._COLLECTION_RESOURCE(
+                    resource, date=date, data=dict(data))
+            except RETRY_ERRORS:
+                if attempt == self.retries:
+                    raise
+                check = True
+            except REJECT_ERRORS:
+                self._execute('UPDATE fitbit_writes SET done = ? WHERE id = ?',
+                              (REJECTED, write_id))
+                raise
+            else:
+                self._done(write_id, log_id(response))
+                return response
+
+    def _done(self, write_id, log_id):
+        self._execute('UPDATE fitbit_writes SET done = 1, log_id = ? '
+                      'WHERE id = ?', (log_id, write_id))
+
+    def find(self, fitbit, write_id):
+        """
+        Look for the log made by a write in its day's collection. Returns the
+        log, after marking the write as done, or None. Sleep logs are listed
+        on the day the sleep ends, so the next day is looked at too.
+        """
+        (resource, date, data, fp), = self._execute(
+            'SELECT resource, date, data, fingerprint FROM fitbit_writes '
+            'WHERE id = ?', (write_id,))
+        data = json.loads(data)
+        claimed = set(row[0] for row in self._execute(
+            'SELECT log_id FROM fitbit_writes WHERE fingerprint = ? AND '
+            'done = 1 AND log_id IS NOT NULL', (fp,)))
+        key, fields = MATCH[resource]
+        days = [date]
+        if resource == 'sleep':
+            days.append((to_date(date) + datetime.timedelta(days=1)).strftime(
+                '%Y-%m-%d'))
+        for day in days:
+            response = fitbit._COLLECTION_RESOURCE(resource, date=day)
+            for log in response.get(key, []):
+                if log.get('logId') in claimed:
+                    continue
+                if resource == 'sleep' and log.get('startTime', '')[:10] != date:
+                    continue
+                if all(_same(data[field], value(log))
+                       for field, value in fields.items() if field in data):
+                    self._done(write_id, log.get('logId'))
+                    return log
+        return None
+
+    def _ids(self, done, fitbit=None):
+        if fitbit is None:
+            rows = self._execute(
+                'SELECT id FROM fitbit_writes WHERE done = ? ORDER BY id',
+                (done,))
+        else:
+            rows = self._execute(
+                'SELECT id FROM fitbit_writes WHERE done = ? AND user = ? '
+                'ORDER BY id', (done, str(user_key(fitbit))))
+        return [row[0] for row in rows]
+
+    def pending(self, fitbit=None):
+        """
+        Return the ids of the writes not known to be done, of all users, or
+        of the user of a Fitbit handle
+        """
+        return self._ids(0, fitbit)
+
+    def rejected(self, fitbit=None):
+        """
+        Return the ids of the writes the API rejected, of all users, or of
+        the user of a Fitbit handle
+        """
+        return self._ids(REJECTED, fitbit)
+
+    def resume(self, fitbit):
+        """
+        Finish the pending writes of the user of a Fitbit handle, e.g. after
+        a restart, sending only the ones which weren't made
+        """
+        for write_id in self.pending(fitbit):
+            (resource, date, data), = self._execute(
+                'SELECT resource, date, data FROM fitbit_writes WHERE id = ?',
+                (write_id,))
+            self._send(fitbit, write_id, resource, date, json.loads(data))
+
+    def _entry_write(self, entry):
+        """
+        The (resource, date, data) written by a fitbit.bulk entry, with its
+        arguments bound like the Fitbit method binds them, or None if it
+        isn't a collection write of the handle's user
+        """
+        resource = WRITE_METHODS.get(entry.method)
+        if resource is None:
+            return None
+        if entry.method == 'log_activity':
+            data = entry.kwargs.get('data', entry.args[0] if entry.args else None)
+            return resource, data.get('date'), data
+        if entry.method == 'log_sleep':
+            kwargs = dict(zip(('start_time', 'duration'), entry.args),
+                          **entry.kwargs)
+            start_time = kwargs['start_time']
+            return resource, start_time.strftime('%Y-%m-%d'), {
+                'startTime': start_time.strftime('%H:%M'),
+                'duration': kwargs['duration'],
+            }
+        kwargs = dict(zip(COLLECTION_ARGS, entry.args), **entry.kwargs)
+        if not kwargs.get('data') or kwargs.get('user_id') not in (None, '-'):
+            # Reads, and writes for other users, are made as they are
+            return None
+        return resource, kwargs.get('date'), kwargs['data']
+
+    def call(self, entry):
+        """
+        Make the call of a fitbit.bulk entry, through the journal if it is a
+        collection write (see ``WRITE_METHODS``). For
+        fitbit.bulk.BulkWriter(call=journal.call).
+        """
+        write = self._entry_write(entry)
+        if write is None:
+            return call(entry)
+        resource, date, data = write
+        try:
+            response = self.write(entry.fitbit, resource, data, date=date)
+        except Exception as e:
+            return Result(entry, None, None, e)
+        return Result(entry, log_id(response), response, None)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
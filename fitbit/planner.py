@@ -0,0 +1,189 @@
+"""
+Batching of per-day lookups into as few range requests as possible.
+
+Asking for a month of steps one day at a time takes 30 requests, while the
+time series endpoint returns the whole month in one. A :class:`QueryPlanner`
+collects the ``(resource, date)`` pairs a caller needs, fetches them with the
+fewest range requests the API allows, and hands the answers back per date::
+
+    planner = QueryPlanner(fitbit)
+    planner.add_range('activities/steps', '2017-01-01', '2017-01-31')
+    planner.add('body/log/weight', datetime.date(2017, 1, 15))
+    results = planner.execute()
+    results[('activities/steps', datetime.date(2017, 1, 2))]  # '10123'
+
+Resources are one of:
+
+* a time series resource, e.g. ``activities/steps``, ``foods/log/water``,
+  ``body/weight`` or ``sleep/minutesAsleep``, answered with the value of
+  the day, using :meth:`fitbit.Fitbit.time_series`
+* ``body/log/weight`` or ``body/log/fat``, answered with the list of the
+  day's log entries, using the body log endpoints with an end date
+* one of :attr:`fitbit.Fitbit.RESOURCE_LIST`, e.g. ``activities`` or
+  ``sleep``, answered with the day's collection. These have no range
+  endpoint, so they take one request per day. The exception is
+  ``foods/log/water``, which is also a time series resource, and is
+  answered with the day's total.
+"""
+import collections
+import datetime
+
+from .utils import to_date
+
+# The longest date range the API returns in one request, by resource prefix
+MAX_DAYS = [
+    ('body/log/', 31),
+    ('sleep/', 100),
+    ('activities/heart', 365),
+    ('', 1095),
+]
+
+BODY_LOGS = {'body/log/weight': 'weight', 'body/log/fat': 'fat'}
+
+# Collections which are fetched as time series
+TIME_SERIES_COLLECTIONS = ['foods/log/water']
+
+Query = collections.namedtuple('Query', ['resource', 'start', 'end'])
+
+
+def max_days(resource):
+    for prefix, days in MAX_DAYS:
+        if resource.startswith(prefix):
+            return days
+
+
+def windows(dates, days):
+    """
+    Cover the given dates with the fewest ``(start, end)`` windows spanning
+    at most ``days`` days each
+    """
+    result = []
+    for date in sorted(set(dates)):
+        if not result or (date - result[-1][0]).days >= days:
+            result.append([date, date])
+        else:
+            result[-1][1] = date
+    return [tuple(window) for window in result]
+
+
+def runs(dates):
+    """ Group the given dates into ``(start, end)`` runs of consecutive days """
+    result = []
+    for date in sorted(set(dates)):
+        if result and (date - result[-1][1]).days == 1:
+            result[-1][1] = date
+        else:
+            result.append([date, date])
+    return [tuple(run) for run in result]
+
+
+class QueryPlanner(object):
+    """
+    Collects ``(resource, date)`` needs and fetches them in bulk.
+
+    Arguments:
+        fitbit, the Fitbit object to make the requests with
+        [user_id] defaults to the current user
+        [needs] optional iterable of ``(resource, date)`` pairs to add
+        [coverage] optional fitbit.coverage.CoverageIndex of the data held
+            locally; dates it covers are not fetched again, and the dates
+            returned (up to yesterday, as today's data can still change) are
+            added to it, under ``(user, resource, None)`` keys
+        [user] the user the coverage is kept for; defaults to user_id, or
+            to the user id of handles from ``Fitbit.for_stored_user``, and is
+            needed with coverage otherwise, as ``-`` would mix up the users
+    """
+
+    def __init__(self, fitbit, user_id=None, needs=None, coverage=None,
+                 user=None):
+        self.fitbit = fitbit
+        self.user_id = user_id
+        self.coverage = coverage
+        self.user = user or user_id or fitbit.rate_limit_key
+        if coverage is not None and self.user is None:
+            raise ValueError('The user is needed to keep coverage')
+        self.needs = collections.defaultdict(set)
+        for resource, date in needs or []:
+            self.add(resource, date)
+
+    def add(self, resource, date):
+        """ Add the need for one resource on one date """
+        self.needs[resource].add(to_date(date))
+
+    def add_range(self, resource, start, end):
+        """ Add the need for one resource on every date from start to end """
+        start, end = to_date(start), to_date(end)
+        for day in range((end - start).days + 1):
+            self.add(resource, start + datetime.timedelta(days=day))
+
+    def is_collection(self, resource):
+        return (resource in self.fitbit.RESOURCE_LIST and
+                resource not in TIME_SERIES_COLLECTIONS)
+
+    def coverage_key(self, resource):
+        return (self.user, resource, None)
+
+    def plan(self):
+        """ Return the list of queries execute will make """
+        queries = []
+        for resource in sorted(self.needs):
+            dates = self.needs[resource]
+            if self.coverage is not None:
+                key = self.coverage_key(resource)
+                dates = [date for date in dates
+                         if not self.coverage.covered(key, date, date)]
+            if self.is_collection(resource):
+                queries.extend(Query(resource, date, date) for date in sorted(dates))
+            else:
+                queries.extend(
+                    Query(resource, start, end)
+                    for start, end in windows(dates, max_days(resource)))
+        return queries
+
+    def execute(self):
+        """
+        Fetch everything that was added. Returns a dict mapping each
+        ``(resource, date)`` pair to its answer, or None if the API had no
+        data for that date.
+        """
+        results = {}
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        for query in self.plan():
+            answers = self.fetch(query)
+            dates = [date for date in self.needs[query.resource]
+                     if query.start <= date <= query.end]
+            for date in dates:
+                results[(query.resource, date)] = answers.get(date)
+            if self.coverage is None:
+                continue
+            # Windows span the gaps between the needed dates, which aren't
+            # returned, so only the runs of returned dates are covered
+            for start, end in runs(date for date in dates if date <= yesterday):
+                self.coverage.add(self.coverage_key(query.resource), start, end)
+        return results
+
+    def fetch(self, query):
+        """ Make the request for one query, returning its answers by date """
+        resource = query.resource
+        if self.is_collection(resource):
+            response = self.fitbit._COLLECTION_RESOURCE(
+                resource, date=query.start, user_id=self.user_id)
+            return {query.start: response}
+
+        if resource in BODY_LOGS:
+            type_ = BODY_LOGS[resource]
+            response = self.fitbit._get_body(
+                type_, base_date=query.start, user_id=self.user_id,
+                end_date=query.end)
+            answers = collections.defaultdict(list)
+            for entry in response.get(type_, []):
+                answers[to_date(entry['date'])].append(entry)
+            return answers
+
+        response = self.fitbit.time_series(
+            resource, user_id=self.user_id, base_date=query.start,
+            end_date=query.end)
+        return dict(
+            (to_date(entry['dateTime']), entry['value'])
+            for entry in response.get(resource.replace('/', '-'), [])
+        )
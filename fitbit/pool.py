@@ -0,0 +1,53 @@
+"""
+Connection pools that can be shared between many clients. Each user still
+gets their own client and token, but all of their requests to the Fitbit API
+go through the same pool of kept-alive connections, so only the first request
+pays for the TCP and TLS handshakes.
+"""
+import socket
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class PoolAdapter(HTTPAdapter):
+    """
+    A requests transport adapter which can also turn on TCP keep-alive, so
+    idle pooled connections are less likely to be dropped by middleboxes.
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['keepalive']
+
+    def __init__(self, keepalive=True, **kwargs):
+        self.keepalive = keepalive
+        super(PoolAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive:
+            kwargs.setdefault('socket_options', (
+                HTTPConnection.default_socket_options +
+                [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            ))
+        super(PoolAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+def connection_pool(maxsize=10, block=False, keepalive=True, max_retries=0):
+    """
+    Create a connection pool to pass to any number of clients with the
+    ``pool`` keyword argument, e.g.
+    ``Fitbit(<id>, <secret>, pool=connection_pool(maxsize=50))``
+
+        - maxsize: connections kept open per host; the most useful setting
+          is the number of threads making requests at the same time
+        - block: wait for a free connection rather than opening (and then
+          throwing away) an extra one when all of them are in use
+        - keepalive: turn on TCP keep-alive for the pooled connections
+        - max_retries: passed through to requests' ``HTTPAdapter``
+    """
+    # Everything goes to api.fitbit.com, apart from the rare token request
+    return PoolAdapter(
+        keepalive=keepalive,
+        pool_connections=2,
+        pool_maxsize=maxsize,
+        pool_block=block,
+        max_retries=max_retries
+    )
@@ -0,0 +1,162 @@
+"""
+Rate limiters keep the requests made for each user within the API's rate
+limit, 150 requests per user per hour.
+
+A :class:`RateLimiter` counts the requests of one process. A
+:class:`SqliteRateLimiter` keeps the counts in a sqlite database in WAL mode,
+so any number of processes on the same machine share them::
+
+    limiter = SqliteRateLimiter('ratelimit.db')
+    fitbit = Fitbit(CLIENT_ID, CLIENT_SECRET, token_store=store,
+                    rate_limiter=limiter)
+
+Requests wait for the limiter before they are sent. The counts are kept per
+user: by user id for handles returned by ``for_stored_user``, and by a hash
+of the first access token of other handles, kept when their token is
+refreshed. A new ``for_user`` handle made with a refreshed token counts
+afresh, so use ``for_stored_user`` to limit users reliably.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# Fitbit allows 150 requests per user per hour
+LIMIT = 150
+PERIOD = 3600
+
+
+class RateLimiter(object):
+    """
+    Allows ``limit`` requests per key in each window of ``period`` seconds,
+    within one process.
+    """
+
+    def __init__(self, limit=LIMIT, period=PERIOD):
+        self.limit = limit
+        self.period = period
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def _take(self, window, now):
+        """
+        Take a request from a ``(window_start, count)`` window. Returns the
+        new window, and how long to wait before trying again (0 if the
+        request was allowed).
+        """
+        start, count = window or (now, 0)
+        if now >= start + self.period:
+            start, count = now, 0
+        if count < self.limit:
+            return (start, count + 1), 0
+        return (start, count), start + self.period - now
+
+    def _block(self, window, now, seconds):
+        start, count = window or (now, 0)
+        if start + self.period < now + seconds:
+            start = now + seconds - self.period
+        return (start, self.limit)
+
+    def acquire(self, key):
+        """
+        Take a request for key if the limit allows it. Returns how long to
+        wait before trying again, 0 if the request was allowed.
+        """
+        with self.lock:
+            self.windows[key], wait = self._take(
+                self.windows.get(key), time.time())
+        return wait
+
+    def block(self, key, seconds):
+        """
+        Allow no requests for key for the next seconds, e.g. after the API
+        answered with a 429 and a Retry-After header
+        """
+        with self.lock:
+            self.windows[key] = self._block(
+                self.windows.get(key), time.time(), seconds)
+
+    def wait(self, key):
+        """ Wait until a request for key is allowed, and take it """
+        while True:
+            wait = self.acquire(key)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def close(self):
+        pass
+
+
+class SqliteRateLimiter(RateLimiter):
+    """
+    A rate limiter whose counts are shared, through a sqlite database, by all
+    the processes using the same database file. It can be pickled, or
+    inherited by forked processes, which then open their own connection.
+    """
+
+    def __init__(self, path, limit=LIMIT, period=PERIOD,
+                 table='fitbit_rate_limits'):
+        super(SqliteRateLimiter, self).__init__(limit, period)
+        self.path = path
+        self.table = table
+        self._db = self._pid = None
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, '
+            'window_start REAL NOT NULL, count INTEGER NOT NULL)' % table)
+
+    @property
+    def db(self):
+        # sqlite connections can't be shared between processes, so each
+        # process opens its own
+        if self._pid != os.getpid():
+            # Transactions are handled explicitly, see _update
+            self._db = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            self._pid = os.getpid()
+        return self._db
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_db'] = state['_pid'] = None
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _update(self, key, update):
+        key = '' if key is None else str(key)
+        with self.lock:
+            # Take the write lock first, so no other process can change the
+            # window between the read and the write
+            db = self.db
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                row = db.execute(
+                    'SELECT window_start, count FROM %s WHERE key = ?' %
+                    self.table, (key,)).fetchone()
+                window, result = update(row, time.time())
+                db.execute(
+                    'INSERT OR REPLACE INTO %s (key, window_start, count) '
+                    'VALUES (?, ?, ?)' % self.table, (key,) + tuple(window))
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        return result
+
+    def acquire(self, key):
+        return self._update(key, self._take)
+
+    def block(self, key, seconds):
+        self._update(key, lambda window, now: (
+            self._block(window, now, seconds), None))
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._db.close()
+            self._db = self._pid = None
@@ -0,0 +1,174 @@
+"""
+Running a function for many users at once, in a pool of processes.
+
+Decoding the API's JSON responses costs enough CPU that one process can't use
+a whole rate limit quota. A :class:`Runner` shards the users across worker
+processes instead. Each worker owns the ``Fitbit`` handles (and connection
+pool) of the users given to it, while the tokens and rate limit counts are
+shared through sqlite databases::
+
+    def steps(fitbit, period):
+        return fitbit.time_series('activities/steps', period=period)
+
+    runner = Runner(CLIENT_ID, CLIENT_SECRET, 'tokens.db',
+                    rate_limiter=SqliteRateLimiter('ratelimit.db'),
+                    processes=4)
+    for user_id, result, error in runner.run(steps, user_ids, '7d'):
+        ...
+
+The function is called with the user's ``Fitbit`` handle and the extra
+arguments, and must be importable by the workers (defined at module level).
+Its result, or the exception it raised, is sent back to the parent process.
+
+Users are sent to the worker with the least work queued when they are first
+seen, and stay with that worker for the rest of the run, so each user's
+token is only ever refreshed by one process.
+"""
+import multiprocessing
+import pickle
+
+try:
+    from queue import Empty
+except ImportError:
+    # Python 2.x
+    from Queue import Empty
+
+from . import exceptions
+
+_DONE = object()
+
+
+def _picklable(error):
+    """ Exceptions which can't be sent back are replaced by their repr """
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(repr(error))
+
+
+def _worker(config, tasks, results):
+    from .api import Fitbit
+    from .tokens import SqliteTokenStore, WriteBehindTokenStore
+
+    client_id, client_secret, token_db, rate_limiter, retries, kwargs = config
+    store = WriteBehindTokenStore(SqliteTokenStore(token_db))
+    fitbit = Fitbit(client_id, client_secret, token_store=store,
+                    rate_limiter=rate_limiter, **kwargs)
+    handles = {}
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            user_id, func, args = task
+            result, error = None, None
+            for attempt in range(retries + 1):
+                try:
+                    if user_id not in handles:
+                        handles[user_id] = fitbit.for_stored_user(user_id)
+                    result, error = func(handles[user_id], *args), None
+                    break
+                except exceptions.HTTPTooManyRequests as e:
+                    # The rate limiter makes the next attempt wait
+                    error = e
+                except Exception as e:
+                    error = e
+                    break
+            results.put((user_id, result, error and _picklable(error)))
+    finally:
+        store.close()
+        if rate_limiter is not None:
+            rate_limiter.close()
+
+
+class Runner(object):
+    """
+    Runs functions for many users in a pool of worker processes.
+
+    Arguments:
+        client_id, client_secret, the app credentials
+        token_db, the path of the fitbit.tokens.SqliteTokenStore database
+            holding the users' tokens
+        [rate_limiter] a fitbit.ratelimit.SqliteRateLimiter, to share rate
+            limits between the workers (and any other process using its
+            database)
+        [processes] the number of workers, defaults to the number of CPUs
+        [retries] how often a function is retried after a 429 response
+        [max_queued] the most tasks queued per worker
+        Other keyword arguments are passed on to Fitbit, and must be
+        picklable.
+    """
+
+    def __init__(self, client_id, client_secret, token_db, rate_limiter=None,
+                 processes=None, retries=3, max_queued=4, **kwargs):
+        self.config = (client_id, client_secret, token_db, rate_limiter,
+                       retries, kwargs)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_queued = max_queued
+
+    def run(self, func, user_ids, *args):
+        """
+        Call ``func(fitbit, *args)`` for each user id, with that user's
+        Fitbit handle. Yields a ``(user_id, result, error)`` tuple per user,
+        in the order they finish, where error is the exception the function
+        raised, or None.
+        """
+        results = multiprocessing.Queue()
+        queues, workers = [], []
+        for i in range(self.processes):
+            queues.append(multiprocessing.Queue())
+            workers.append(multiprocessing.Process(
+                target=_worker, args=(self.config, queues[i], results)))
+            workers[i].daemon = True
+            workers[i].start()
+
+        owners = {}
+        queued = [0] * self.processes
+        user_ids = iter(user_ids)
+        pending = _DONE
+        try:
+            while True:
+                # Queue tasks until the workers have enough to do
+                while True:
+                    if pending is _DONE:
+                        pending = next(user_ids, _DONE)
+                        if pending is _DONE:
+                            break
+                    worker = owners.get(pending)
+                    if worker is None:
+                        worker = queued.index(min(queued))
+                    if queued[worker] >= self.max_queued:
+                        break
+                    owners[pending] = worker
+                    queued[worker] += 1
+                    queues[worker].put((pending, func, args))
+                    pending = _DONE
+                if not any(queued):
+                    break
+
+                result = self._result(results, workers)
+                queued[owners[result[0]]] -= 1
+                yield result
+        finally:
+            for queue in queues:
+                queue.put(None)
+            # Workers only exit once their results are read, even the ones
+            # of tasks still queued when the caller stopped early
+            while any(worker.is_alive() for worker in workers):
+                try:
+                    results.get(timeout=0.1)
+                except Empty:
+                    pass
+            for worker in workers:
+                worker.join()
+
+    def _result(self, results, workers):
+        while True:
+            try:
+                return results.get(timeout=1)
+            except Empty:
+                for worker in workers:
+                    if not worker.is_alive():
+                        raise RuntimeError(
+                            'A worker exited with code %s' % worker.exitcode)
@@ -0,0 +1,182 @@
+"""
+Read-only snapshots of catalog data, shared by processes through ``mmap``.
+
+Many worker processes each loading the food and activity catalogs hold as
+many copies of them. A snapshot file is instead mapped into memory, so all
+the processes share the operating system's one copy of its pages, and
+looking a record up only decodes that record::
+
+    write_snapshot('catalog.snap', tables_from_catalogs(
+        activity_catalog=activities, food_catalog=foods))
+
+    # In each worker
+    snapshot = Snapshot('catalog.snap')
+    snapshot.get('activities', 90009)
+    snapshot.get('activity_names', 'running')
+
+A snapshot holds named tables of JSON records, keyed either by integers or
+by strings. Each table has an index of fixed width entries sorted by key,
+pointing at its records, which is binary searched in place.
+
+The file layout, all integers little endian:
+
+* the magic ``FBSNAP1\\0`` and the number of tables, as a uint32
+* per table: its name, 32 bytes padded with NULs, its key type (0 for
+  integers, 1 for strings) as a uint8, its number of records as a uint32 and
+  the offset of its index as a uint64
+* the records, as UTF-8 JSON, and the keys of string keyed tables
+* per table, the index entries: for integer keys, the key as an int64, and
+  the offset and length of the record as a uint64 and a uint32; for string
+  keys, the offset and length of the key, then of the record
+"""
+import json
+import mmap
+import struct
+
+from .utils import atomic_write
+
+MAGIC = b'FBSNAP1\0'
+HEADER = struct.Struct('<8sI')
+TABLE = struct.Struct('<32sBIQ')
+INT_ENTRY = struct.Struct('<qQI')
+STR_ENTRY = struct.Struct('<QIQI')
+
+INT_KEYS, STR_KEYS = 0, 1
+
+
+def write_snapshot(path, tables):
+    """
+    Write a snapshot file atomically, from a dict of table names to dicts of
+    records, keyed by integers or by strings
+    """
+    names = sorted(tables)
+    data = bytearray()
+    offset = HEADER.size + TABLE.size * len(names)
+    indexes = []
+    for name in names:
+        records = tables[name]
+        str_keys = any(not isinstance(key, int) for key in records)
+        entries = []
+        for key, record in records.items():
+            record = json.dumps(record, separators=(',', ':')).encode('utf8')
+            record_offset = offset + len(data)
+            data += record
+            if str_keys:
+                key = key.encode('utf8')
+                key_offset = offset + len(data)
+                data += key
+                entries.append((key, key_offset, len(key), record_offset,
+                                len(record)))
+            else:
+                entries.append((key, record_offset, len(record)))
+        entries.sort()
+        indexes.append((str_keys, entries))
+
+    table_headers = []
+    for name, (str_keys, entries) in zip(names, indexes):
+        if len(name.encode('utf8')) > 32:
+            raise ValueError('The table name %s is too long' % name)
+        table_headers.append(TABLE.pack(
+            name.encode('utf8'), STR_KEYS if str_keys else INT_KEYS,
+            len(entries), offset + len(data)))
+        for entry in entries:
+            if str_keys:
+                data += STR_ENTRY.pack(*entry[1:])
+            else:
+                data += INT_ENTRY.pack(*entry)
+
+    with atomic_write(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(names)))
+        f.write(b''.join(table_headers))
+        f.write(data)
+
+
+def tables_from_catalogs(activity_catalog=None, food_catalog=None):
+    """
+    Return the tables of a snapshot of fitbit.catalog catalogs:
+
+    * ``activities``, activities and activity levels by id
+    * ``activity_names``, activity ids by lower case name
+    * ``foods``, foods by id
+    * ``food_units``, food units by id, if the catalog has them
+    """
+    tables = {}
+    if activity_catalog is not None:
+        tables['activities'] = activity_catalog.activities
+        tables['activity_names'] = activity_catalog.names
+    if food_catalog is not None:
+        tables['foods'] = food_catalog.foods
+        tables['food_units'] = dict(
+            (unit['id'], unit) for unit in food_catalog.units or [])
+    return tables
+
+
+class Snapshot(object):
+    """ A snapshot file, mapped into memory for lookups """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a snapshot' % path)
+        self.tables = {}
+        for i in range(count):
+            name, key_type, size, index = TABLE.unpack_from(
+                self.map, HEADER.size + i * TABLE.size)
+            self.tables[name.rstrip(b'\0').decode('utf8')] = (
+                key_type, size, index)
+
+    def _entry(self, key_type, index, i):
+        if key_type == STR_KEYS:
+            key_offset, key_length, offset, length = STR_ENTRY.unpack_from(
+                self.map, index + i * STR_ENTRY.size)
+            key = self.map[key_offset:key_offset + key_length]
+        else:
+            key, offset, length = INT_ENTRY.unpack_from(
+                self.map, index + i * INT_ENTRY.size)
+        return key, offset, length
+
+    def get(self, table, key, default=None):
+        """ Return the record of a key in a table, or default """
+        key_type, size, index = self.tables[table]
+        if key_type == STR_KEYS:
+            key = key.encode('utf8')
+        else:
+            try:
+                key = int(key)
+            except ValueError:
+                return default
+        lo, hi = 0, size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, offset, length = self._entry(key_type, index, mid)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return json.loads(
+                    self.map[offset:offset + length].decode('utf8'))
+        return default
+
+    def keys(self, table):
+        """ Return the keys of a table, in order """
+        key_type, size, index = self.tables[table]
+        keys = [self._entry(key_type, index, i)[0] for i in range(size)]
+        if key_type == STR_KEYS:
+            keys = [key.decode('utf8') for key in keys]
+        return keys
+
+    def __len__(self):
+        return sum(size for key_type, size, index in self.tables.values())
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,120 @@
+"""
+Picklable descriptions of Fitbit clients, to send to worker processes or
+task queues.
+
+A ``Fitbit`` object holds a connection pool and an OAuth 2 session with
+callbacks, so it can't be pickled. A :class:`FitbitClientSpec` is a small
+tuple with just what is needed to make one again::
+
+    spec = FitbitClientSpec(CLIENT_ID, secret_env='FITBIT_CLIENT_SECRET',
+                            user_id='USER', token_db='tokens.db', timeout=10)
+    executor.submit(job, spec)
+
+    # In the worker
+    def job(spec):
+        fitbit = spec.client()
+        ...
+
+:meth:`~FitbitClientSpec.client` keeps one ``Fitbit`` object per process for
+each app, so clients made from specs in the same process share a connection
+pool (and token store), and making one is about as cheap as
+``Fitbit.for_user``.
+"""
+import collections
+import os
+import threading
+
+from .api import Fitbit
+from .tokens import SqliteTokenStore
+
+_FIELDS = ['client_id', 'client_secret', 'secret_env', 'token', 'user_id',
+           'token_db', 'system', 'options']
+
+# The Fitbit objects of this process, see _shared_fitbit
+_shared = {}
+_lock = threading.Lock()
+
+
+class FitbitClientSpec(collections.namedtuple('FitbitClientSpec', _FIELDS)):
+    """
+    How to make a Fitbit client.
+
+    Arguments:
+        client_id, the app's client id
+        [client_secret] the app's client secret, or
+        [secret_env] the name of the environment variable holding it, to
+            keep the secret out of pickles
+        [token] the user's token dict
+        [user_id] the id of the user in the sqlite token store at
+        [token_db], which the token is read from if not given, and
+            refreshed tokens are saved to
+        [system] the unit system, see Fitbit
+        Other keyword arguments, e.g. ``timeout`` or ``http2``, are passed on
+        to Fitbit, and must be picklable.
+    """
+    __slots__ = ()
+
+    def __new__(cls, client_id, client_secret=None, secret_env=None,
+                token=None, user_id=None, token_db=None, system=Fitbit.US,
+                **options):
+        return super(FitbitClientSpec, cls).__new__(
+            cls, client_id, client_secret, secret_env, token, user_id,
+            token_db, system, tuple(sorted(options.items())))
+
+    def __reduce__(self):
+        # __new__ takes the options as keyword arguments, so unpickle the
+        # plain tuple instead
+        return (_from_tuple, (tuple(self),))
+
+    @classmethod
+    def from_fitbit(cls, fitbit, user_id=None, token_db=None, **options):
+        """
+        Describe an existing Fitbit object. Its token is included unless
+        user_id and token_db are given.
+        """
+        client = fitbit.client
+        token = None
+        if user_id is None or token_db is None:
+            token = dict(
+                (key, client.token[key])
+                for key in ('access_token', 'refresh_token', 'expires_at')
+                if key in client.token)
+        if client.timeout is not None:
+            options.setdefault('timeout', client.timeout)
+        return cls(client.client_id, client.client_secret, token=token,
+                   user_id=user_id, token_db=token_db, system=fitbit.system,
+                   **options)
+
+    def client(self):
+        """ Return a Fitbit object for this spec, reusing this process' pool """
+        secret = self.client_secret
+        if secret is None and self.secret_env is not None:
+            secret = os.environ[self.secret_env]
+        fitbit = _shared_fitbit(self.client_id, secret, self.token_db,
+                                self.system, self.options)
+        if self.token is not None and self.user_id is not None and self.token_db:
+            return fitbit.for_stored_user(self.user_id, self.token)
+        if self.token is not None:
+            return fitbit.for_user(
+                self.token['access_token'],
+                self.token['refresh_token'],
+                expires_at=self.token.get('expires_at'))
+        return fitbit.for_stored_user(self.user_id)
+
+
+def _from_tuple(values):
+    return tuple.__new__(FitbitClientSpec, values)
+
+
+def _shared_fitbit(client_id, client_secret, token_db, system, options):
+    # Forked processes must not use their parent's connections, so the
+    # objects are kept per process id
+    key = (os.getpid(), client_id, client_secret, token_db, system, options)
+    with _lock:
+        fitbit = _shared.get(key)
+        if fitbit is None:
+            store = token_db and SqliteTokenStore(token_db)
+            fitbit = _shared[key] = Fitbit(
+                client_id, client_secret, system=system, token_store=store,
+                **dict(options))
+    return fitbit
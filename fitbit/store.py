@@ -0,0 +1,319 @@
+"""
+A local store of time series, in append-only columnar files, for analytics
+which shouldn't need the API or JSON again.
+
+Series are kept per user, resource (e.g. ``activities/steps``) and resolution,
+``1d`` for ``time_series`` responses, or the detail level (``1min``, ``15min``,
+``1sec``) of ``intraday_time_series`` responses::
+
+    store = TimeSeriesStore('series')
+    store.add_response('USER', fitbit.intraday_time_series(
+        'activities/heart', base_date='2017-01-01', detail_level='1sec'))
+
+    series = store.range('USER', 'activities/heart', '1sec',
+                         '2017-01-01 08:00', '2017-01-01 09:00')
+    store.resample('USER', 'activities/heart', '1sec', start, end, 60)
+    store.latest('USER', 'activities/steps', '1d')
+
+Each series is a directory with two columns, ``timestamps`` (seconds since
+the epoch, of the user's local time, as int64) and ``values`` (float64), in
+the machine's byte order, and ``index.json``, the row and length of the chunk
+of each day. Writing a day again appends a new chunk, which replaces the old
+one in the index. Reads map the columns into memory and only copy the rows
+of the range. A store should have one writing process at a time; stores of
+other processes read the days it adds, as they reload a series' index when
+it changes.
+"""
+import array
+import bisect
+import calendar
+import collections
+import datetime
+import json
+import mmap
+import os
+import threading
+
+from .utils import atomic_write, to_date
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+Series = collections.namedtuple('Series', ['timestamps', 'values'])
+
+INTRADAY_UNITS = {'second': 'sec', 'minute': 'min'}
+
+RESAMPLE = {
+    'mean': lambda values: sum(values) / len(values),
+    'sum': sum,
+    'min': min,
+    'max': max,
+    'first': lambda values: values[0],
+    'last': lambda values: values[-1],
+}
+
+
+def timestamp(value):
+    """
+    Return the seconds since the epoch of a datetime, a date, or a
+    ``%Y-%m-%d`` or ``%Y-%m-%d %H:%M[:%S]`` string
+    """
+    if not isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.replace('T', ' ')
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                value = datetime.datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError('Invalid date or time %s' % value)
+    return calendar.timegm(value.timetuple())
+
+
+def _seconds(time):
+    parts = [int(part) for part in time.split(':')]
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+
+
+def _value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Column(object):
+    """ A column file, appended to, and mapped into memory for reads """
+
+    def __init__(self, path, typecode):
+        self.path = path
+        self.typecode = typecode
+        self.map = None
+        self.view = None
+
+    def rows(self):
+        try:
+            return os.path.getsize(self.path) // 8
+        except OSError:
+            return 0
+
+    def append(self, values):
+        with open(self.path, 'ab') as f:
+            array.array(self.typecode, values).tofile(f)
+
+    def read(self, rows):
+        """ A view of the first rows of the column, at least """
+        if self.view is None or len(self.view) < rows:
+            self.close()
+            with open(self.path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map).cast(self.typecode)
+        return self.view
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.map.close()
+            self.view = self.map = None
+
+
+class _SeriesFiles(object):
+    """ The files of one series """
+
+    def __init__(self, path):
+        self.path = path
+        self.timestamps = _Column(os.path.join(path, 'timestamps'), 'q')
+        self.values = _Column(os.path.join(path, 'values'), 'd')
+        self.index_path = os.path.join(path, 'index.json')
+        # Sorted days, as days since the epoch, and their (row, length) chunks
+        self.days = []
+        self.chunks = {}
+        self.version = None
+        self.refresh()
+
+    def _index_version(self):
+        # The index is replaced on each write, so a new inode tells it apart
+        # even where mtimes are coarse
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self):
+        """ Reload the index if another store wrote it since it was read """
+        version = self._index_version()
+        if version == self.version:
+            return
+        days, chunks = [], {}
+        if version is not None:
+            with open(self.index_path) as f:
+                for day, chunk in json.load(f)['days']:
+                    days.append(day)
+                    chunks[day] = tuple(chunk)
+        self.days, self.chunks, self.version = days, chunks, version
+
+    def append(self, day, timestamps, values):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        # Rows past the index, from an interrupted append, are left unused
+        row = self.values.rows()
+        if self.timestamps.rows() != row:
+            raise ValueError('The columns of %s have different lengths' %
+                             self.path)
+        self.timestamps.append(timestamps)
+        self.values.append(values)
+        if day not in self.chunks:
+            bisect.insort(self.days, day)
+        self.chunks[day] = (row, len(values))
+        with atomic_write(self.index_path) as f:
+            json.dump({'days': [[d, self.chunks[d]] for d in self.days]}, f)
+        self.version = self._index_version()
+
+    def range(self, start, end):
+        """ The rows from timestamps start to end, inclusive """
+        timestamps, values = array.array('q'), array.array('d')
+        first = bisect.bisect_left(self.days, start // 86400)
+        last = bisect.bisect_right(self.days, end // 86400)
+        if first == last:
+            return Series(timestamps, values)
+        rows = max(sum(self.chunks[day]) for day in self.days[first:last])
+        if not rows:
+            return Series(timestamps, values)
+        ts_view = self.timestamps.read(rows)
+        value_view = self.values.read(rows)
+        for day in self.days[first:last]:
+            row, length = self.chunks[day]
+            chunk = ts_view[row:row + length]
+            lo = bisect.bisect_left(chunk, start)
+            hi = bisect.bisect_right(chunk, end)
+            timestamps.frombytes(chunk[lo:hi].cast('B'))
+            values.frombytes(value_view[row + lo:row + hi].cast('B'))
+        return Series(timestamps, values)
+
+    def close(self):
+        self.timestamps.close()
+        self.values.close()
+
+
+class TimeSeriesStore(object):
+    """
+    Time series kept in a directory, per user, resource and resolution.
+
+    Arguments:
+        path, the directory of the store
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def _files(self, user, resource, resolution):
+        key = (str(user), resource, resolution)
+        files = self.series.get(key)
+        if files is None:
+            files = self.series[key] = _SeriesFiles(os.path.join(
+                self.path, key[0], resource.replace('/', '.'), resolution))
+        else:
+            files.refresh()
+        return files
+
+    def append(self, user, resource, resolution, date, timestamps, values):
+        """
+        Store the rows of a day, replacing any stored for that day. The
+        timestamps are in seconds since the epoch, and sorted.
+        """
+        day = (to_date(date) - EPOCH.date()).days
+        with self.lock:
+            self._files(user, resource, resolution).append(
+                day, timestamps, values)
+
+    def add_response(self, user, response):
+        """
+        Store the series of a ``time_series`` or ``intraday_time_series``
+        response. Values which aren't numbers, like the heart rate zones of
+        daily heart rate series, are left out.
+        """
+        for key, data in response.items():
+            if key.endswith('-intraday'):
+                continue
+            resource = key.replace('-', '/')
+            intraday = response.get(key + '-intraday')
+            if intraday is not None:
+                date = data[0]['dateTime']
+                resolution = '%d%s' % (intraday['datasetInterval'],
+                                       INTRADAY_UNITS[intraday['datasetType']])
+                base = timestamp(date)
+                rows = [(base + _seconds(point['time']), _value(point['value']))
+                        for point in intraday['dataset']]
+                self._append_rows(user, resource, resolution, date, rows)
+                continue
+            days = collections.OrderedDict()
+            for point in data:
+                days.setdefault(point['dateTime'], []).append(
+                    (timestamp(point['dateTime']), _value(point['value'])))
+            for date, rows in days.items():
+                self._append_rows(user, resource, '1d', date, rows)
+
+    def _append_rows(self, user, resource, resolution, date, rows):
+        rows = sorted(row for row in rows if row[1] is not None)
+        self.append(user, resource, resolution, date,
+                    [row[0] for row in rows], [row[1] for row in rows])
+
+    def range(self, user, resource, resolution, start, end):
+        """
+        Return the stored rows from start to end, inclusive, as a ``Series``
+        of timestamps and values arrays. start and end are datetimes, dates
+        or strings (see ``timestamp``); a date as end includes that whole day.
+        """
+        start = timestamp(start)
+        if isinstance(end, datetime.datetime) or len(str(end)) > 10:
+            end = timestamp(end)
+        else:
+            end = timestamp(end) + 86399
+        with self.lock:
+            return self._files(user, resource, resolution).range(start, end)
+
+    def resample(self, user, resource, resolution, start, end, seconds,
+                 how='mean'):
+        """
+        Return the rows from start to end grouped into buckets of a number of
+        seconds, aggregated by how: 'mean', 'sum', 'min', 'max', 'first' or
+        'last'. Buckets are timestamped with their start, and buckets
+        without rows are left out.
+        """
+        aggregate = RESAMPLE[how]
+        series = self.range(user, resource, resolution, start, end)
+        timestamps, values = array.array('q'), array.array('d')
+        bucket, bucket_values = None, []
+        for ts, value in zip(series.timestamps, series.values):
+            ts -= ts % seconds
+            if ts != bucket and bucket_values:
+                timestamps.append(bucket)
+                values.append(aggregate(bucket_values))
+                bucket_values = []
+            bucket = ts
+            bucket_values.append(value)
+        if bucket_values:
+            timestamps.append(bucket)
+            values.append(aggregate(bucket_values))
+        return Series(timestamps, values)
+
+    def latest(self, user, resource, resolution):
+        """ Return the last stored (datetime, value), or None """
+        with self.lock:
+            files = self._files(user, resource, resolution)
+            for day in reversed(files.days):
+                row, length = files.chunks[day]
+                if length:
+                    ts = files.timestamps.read(row + length)[row + length - 1]
+                    value = files.values.read(row + length)[row + length - 1]
+                    return (EPOCH + datetime.timedelta(seconds=ts), value)
+        return None
+
+    def close(self):
+        with self.lock:
+            for files in self.series.values():
+                files.close()
+            self.series.clear()
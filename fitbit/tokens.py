@@ -0,0 +1,282 @@
+"""
+Token stores keep the OAuth 2 tokens of many users, keyed by user id.
+
+A store replaces threading ``access_token``, ``refresh_token`` and
+``expires_at`` through every ``Fitbit(...)`` call, and saving refreshed
+tokens in a ``refresh_cb``::
+
+    store = WriteBehindTokenStore(SqliteTokenStore('tokens.db'))
+    fitbit = Fitbit(CLIENT_ID, CLIENT_SECRET, token_store=store)
+    steps = fitbit.for_stored_user('USER').time_series('activities/steps')
+    ...
+    store.close()
+
+Tokens are the dicts returned by the API (and passed to ``refresh_cb``),
+with at least ``access_token`` and ``refresh_token`` keys.
+
+All stores are safe to use from several threads. Wrapping a store in a
+:class:`WriteBehindTokenStore` takes the writes of refreshed tokens off the
+request path: they are written in batches by a background thread, and
+:meth:`~WriteBehindTokenStore.close` (or :meth:`~TokenStore.flush`) writes
+the rest before returning.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+
+from .utils import atomic_write
+
+
+class TokenStore(object):
+    """
+    The interface of all token stores. Subclasses implement ``get_many`` and
+    ``set_many``.
+    """
+
+    def get(self, user_id):
+        """ Return the token of a user, or None """
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids=None):
+        """
+        Return a dict of user ids to tokens, for the given user ids, or for
+        all users. Users without a token are left out.
+        """
+        raise NotImplementedError
+
+    def set(self, user_id, token):
+        """ Save the token of a user """
+        self.set_many({user_id: token})
+
+    def set_many(self, tokens):
+        """ Save a dict of user ids to tokens """
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        """ Forget the token of a user """
+        raise NotImplementedError
+
+    def flush(self):
+        """ Make sure all the tokens set so far are saved """
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class MemoryTokenStore(TokenStore):
+    """ Keeps the tokens in a dict, e.g. for tests or short lived scripts """
+
+    def __init__(self, tokens=None):
+        self.tokens = dict(tokens or {})
+        self.lock = threading.Lock()
+
+    def get_many(self, user_ids=None):
+        with self.lock:
+            if user_ids is None:
+                return dict(self.tokens)
+            return dict((user_id, self.tokens[user_id])
+                        for user_id in user_ids if user_id in self.tokens)
+
+    def set_many(self, tokens):
+        with self.lock:
+            self.tokens.update(tokens)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.tokens.pop(user_id, None)
+
+
+class FileTokenStore(MemoryTokenStore):
+    """
+    Keeps the tokens in a JSON file, which is read once and rewritten
+    atomically on every write. Best for a modest number of users; wrap it in
+    a :class:`WriteBehindTokenStore` to rewrite it once per batch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        tokens = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                tokens = json.load(f)
+        super(FileTokenStore, self).__init__(tokens)
+
+    def _save(self):
+        with atomic_write(self.path) as f:
+            json.dump(self.tokens, f)
+
+    def set_many(self, tokens):
+        with self.lock:
+            self.tokens.update(tokens)
+            self._save()
+
+    def delete(self, user_id):
+        with self.lock:
+            if self.tokens.pop(user_id, None) is not None:
+                self._save()
+
+
+class SqliteTokenStore(TokenStore):
+    """
+    Keeps the tokens in a sqlite database, one row per user. A batch of
+    tokens is written in a single transaction.
+
+        - path: the database file, or ':memory:'
+        - table: the name of the table, created if needed
+    """
+
+    def __init__(self, path, table='fitbit_tokens'):
+        self.table = table
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS %s '
+                '(user_id TEXT PRIMARY KEY, token TEXT NOT NULL)' % table)
+
+    def get_many(self, user_ids=None):
+        query = 'SELECT user_id, token FROM %s' % self.table
+        with self.lock:
+            if user_ids is None:
+                rows = self.db.execute(query).fetchall()
+            else:
+                rows = []
+                user_ids = list(user_ids)
+                # Stay below sqlite's limit of host parameters
+                for start in range(0, len(user_ids), 500):
+                    chunk = user_ids[start:start + 500]
+                    rows.extend(self.db.execute(
+                        '%s WHERE user_id IN (%s)' % (
+                            query, ', '.join('?' * len(chunk))),
+                        chunk).fetchall())
+        return dict((user_id, json.loads(token)) for user_id, token in rows)
+
+    def set_many(self, tokens):
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO %s (user_id, token) VALUES (?, ?)' %
+                self.table,
+                [(user_id, json.dumps(token))
+                 for user_id, token in tokens.items()])
+
+    def delete(self, user_id):
+        with self.lock, self.db:
+            self.db.execute(
+                'DELETE FROM %s WHERE user_id = ?' % self.table, (user_id,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class WriteBehindTokenStore(TokenStore):
+    """
+    Wraps another store, so setting a token only queues it. A background
+    thread writes the queued tokens to the wrapped store in batches, at most
+    every ``interval`` seconds. Reads see the queued tokens straight away.
+    Only the latest token of each user is written.
+
+        - store: the TokenStore to write to
+        - interval: how long to collect a batch, in seconds
+        - max_batch: write as soon as this many users have queued tokens
+
+    The queued tokens are flushed at interpreter exit, but call ``close``
+    when shutting down to be sure they are written.
+    """
+
+    def __init__(self, store, interval=1.0, max_batch=500):
+        self.store = store
+        self.interval = interval
+        self.max_batch = max_batch
+        self.pending = {}
+        # The batch being written, still read from here until it is written
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        # Held while a batch is written, so flush waits for it
+        self.write_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def get_many(self, user_ids=None):
+        with self.lock:
+            pending = dict(self.in_flight)
+            pending.update(self.pending)
+        if user_ids is None:
+            tokens = self.store.get_many()
+        else:
+            tokens = self.store.get_many(
+                [user_id for user_id in user_ids if user_id not in pending])
+            pending = dict((user_id, pending[user_id])
+                           for user_id in user_ids if user_id in pending)
+        tokens.update(pending)
+        return tokens
+
+    def set_many(self, tokens):
+        if self.closed:
+            raise ValueError('The token store is closed')
+        with self.lock:
+            self.pending.update(tokens)
+            full = len(self.pending) >= self.max_batch
+        if full:
+            self.wakeup.set()
+
+    def delete(self, user_id):
+        with self.write_lock:
+            with self.lock:
+                self.pending.pop(user_id, None)
+            self.store.delete(user_id)
+
+    def _write(self):
+        with self.write_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+                self.in_flight = batch
+            if batch:
+                try:
+                    self.store.set_many(batch)
+                except Exception:
+                    # Put the batch back, unless newer tokens were set
+                    with self.lock:
+                        batch.update(self.pending)
+                        self.pending = batch
+                        self.in_flight = {}
+                    raise
+                with self.lock:
+                    self.in_flight = {}
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self._write()
+            except Exception:
+                # Retried with the next batch, or raised by flush
+                pass
+
+    def flush(self):
+        self._write()
+        self.store.flush()
+
+    def _flush_at_exit(self):
+        # Python 2.x has no atexit.unregister, so closed stores stay registered
+        if not self.closed:
+            self.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        self.store.close()
+        if hasattr(atexit, 'unregister'):
+            atexit.unregister(self._flush_at_exit)
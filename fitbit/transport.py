@@ -0,0 +1,229 @@
+"""
+Transports send the HTTP requests of a :class:`fitbit.FitbitOauth2Client`.
+
+By default a client sends its requests through its own ``requests_oauthlib``
+session. Passing a transport, e.g. ``Fitbit(..., transport=HttpxTransport())``
+makes the client add the OAuth 2 bearer token and refresh expired tokens
+itself, and hand only the plain HTTP requests to the transport. One transport,
+with its connection pool, can then be shared by the clients of any number of
+users.
+
+All transports have the same interface:
+
+* ``send(method, url, headers=None, data=None, timeout=None)`` returns a
+  response with ``status_code``, ``content`` and ``headers``
+* ``stream(...)``, with the same arguments, is a context manager giving a
+  response whose body is read with ``iter_bytes(chunk_size)``
+* ``close()`` closes the pooled connections
+
+Timeouts are raised as :class:`fitbit.exceptions.Timeout` by all of them.
+The ``httpx`` and ``urllib3`` transports need those packages installed, and
+HTTP/2 needs ``httpx[http2]``.
+"""
+import contextlib
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    # Python 2.x
+    from urllib import urlencode
+
+from . import exceptions
+
+
+class Response(object):
+    """ A response, for transports whose own responses look different """
+
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf8')
+
+    def iter_bytes(self, chunk_size=65536):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class Transport(object):
+    """ The interface of all transports """
+
+    def send(self, method, url, headers=None, data=None, timeout=None):
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None):
+        # Transports which can't stream read the whole body at once
+        yield self.send(method, url, headers=headers, data=data,
+                        timeout=timeout)
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    Sends requests with a single ``requests`` session, shared by all clients
+    using this transport.
+
+        - pool: optional connection pool, see fitbit.pool.connection_pool
+    """
+
+    def __init__(self, pool=None):
+        import requests
+        from .pool import connection_pool
+
+        self.session = requests.Session()
+        self.session.mount('https://', pool or connection_pool())
+
+    def _request(self, method, url, headers, data, timeout, stream=False):
+        import requests
+
+        try:
+            return self.session.request(
+                method, url, headers=headers, data=data, timeout=timeout,
+                stream=stream)
+        except requests.Timeout as e:
+            raise exceptions.Timeout(*e.args)
+
+    def send(self, method, url, headers=None, data=None, timeout=None):
+        return self._request(method, url, headers, data, timeout)
+
+    @contextlib.contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None):
+        response = self._request(method, url, headers, data, timeout,
+                                 stream=True)
+        response.iter_bytes = response.iter_content
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport(Transport):
+    """
+    Sends requests with an ``httpx.Client``, which is safe to share between
+    threads.
+
+        - http2: use HTTP/2 where the server supports it. All the requests
+          to api.fitbit.com are then multiplexed over a single connection,
+          instead of each concurrent request needing its own.
+        - max_connections: the most connections open at once
+        - max_keepalive_connections: the most idle connections kept open
+        - client: optionally, an ``httpx.Client`` to use instead
+    """
+
+    def __init__(self, http2=False, max_connections=100,
+                 max_keepalive_connections=20, client=None):
+        import httpx
+
+        self.client = client or httpx.Client(http2=http2, limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        ))
+
+    def send(self, method, url, headers=None, data=None, timeout=None):
+        import httpx
+
+        try:
+            return self.client.request(
+                method, url, headers=headers, data=data or None,
+                timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise exceptions.Timeout(*e.args)
+
+    @contextlib.contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None):
+        import httpx
+
+        try:
+            with self.client.stream(method, url, headers=headers,
+                                    data=data or None,
+                                    timeout=timeout) as response:
+                yield response
+        except httpx.TimeoutException as e:
+            raise exceptions.Timeout(*e.args)
+
+    def close(self):
+        self.client.close()
+
+
+class Urllib3Transport(Transport):
+    """
+    Sends requests with a bare ``urllib3.PoolManager``, which skips most of
+    the per request work ``requests`` does.
+
+        - maxsize: connections kept open per host
+        - block: wait for a free connection instead of opening an extra one
+    """
+
+    def __init__(self, maxsize=10, block=False):
+        import urllib3
+
+        self.pool = urllib3.PoolManager(maxsize=maxsize, block=block)
+
+    def _request(self, method, url, headers, data, timeout, stream=False):
+        import urllib3
+
+        headers = dict(headers or {})
+        body = None
+        if data:
+            body = urlencode(data, doseq=True)
+            headers.setdefault(
+                'Content-Type', 'application/x-www-form-urlencoded')
+        try:
+            return self.pool.request(
+                method, url, headers=headers, body=body,
+                timeout=urllib3.Timeout(total=timeout) if timeout else None,
+                retries=False, preload_content=not stream)
+        except urllib3.exceptions.TimeoutError as e:
+            raise exceptions.Timeout(*e.args)
+
+    def send(self, method, url, headers=None, data=None, timeout=None):
+        response = self._request(method, url, headers, data, timeout)
+        return Response(response.status, response.data, response.headers)
+
+    @contextlib.contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None):
+        raw = self._request(method, url, headers, data, timeout, stream=True)
+        response = Response(raw.status, headers=raw.headers)
+        response.iter_bytes = lambda chunk_size=65536: raw.stream(chunk_size)
+        try:
+            yield response
+        finally:
+            raw.release_conn()
+
+    def close(self):
+        self.pool.clear()
+
+
+class StubTransport(Transport):
+    """
+    A transport for tests, which never touches the network. Responses are
+    looked up by ``(method, url)`` in ``responses``, and default to a 404.
+    A response can also be a function taking the request, to compute it.
+    Every request is recorded in ``requests``.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = dict(responses or {})
+        self.requests = []
+
+    def add(self, method, url, status_code=200, content=b'{}', headers=None):
+        self.responses[(method, url)] = Response(status_code, content, headers)
+
+    def send(self, method, url, headers=None, data=None, timeout=None):
+        request = {'method': method, 'url': url, 'headers': headers or {},
+                   'data': data, 'timeout': timeout}
+        self.requests.append(request)
+        response = self.responses.get(
+            (method, url), Response(404, b'{"errors": []}'))
+        if callable(response):
+            response = response(request)
+        return response
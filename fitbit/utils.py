@@ -31,9 +31,40 @@ ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import contextlib
+import datetime
+import os
 
 
 def curry(_curried_func, *args, **kwargs):
     def _curried(*moreargs, **morekwargs):
         return _curried_func(*(args+moreargs), **dict(kwargs, **morekwargs))
     return _curried
+
+
+def to_date(date):
+    """ Convert a ``%Y-%m-%d`` string or a datetime to a date """
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    if isinstance(date, datetime.date):
+        return date
+    return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    """
+    Open a temporary file to write path, which replaces path once it is
+    written, so readers never see a partly written file. The temporary file
+    is removed if writing it fails.
+    """
+    tmp_path = '%s.tmp' % path
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    # os.rename doesn't replace existing files on Windows, but Python 2.x
+    # has no os.replace
+    getattr(os, 'replace', os.rename)(tmp_path, path)
@@ -1,8 +1,31 @@
 import unittest
 from .test_exceptions import ExceptionTest
+from .test_export import ExportTest
 from .test_auth import Auth2Test
+from .test_buffer import LogBufferTest
+from .test_bulk import BulkWriterTest, DeleteLogsTest
+from .test_cache import ResponseCacheTest, StaleReadsTest
+from .test_catalog import ActivityCatalogTest, FoodCatalogTest
+from .test_codec import CodecTest
+from .test_compression import CompressionTest
+from .test_snapshot import SnapshotTest
+from .test_store import TimeSeriesStoreTest
+from .test_coverage import CoverageTest
+from .test_endpoints import EndpointsTest
+from .test_import import ImportTest
+from .test_journal import WriteJournalTest
+from .test_planner import PlannerTest
+from .test_pool import PoolTest
+from .test_ratelimit import RateLimitTest
+from .test_runner import RunnerTest
+from .test_spec import SpecTest
+from .test_tokens import StoredUserTest, TokenStoreTest
+from .test_transport import (
+    RawResponseTest, TransportClientTest, TransportTest)
 from .test_api import (
     APITest,
+    UserHandleTest,
+    CoalesceTest,
     CollectionResourceTest,
     DeleteCollectionResourceTest,
     ResourceAccessTest,
@@ -16,9 +39,37 @@ def all_tests(consumer_key="", consumer_secret="", user_key=None, user_secret=No
     suite.addTest(unittest.makeSuite(ExceptionTest))
     suite.addTest(unittest.makeSuite(Auth2Test))
     suite.addTest(unittest.makeSuite(APITest))
+    suite.addTest(unittest.makeSuite(UserHandleTest))
+    suite.addTest(unittest.makeSuite(CoalesceTest))
     suite.addTest(unittest.makeSuite(CollectionResourceTest))
     suite.addTest(unittest.makeSuite(DeleteCollectionResourceTest))
     suite.addTest(unittest.makeSuite(ResourceAccessTest))
     suite.addTest(unittest.makeSuite(SubscriptionsTest))
     suite.addTest(unittest.makeSuite(PartnerAPITest))
+    suite.addTest(unittest.makeSuite(PoolTest))
+    suite.addTest(unittest.makeSuite(ImportTest))
+    suite.addTest(unittest.makeSuite(EndpointsTest))
+    suite.addTest(unittest.makeSuite(PlannerTest))
+    suite.addTest(unittest.makeSuite(CoverageTest))
+    suite.addTest(unittest.makeSuite(TransportClientTest))
+    suite.addTest(unittest.makeSuite(TransportTest))
+    suite.addTest(unittest.makeSuite(RawResponseTest))
+    suite.addTest(unittest.makeSuite(TokenStoreTest))
+    suite.addTest(unittest.makeSuite(StoredUserTest))
+    suite.addTest(unittest.makeSuite(RateLimitTest))
+    suite.addTest(unittest.makeSuite(RunnerTest))
+    suite.addTest(unittest.makeSuite(SpecTest))
+    suite.addTest(unittest.makeSuite(BulkWriterTest))
+    suite.addTest(unittest.makeSuite(DeleteLogsTest))
+    suite.addTest(unittest.makeSuite(WriteJournalTest))
+    suite.addTest(unittest.makeSuite(ResponseCacheTest))
+    suite.addTest(unittest.makeSuite(StaleReadsTest))
+    suite.addTest(unittest.makeSuite(LogBufferTest))
+    suite.addTest(unittest.makeSuite(FoodCatalogTest))
+    suite.addTest(unittest.makeSuite(ActivityCatalogTest))
+    suite.addTest(unittest.makeSuite(SnapshotTest))
+    suite.addTest(unittest.makeSuite(TimeSeriesStoreTest))
+    suite.addTest(unittest.makeSuite(CodecTest))
+    suite.addTest(unittest.makeSuite(CompressionTest))
+    suite.addTest(unittest.makeSuite(ExportTest))
     return suite
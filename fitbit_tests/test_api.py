@@ -2,6 +2,8 @@ from unittest import TestCase
 import datetime
 import mock
 import requests
+import threading
+import time
 from fitbit import Fitbit
 from fitbit.exceptions import DeleteError, Timeout
 
@@ -130,6 +132,43 @@ class APITest(TestBase):
             self.assertRaises(DeleteError, self.fb.make_request, *ARGS, **KWARGS)
 
 
+class UserHandleTest(TestCase):
+    """ Tests for Fitbit.for_user """
+
+    def setUp(self):
+        self.fb = Fitbit('x', 'y', timeout=10, system=Fitbit.METRIC)
+
+    def test_for_user(self):
+        # The handle keeps the app credentials and settings, with its own token
+        handle = self.fb.for_user('access', 'refresh', expires_at=12345)
+        self.assertIsNot(self.fb.client, handle.client)
+        self.assertEqual('x', handle.client.client_id)
+        self.assertEqual('y', handle.client.client_secret)
+        self.assertEqual(10, handle.client.timeout)
+        self.assertEqual(Fitbit.METRIC, handle.system)
+        self.assertEqual({
+            'access_token': 'access',
+            'refresh_token': 'refresh',
+            'expires_at': 12345,
+        }, handle.client.session.token)
+        self.assertEqual({}, self.fb.client.session.token)
+
+    def test_for_user_shares_pool(self):
+        # Handles, and handles of handles, share the original connection pool
+        handle = self.fb.for_user('access', 'refresh').for_user('a', 'r')
+        self.assertIsNot(self.fb.client.session, handle.client.session)
+        self.assertIs(
+            self.fb.client.session.get_adapter(Fitbit.API_ENDPOINT),
+            handle.client.session.get_adapter(Fitbit.API_ENDPOINT))
+
+    def test_resource_methods_on_class(self):
+        # The collection methods are defined once, on the class
+        self.assertIn('foods_log_water', Fitbit.__dict__)
+        self.assertIn('delete_foods_log_water', Fitbit.__dict__)
+        self.assertIn('recent_foods', Fitbit.__dict__)
+        self.assertNotIn('foods_log_water', self.fb.__dict__)
+
+
 class CollectionResourceTest(TestBase):
     """ Tests for _COLLECTION_RESOURCE """
     def test_all_args(self):
@@ -788,3 +827,125 @@ class PartnerAPITest(TestBase):
             resource, base_date=base_date, detail_level='1min',
             start_time=datetime.time(0, 0), end_time=datetime.time(0, 0),
             expected_url=URLBASE + "/-/FOO/date/1918-05-11/1d/1min/time/00:00/00:00.json")
+
+
+class CoalesceTest(TestCase):
+    """ Tests for coalescing identical GET requests in flight """
+
+    def setUp(self):
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         coalesce=True)
+        self.url = URLBASE + '/-/devices.json'
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def slow_make_request(self, response=None, error=None):
+        def make_request(*args, **kwargs):
+            self.started.set()
+            self.release.wait(5)
+            if error:
+                raise error
+            return response
+        return make_request
+
+    def run_threads(self, count, func):
+        results, errors = [], []
+
+        def target():
+            try:
+                results.append(func())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=target) for i in range(count)]
+        threads[0].start()
+        self.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        # Give the followers a moment to start waiting on the leader
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_coalesce(self):
+        mock_response = mock.Mock()
+        mock_response.status_code = 200
+        mock_response.content = b'[{"id": "1"}]'
+        with mock.patch.object(self.fb.client, 'make_request') as client_make_request:
+            client_make_request.side_effect = self.slow_make_request(mock_response)
+            results, errors = self.run_threads(5, self.fb.get_devices)
+        self.assertEqual(1, client_make_request.call_count)
+        self.assertEqual([], errors)
+        self.assertEqual([[{'id': '1'}]] * 5, results)
+        # Everyone gets their own copy of the result
+        self.assertEqual(5, len(set(id(result) for result in results)))
+
+    def test_coalesce_leader_copy(self):
+        # The first caller gets a copy too, so changing it can't race with
+        # the others copying the result; alone, it gets the result itself
+        response = {'devices': []}
+        coalescer = self.fb.coalesce
+        results, errors = self.run_threads(3, lambda: coalescer.call(
+            'key', self.slow_make_request(response)))
+        self.assertEqual([], errors)
+        self.assertEqual([response] * 3, results)
+        self.assertFalse(any(result is response for result in results))
+        self.assertIs(response, coalescer.call('key', lambda: response))
+
+    def test_coalesce_error(self):
+        with mock.patch.object(self.fb.client, 'make_request') as client_make_request:
+            client_make_request.side_effect = self.slow_make_request(error=Timeout('Timed out'))
+            results, errors = self.run_threads(3, self.fb.get_devices)
+        self.assertEqual(1, client_make_request.call_count)
+        self.assertEqual([], results)
+        self.assertEqual(3, len(errors))
+        for error in errors:
+            self.assertIsInstance(error, Timeout)
+
+    def test_not_coalesced(self):
+        # Requests for another user or language, and writes, are never shared
+        other_user = self.fb.for_user('b', 's')
+        other_system = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                              system=Fitbit.METRIC, coalesce=self.fb.coalesce)
+        self.assertIs(self.fb.coalesce, other_user.coalesce)
+        mock_response = mock.Mock()
+        mock_response.status_code = 200
+        mock_response.content = b'{}'
+        calls = []
+
+        def make_request(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 4:
+                self.release.set()
+            self.started.set()
+            self.release.wait(5)
+            return mock_response
+
+        funcs = [
+            self.fb.get_devices,
+            other_user.get_devices,
+            other_system.get_devices,
+            lambda: self.fb.log_activity({'a': 1}),
+        ]
+        threads = [threading.Thread(target=func) for func in funcs]
+        patches = [mock.patch.object(fb.client, 'make_request', side_effect=make_request)
+                   for fb in [self.fb, other_user, other_system]]
+        for patch in patches:
+            patch.start()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+        finally:
+            for patch in patches:
+                patch.stop()
+        self.assertEqual(4, len(calls))
+
+    def test_collection_get(self):
+        # GETs with an empty data argument are coalesced too
+        self.assertTrue(self.fb._is_get((self.url, None), {}))
+        self.assertTrue(self.fb._is_get((self.url,), {'data': {}}))
+        self.assertFalse(self.fb._is_get((self.url, {'a': 1}), {}))
+        self.assertFalse(self.fb._is_get((self.url,), {'method': 'DELETE'}))
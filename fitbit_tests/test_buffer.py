@@ -0,0 +1,103 @@
+import time
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.buffer import LogBuffer
+from fitbit.cache import ResponseCache
+from fitbit.exceptions import Timeout
+from fitbit.transport import Response, StubTransport
+
+URL = Fitbit.API_ENDPOINT + '/1/user/-/%s'
+WATER_URL = URL % 'foods/log/water.json'
+
+
+class LogBufferTest(TestCase):
+    """ Tests for fitbit.buffer """
+
+    def setUp(self):
+        self.transport = StubTransport()
+        self.transport.add('POST', WATER_URL, 201, b'{"waterLog": {}}')
+        self.transport.add('POST', URL % 'foods/log.json', 201, b'{"foodLog": {}}')
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         transport=self.transport, cache=ResponseCache())
+        self.buffer = LogBuffer(interval=60)
+
+    def tearDown(self):
+        self.buffer.close()
+
+    def posts(self):
+        return [(request['url'], request['data'])
+                for request in self.transport.requests
+                if request['method'] == 'POST']
+
+    def test_merge(self):
+        for amount in [250, 250, 100.5]:
+            self.buffer.add(self.fb, 'foods/log/water',
+                            {'amount': amount, 'unit': 'ml'}, '2017-01-01')
+        self.buffer.add(self.fb, 'foods/log/water',
+                        {'amount': 1, 'unit': 'cup'}, '2017-01-01')
+        self.buffer.add(self.fb, 'foods/log/water',
+                        {'amount': 250, 'unit': 'ml', 'date': '2017-01-02'})
+        food = {'foodId': 1, 'mealTypeId': 1, 'unitId': 2}
+        self.buffer.add(self.fb, 'foods/log', dict(food, amount=1), '2017-01-01')
+        self.buffer.add(self.fb, 'foods/log', dict(food, amount=2), '2017-01-01')
+        self.assertEqual([], self.transport.requests)
+        self.buffer.flush()
+        self.assertEqual([
+            (WATER_URL, {'amount': 600.5, 'unit': 'ml', 'date': '2017-01-01'}),
+            (WATER_URL, {'amount': 1, 'unit': 'cup', 'date': '2017-01-01'}),
+            (WATER_URL, {'amount': 250, 'unit': 'ml', 'date': '2017-01-02'}),
+            (URL % 'foods/log.json', dict(food, amount=3, date='2017-01-01')),
+        ], self.posts())
+        self.assertRaises(ValueError, self.buffer.add, self.fb, 'activities', {})
+
+    def test_invalidate(self):
+        urls = ['foods/log/water/date/2017-01-01.json',
+                'foods/log/date/2017-01-01.json',
+                'foods/log/water/date/2017-01-01/7d.json',
+                'foods/log/water/date/2017-01-02.json',
+                'activities/date/2017-01-01.json',
+                'profile.json']
+        for url in urls:
+            self.transport.add('GET', URL % url)
+            self.fb.make_request(URL % url)
+        self.buffer.add(self.fb, 'foods/log/water', {'amount': 1}, '2017-01-01')
+        self.buffer.flush()
+        self.assertEqual(set(URL % url for url in urls[3:]),
+                         set(key[1] for key in self.fb.cache.entries))
+
+    def test_retry(self):
+        responses = [Timeout('Timed out')]
+
+        def post(request):
+            if responses:
+                raise responses.pop()
+            return Response(201, b'{}')
+        self.transport.responses[('POST', WATER_URL)] = post
+        self.buffer.add(self.fb, 'foods/log/water', {'amount': 1}, '2017-01-01')
+        self.assertRaises(Timeout, self.buffer.flush)
+        self.buffer.add(self.fb, 'foods/log/water', {'amount': 2}, '2017-01-01')
+        self.buffer.close()
+        self.assertEqual(3, self.posts()[-1][1]['amount'])
+        self.assertRaises(ValueError, self.buffer.add, self.fb,
+                          'foods/log/water', {'amount': 1})
+
+    def test_failed(self):
+        self.transport.add('POST', WATER_URL, 400, b'{"errors": []}')
+        self.buffer.add(self.fb, 'foods/log/water', {'amount': 1}, '2017-01-01')
+        self.buffer.flush()
+        self.assertEqual(1, len(self.buffer.failed))
+        self.buffer.flush()
+        self.assertEqual(1, len(self.transport.requests))
+
+    def test_background(self):
+        buffer = LogBuffer(interval=60, max_entries=2)
+        buffer.add(self.fb, 'foods/log/water', {'amount': 1}, '2017-01-01')
+        buffer.add(self.fb, 'foods/log/water', {'amount': 1}, '2017-01-02')
+        for i in range(100):
+            if len(self.transport.requests) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(2, len(self.transport.requests))
+        buffer.close()
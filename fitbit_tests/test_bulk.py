@@ -0,0 +1,117 @@
+import collections
+import datetime
+import json
+import threading
+import time
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.bulk import BulkWriter, delete_logs, entry, find_logs, log_id
+from fitbit.exceptions import HTTPBadRequest, HTTPNotFound
+from fitbit.tokens import MemoryTokenStore
+from fitbit.transport import Response, StubTransport
+
+URL = Fitbit.API_ENDPOINT + '/1/user/-/%s'
+ACTIVITIES_URL = URL % 'activities.json'
+
+
+class BulkWriterTest(TestCase):
+    """ Tests for fitbit.bulk """
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = 0
+        self.transport = StubTransport({('POST', ACTIVITIES_URL): self.log})
+        store = MemoryTokenStore(dict(
+            (user_id, {'access_token': user_id, 'refresh_token': user_id})
+            for user_id in 'abc'))
+        fb = Fitbit('x', 'y', token_store=store, transport=self.transport)
+        self.users = fb.for_stored_users()
+
+    def log(self, request):
+        user = request['headers']['Authorization'][-1]
+        with self.lock:
+            # Calls of one user are never made at the same time
+            self.assertNotIn(user, self.in_flight)
+            self.in_flight[user] = request
+            self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+        time.sleep(0.01)
+        with self.lock:
+            del self.in_flight[user]
+        if request['data']['activityId'] < 0:
+            return Response(400, b'{"errors": [{"message": "Bad"}]}')
+        return Response(201, json.dumps({'activityLog': {
+            'logId': request['data']['activityId']}}).encode('utf8'))
+
+    def test_write(self):
+        entries = []
+        for i in range(30):
+            user = 'abc'[i % 3]
+            entries.append(entry(self.users[user], 'log_activity',
+                                 {'activityId': -i if i == 10 else i}))
+        results = list(BulkWriter(max_workers=4, max_pending=5).write(entries))
+        self.assertEqual(30, len(results))
+        # Failures are reported, and don't stop the other entries
+        failed = [result for result in results if result.error]
+        self.assertEqual(1, len(failed))
+        self.assertIsInstance(failed[0].error, HTTPBadRequest)
+        self.assertIs(entries[10], failed[0].entry)
+        self.assertEqual(
+            set(range(30)) - set([10]),
+            set(result.log_id for result in results if not result.error))
+        # Users were written concurrently, each in order
+        self.assertEqual(3, self.max_in_flight)
+        for user in 'abc':
+            ids = [request['data']['activityId']
+                   for request in self.transport.requests
+                   if request['headers']['Authorization'] == 'Bearer ' + user]
+            self.assertEqual(sorted(ids, key=abs), ids)
+
+    def test_stop_early(self):
+        entries = (entry(self.users['a'], 'log_activity', {'activityId': i})
+                   for i in range(100))
+        for result in BulkWriter().write(entries):
+            break
+        self.assertTrue(len(self.transport.requests) < 100)
+
+    def test_log_id(self):
+        self.assertEqual(1, log_id({'foodLog': {'logId': 1}, 'foodDay': {}}))
+        self.assertIsNone(log_id({'foods': []}))
+        self.assertIsNone(log_id(True))
+
+
+class DeleteLogsTest(TestCase):
+    """ Tests for fitbit.bulk.delete_logs """
+
+    def setUp(self):
+        self.transport = StubTransport()
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         transport=self.transport)
+        for log_id in [1, 2, 3]:
+            self.transport.add('DELETE', URL % ('activities/%s.json' % log_id),
+                               status_code=204)
+
+    def test_log_ids(self):
+        report = delete_logs(self.fb, 'activities', [3, 1, 4, 2])
+        self.assertEqual([3, 1, 4, 2], list(report))
+        self.assertEqual([None, None, None], [report[1], report[2], report[3]])
+        self.assertIsInstance(report[4], HTTPNotFound)
+        self.assertEqual(4, len(self.transport.requests))
+        self.assertRaises(ValueError, delete_logs, self.fb, 'body', [1])
+
+    def test_date_range(self):
+        self.transport.add('GET', URL % 'activities/date/2017-01-01.json',
+                           content=b'{"activities": [{"logId": 1, "calories": 10}]}')
+        self.transport.add('GET', URL % 'activities/date/2017-01-02.json',
+                           content=b'{"activities": []}')
+        self.transport.add('GET', URL % 'activities/date/2017-01-03.json',
+                           content=b'{"activities": [{"logId": 2, "calories": 0}, '
+                                   b'{"logId": 3, "calories": 20}]}')
+        report = delete_logs(self.fb, 'activities', start='2017-01-01',
+                             end=datetime.date(2017, 1, 3),
+                             predicate=lambda log: log['calories'])
+        self.assertEqual(collections.OrderedDict([(1, None), (3, None)]), report)
+        self.assertEqual([1, 2, 3], find_logs(self.fb, 'activities',
+                                              '2017-01-01', '2017-01-03'))
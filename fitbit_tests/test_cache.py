@@ -0,0 +1,162 @@
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.cache import ResponseCache, stale_reads
+from fitbit.exceptions import HTTPNotFound
+from fitbit.tokens import MemoryTokenStore
+from fitbit.transport import StubTransport
+
+URL = Fitbit.API_ENDPOINT + '/1/user/-/%s'
+PROFILE_URL = URL % 'profile.json'
+
+
+class ResponseCacheTest(TestCase):
+    """ Tests for fitbit.cache """
+
+    def setUp(self):
+        self.cache = ResponseCache(max_entries=3, ttl=60)
+
+    def test_get_set(self):
+        self.assertRaises(KeyError, self.cache.get, 'a', 'url', 'en_US')
+        response = {'a': [1]}
+        self.cache.set('a', 'url', 'en_US', response)
+        response['a'].append(2)
+        cached = self.cache.get('a', 'url', 'en_US')
+        self.assertEqual({'a': [1]}, cached)
+        cached['b'] = 1
+        self.assertEqual({'a': [1]}, self.cache.get('a', 'url', 'en_US'))
+        # Users and systems are kept apart
+        self.assertRaises(KeyError, self.cache.get, 'b', 'url', 'en_US')
+        self.assertRaises(KeyError, self.cache.get, 'a', 'url', 'en_GB')
+
+    def test_expiry(self):
+        self.cache.ttl = -1
+        self.cache.set('a', 'url', 'en_US', {})
+        self.assertRaises(KeyError, self.cache.get, 'a', 'url', 'en_US')
+        self.assertEqual({}, dict(self.cache.keys))
+
+    def test_lru(self):
+        for url in ['1', '2', '3']:
+            self.cache.set('a', url, 'en_US', url)
+        self.cache.get('a', '1', 'en_US')
+        self.cache.set('a', '4', 'en_US', '4')
+        self.assertRaises(KeyError, self.cache.get, 'a', '2', 'en_US')
+        self.assertEqual(['3', '1', '4'], [key[1] for key in self.cache.entries])
+
+    def test_invalidate(self):
+        for url in ['1', '2']:
+            self.cache.set('a', url, 'en_US', url)
+        self.cache.set('b', '1', 'en_US', '1')
+        self.assertEqual(1, self.cache.invalidate('a', lambda url: url == '1'))
+        self.assertEqual(['2'], [key[1] for key in self.cache.entries if key[0] == 'a'])
+        self.assertEqual(1, self.cache.invalidate('a'))
+        self.assertEqual([('b', '1', 'en_US')], list(self.cache.entries))
+
+    def test_fitbit(self):
+        transport = StubTransport()
+        transport.add('GET', PROFILE_URL, content=b'{"user": {}}')
+        transport.add('GET', URL % 'apiSubscriptions.json',
+                      content=b'{"apiSubscriptions": []}')
+        store = MemoryTokenStore({'a': {'access_token': 'x', 'refresh_token': 'y'}})
+        fb = Fitbit('x', 'y', access_token='t', refresh_token='r',
+                    transport=transport, cache=self.cache, token_store=store)
+        self.assertEqual({'user': {}}, fb.user_profile_get())
+        self.assertEqual({'user': {}}, fb.user_profile_get())
+        self.assertEqual(1, len(transport.requests))
+        # Stored users are cached by user id, others by token
+        fb.for_stored_user('a').user_profile_get()
+        fb.for_stored_user('a').user_profile_get()
+        self.assertEqual(2, len(transport.requests))
+        self.assertEqual(set([fb._user_key(), 'a']), set(self.cache.keys))
+        # Endpoints which aren't cacheable are always requested
+        fb.list_subscriptions()
+        fb.list_subscriptions()
+        self.assertEqual(4, len(transport.requests))
+        fb.invalidate_cache()
+        fb.user_profile_get()
+        self.assertEqual(5, len(transport.requests))
+
+
+class StaleReadsTest(TestCase):
+    """ Tests for the reads made stale by writes, see fitbit.cache.DEPENDENCIES """
+
+    def stale(self, method, url, data, reads):
+        match = stale_reads(method, URL % url, data)
+        return [read for read in reads if match(URL % read)]
+
+    def test_collection_writes(self):
+        reads = [
+            'activities/date/2017-01-05.json',
+            'activities/date/2017-01-06.json',
+            'activities/steps/date/2017-01-01/2017-01-31.json',
+            'activities/steps/date/2017-02-01/2017-02-28.json',
+            'activities/steps/date/2017-01-10/7d.json',
+            'activities/steps/date/2017-01-31/1m.json',
+            'activities/steps/date/2017-01-05/1d/15min.json',
+            'activities.json',
+            'activities/recent.json',
+            'foods/log/date/2017-01-05.json',
+            'profile.json',
+        ]
+        self.assertEqual([
+            'activities/date/2017-01-05.json',
+            'activities/steps/date/2017-01-01/2017-01-31.json',
+            'activities/steps/date/2017-01-10/7d.json',
+            'activities/steps/date/2017-01-31/1m.json',
+            'activities/steps/date/2017-01-05/1d/15min.json',
+            'activities.json',
+            'activities/recent.json',
+        ], self.stale('POST', 'activities.json', {'date': '2017-01-05'}, reads))
+        # Deletes don't tell the date
+        self.assertEqual(reads[:9], self.stale(
+            'DELETE', 'activities/123.json', None, reads))
+        # Water is part of the food log
+        self.assertEqual([
+            'foods/log/date/2017-01-05.json',
+            'foods/log/water/date/2017-01-05.json',
+            'foods/log/water/date/today/max.json',
+        ], self.stale('POST', 'foods/log/water.json', {'date': '2017-01-05'}, [
+            'foods/log/date/2017-01-05.json',
+            'foods/log/water/date/2017-01-05.json',
+            'foods/log/water/date/2017-01-06.json',
+            'foods/log/water/date/today/max.json',
+            'foods/log/water/goal.json',
+        ]))
+        self.assertEqual(['sleep/date/2017-1-5.json'],
+                         self.stale('POST', 'sleep.json', {'date': '2017-01-05'}, [
+                             'sleep/date/2017-1-5.json',
+                             'body/log/weight/date/2017-01-01/1m.json']))
+
+    def test_other_writes(self):
+        self.assertEqual(['foods/log/water/goal.json', 'foods/log/date/2017-01-05.json'],
+                         self.stale('POST', 'foods/log/water/goal.json', {'target': 1}, [
+                             'foods/log/water/goal.json',
+                             'foods/log/goal.json',
+                             'foods/log/date/2017-01-05.json',
+                             'activities/date/2017-01-05.json']))
+        self.assertEqual(['devices/tracker/1/alarms.json'], self.stale(
+            'DELETE', 'devices/tracker/1/alarms/2.json', None, [
+                'devices/tracker/1/alarms.json',
+                'devices/tracker/3/alarms.json']))
+        self.assertEqual(['profile.json'], self.stale(
+            'POST', 'profile.json', {'aboutMe': ''}, ['profile.json', 'friends.json']))
+        # Unknown writes make everything stale, known ones may make nothing
+        self.assertTrue(stale_reads('POST', Fitbit.API_ENDPOINT + '/1/unknown')(URL % 'profile.json'))
+        self.assertIsNone(stale_reads('POST', URL % 'friends/invitations.json'))
+
+    def test_fitbit(self):
+        transport = StubTransport()
+        fb = Fitbit('x', 'y', access_token='t', refresh_token='r',
+                    transport=transport, cache=ResponseCache())
+        reads = ['activities/date/2017-01-05.json', 'profile.json']
+        for read in reads:
+            transport.add('GET', URL % read)
+            fb.make_request(URL % read)
+        transport.add('POST', URL % 'activities.json', 201, b'{}')
+        fb.activities(date='2017-01-05', data={'activityId': 1})
+        key = (fb._user_key(), URL % 'profile.json', fb.system)
+        self.assertEqual([key], list(fb.cache.entries))
+        # Failed writes may have been made too
+        fb.make_request(URL % reads[0])
+        self.assertRaises(HTTPNotFound, fb.delete_activities, 1)
+        self.assertEqual([key], list(fb.cache.entries))
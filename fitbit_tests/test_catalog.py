@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.catalog import ActivityCatalog, FoodCatalog
+from fitbit.transport import StubTransport
+
+URL = Fitbit.API_ENDPOINT + '/1/%s'
+FOODS = [
+    {'foodId': 1, 'name': 'Banana', 'brand': '', 'units': [1, 2]},
+    {'foodId': 2, 'name': 'Banana Bread', 'brand': 'Bakery', 'units': [2]},
+    {'foodId': 3, 'name': 'Apple', 'brand': 'Orchard', 'units': [3]},
+]
+UNITS = [{'id': 1, 'name': 'gram'}, {'id': 2, 'name': 'slice'}]
+
+
+def content(data):
+    return json.dumps(data).encode('utf8')
+
+
+class FoodCatalogTest(TestCase):
+    """ Tests for fitbit.catalog.FoodCatalog """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'foods.json')
+        self.transport = StubTransport()
+        self.transport.add('GET', URL % 'foods/search.json?query=ban',
+                           content=content({'foods': FOODS[:2]}))
+        self.transport.add('GET', URL % 'foods/3.json', content=content({
+            'food': dict(FOODS[2], servings=[{'unitId': 3}])}))
+        self.transport.add('GET', URL % 'foods/units.json', content=content(UNITS))
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         transport=self.transport)
+        self.catalog = FoodCatalog(self.fb, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_search(self):
+        self.catalog.add(FOODS)
+        self.assertEqual([1, 2], [food['foodId'] for food in
+                                  self.catalog.search('ban', refresh=False)])
+        self.assertEqual([2], [food['foodId'] for food in
+                               self.catalog.search('Bread ba', refresh=False)])
+        self.assertEqual([3], [food['foodId'] for food in
+                               self.catalog.search('orch', refresh=False)])
+        self.assertEqual([], self.catalog.search('pear', refresh=False))
+        self.assertEqual(1, len(self.catalog.search('b', limit=1, refresh=False)))
+        self.assertEqual([], self.transport.requests)
+
+    def test_refresh(self):
+        # The first search is local, and searches the API in the background
+        self.assertEqual([], self.catalog.search('Ban'))
+        self.catalog.executor.shutdown()
+        self.assertEqual([1, 2], [food['foodId'] for food in
+                                  self.catalog.search('ban')])
+        # Searched once per refresh_ttl
+        self.assertEqual(1, len(self.transport.requests))
+
+    def test_detail(self):
+        self.catalog.add(FOODS)
+        food = self.catalog.detail(3)
+        self.assertEqual([{'unitId': 3}], food['servings'])
+        self.assertEqual(food, self.catalog.detail(3))
+        self.assertEqual(1, len(self.transport.requests))
+
+    def test_units(self):
+        self.assertEqual(UNITS, self.catalog.food_units())
+        self.assertEqual(UNITS, self.catalog.food_units(FOODS[0]))
+        self.assertEqual(UNITS[1:], self.catalog.food_units(FOODS[1]))
+        self.assertEqual(1, len(self.transport.requests))
+
+    def test_save(self):
+        self.catalog.refresh('ban', wait=True)
+        self.catalog.detail(3)
+        self.catalog.food_units()
+        self.catalog.close()
+        catalog = FoodCatalog(self.fb, self.path)
+        self.assertEqual([1, 2, 3], sorted(catalog.foods))
+        self.assertEqual([2], [food['foodId'] for food in catalog.search('brea', refresh=False)])
+        self.assertEqual(UNITS, catalog.food_units())
+        catalog.detail(3)
+        catalog.close()
+        self.assertEqual(3, len(self.transport.requests))
+
+
+ACTIVITIES = {'categories': [{
+    'id': 1, 'name': 'Sports', 'activities': [{
+        'id': 10, 'name': 'Running', 'hasSpeed': True, 'activityLevels': [
+            {'id': 11, 'name': '5 mph', 'mets': 8},
+        ],
+    }],
+    'subCategories': [{
+        'id': 2, 'name': 'Ball games', 'activities': [
+            {'id': 20, 'name': 'Tennis', 'hasSpeed': False},
+        ],
+    }],
+}]}
+
+
+class ActivityCatalogTest(TestCase):
+    """ Tests for fitbit.catalog.ActivityCatalog """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'activities.json')
+        self.transport = StubTransport()
+        self.transport.add('GET', URL % 'activities.json',
+                           content=content(ACTIVITIES))
+        self.transport.add('GET', URL % 'activities/30.json',
+                           content=content({'activity': {'id': 30}}))
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         transport=self.transport)
+        self.catalog = ActivityCatalog(self.fb, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_flatten(self):
+        activities = ActivityCatalog.flatten(ACTIVITIES)
+        self.assertEqual([10, 11, 20], sorted(activities))
+        self.assertEqual('Sports', activities[10]['categoryName'])
+        self.assertEqual(10, activities[11]['parentId'])
+        self.assertEqual('Ball games', activities[20]['subCategoryName'])
+        self.assertEqual(1, activities[20]['categoryId'])
+
+    def test_lookups(self):
+        self.assertEqual(10, self.catalog.find('running'))
+        self.assertIsNone(self.catalog.find('5 mph'))
+        self.assertEqual('Tennis', self.catalog.get('20')['name'])
+        self.assertEqual({'activity': self.catalog.get(20)}, self.catalog.detail(20))
+        self.assertEqual({'activity': {'id': 30}}, self.catalog.detail(30))
+        self.assertEqual(2, len(self.transport.requests))
+
+    def test_save(self):
+        self.catalog.refresh()
+        catalog = ActivityCatalog(self.fb, self.path)
+        self.assertEqual(self.catalog.activities, catalog.activities)
+        self.assertEqual(20, catalog.find('Tennis'))
+        self.assertEqual(1, len(self.transport.requests))
+
+    def test_ttl(self):
+        self.catalog.refresh()
+        catalog = ActivityCatalog(self.fb, self.path, ttl=-1)
+        # Stale snapshots are still used, while they are refreshed
+        self.assertEqual(20, catalog.find('Tennis'))
+        catalog.refreshing.join()
+        self.assertEqual(2, len(self.transport.requests))
+        self.assertTrue(catalog.fetched_at > self.catalog.fetched_at)
@@ -0,0 +1,74 @@
+import json
+import random
+
+from unittest import TestCase
+
+from fitbit.codec import chunks, decode, encode
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BASE = 1483228800  # 2017-01-01
+
+
+def heart_rate(seconds=86400):
+    random.seed(1)
+    timestamps, values = [], []
+    ts, value = BASE, 70
+    while ts < BASE + seconds:
+        timestamps.append(ts)
+        values.append(value)
+        ts += random.choice((1, 1, 1, 5, 15))
+        value = max(40, min(190, value + random.randint(-2, 2)))
+    return timestamps, values
+
+
+class CodecTest(TestCase):
+    """ Tests for fitbit.codec """
+
+    def test_round_trip(self):
+        timestamps, values = heart_rate()
+        data = encode(timestamps, values)
+        self.assertEqual((timestamps, values),
+                         tuple(list(column) for column in decode(data)))
+        self.assertEqual(24, len(chunks(data)))
+        # Much smaller than the JSON of the API
+        dataset = [{'time': '00:00:00', 'value': value} for value in values]
+        self.assertLess(len(data) * 10, len(json.dumps(dataset)))
+
+    def test_range(self):
+        timestamps, values = heart_rate(3 * 3600)
+        data = encode(timestamps, values, chunk_seconds=600)
+        start, end = BASE + 1234, BASE + 5678
+        expected = [(ts, value) for ts, value in zip(timestamps, values)
+                    if start <= ts <= end]
+        decoded_ts, decoded_values = decode(data, start=start, end=end)
+        self.assertEqual(expected, list(zip(decoded_ts, decoded_values)))
+        self.assertEqual(timestamps[-1:],
+                         list(decode(data, start=timestamps[-1])[0]))
+        self.assertEqual([], list(decode(data, end=BASE - 1)[0]))
+
+    def test_edge_cases(self):
+        self.assertEqual(([], []), tuple(list(c) for c in decode(encode([], []))))
+        self.assertEqual(([5], [-3]), tuple(list(c) for c in decode(encode([5], [-3]))))
+        # Irregular and large steps, and negative values
+        timestamps = [0, 1, 2, 1000000, 1000001, 2 ** 40]
+        values = [0, -500, 2 ** 40, 3, 3, -1]
+        self.assertEqual((timestamps, values), tuple(
+            list(c) for c in decode(encode(timestamps, values, chunk_seconds=7))))
+        self.assertEqual([1.25, 0.5], list(decode(
+            encode([1, 2], [1.25, 0.5], scale=100))[1]))
+        self.assertRaises(ValueError, encode, [1, 2], [1])
+        self.assertRaises(ValueError, decode, b'FBSNAP1\0' + b'\0' * 8)
+
+    def test_compressed(self):
+        if zstandard is None:
+            self.skipTest('zstandard is not installed')
+        timestamps, values = heart_rate()
+        plain = encode(timestamps, values)
+        data = encode(timestamps, values, compress=True)
+        self.assertLess(len(data), len(plain))
+        self.assertEqual(values, list(decode(data)[1]))
+        self.assertEqual(values[:3], list(decode(data, end=timestamps[2])[1]))
@@ -0,0 +1,98 @@
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from fitbit.cache import ResponseCache
+
+try:
+    import zstandard
+    from fitbit.compression import (
+        PayloadCompressor, dictionary_id, load_dictionary, main,
+        save_dictionary, train_dictionary)
+except ImportError:
+    zstandard = None
+
+
+def summary(seed):
+    rand = random.Random(seed)
+    return {
+        'activities': [],
+        'goals': {'activeMinutes': 30, 'caloriesOut': rand.randint(1800, 3000),
+                  'distance': 8.05, 'floors': 10, 'steps': 10000},
+        'summary': {
+            'activeScore': -1, 'activityCalories': rand.randint(0, 2000),
+            'caloriesBMR': rand.randint(1200, 1800),
+            'caloriesOut': rand.randint(1800, 4000),
+            'distances': [{'activity': name, 'distance': rand.random() * 10}
+                          for name in ('total', 'tracker', 'loggedActivities',
+                                       'veryActive', 'moderatelyActive',
+                                       'lightlyActive', 'sedentaryActive')],
+            'fairlyActiveMinutes': rand.randint(0, 60),
+            'lightlyActiveMinutes': rand.randint(0, 300),
+            'marginalCalories': rand.randint(0, 1000),
+            'sedentaryMinutes': rand.randint(600, 1200),
+            'steps': rand.randint(0, 20000),
+            'veryActiveMinutes': rand.randint(0, 60),
+        },
+    }
+
+
+class CompressionTest(TestCase):
+    """ Tests for fitbit.compression """
+
+    def setUp(self):
+        if zstandard is None:
+            self.skipTest('zstandard is not installed')
+        self.tmp_dir = tempfile.mkdtemp()
+        self.samples = [summary(i) for i in range(1000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_compress(self):
+        dictionary = train_dictionary(self.samples, size=16 * 1024)
+        compressor = PayloadCompressor([dictionary])
+        payload = json.dumps(summary(5000)).encode('utf8')
+        data = compressor.compress(payload)
+        self.assertEqual(payload, compressor.decompress(data))
+        self.assertEqual(dictionary_id(dictionary),
+                         zstandard.get_frame_parameters(data).dict_id)
+        # Much smaller than gzip, for a single response
+        self.assertLess(len(data) * 2, len(gzip.compress(payload)))
+
+        # Payloads of an older dictionary are read with it
+        newer = train_dictionary(self.samples[:500], size=8 * 1024)
+        self.assertEqual(payload,
+                         PayloadCompressor([dictionary, newer]).decompress(data))
+        self.assertRaises(ValueError, PayloadCompressor([newer]).decompress,
+                          data)
+        # And without a dictionary
+        plain = PayloadCompressor().compress(payload)
+        self.assertEqual(payload, compressor.decompress(plain))
+
+    def test_cache(self):
+        dictionary = train_dictionary(self.samples, size=16 * 1024)
+        cache = ResponseCache(compressor=PayloadCompressor([dictionary]))
+        cache.set('a', 'url', 'en_US', summary(1))
+        self.assertEqual(summary(1), cache.get('a', 'url', 'en_US'))
+        self.assertLess(len(cache.entries[('a', 'url', 'en_US')][1]),
+                        len(json.dumps(summary(1))) // 4)
+
+    def test_train_command(self):
+        paths = []
+        for i, sample in enumerate(self.samples):
+            paths.append(os.path.join(self.tmp_dir, '%d.json' % i))
+            with open(paths[-1], 'w') as f:
+                json.dump(sample, f)
+        path = os.path.join(self.tmp_dir, 'fitbit.dict')
+        self.assertEqual(0, main(['train', '-o', path, '--size', '8192'] +
+                                 paths))
+        dictionary = load_dictionary(path)
+        self.assertLessEqual(len(dictionary), 8192)
+        save_dictionary(path, dictionary)
+        self.assertEqual(dictionary, load_dictionary(path))
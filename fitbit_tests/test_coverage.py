@@ -0,0 +1,130 @@
+import datetime
+import mock
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.coverage import CoverageIndex
+from fitbit.planner import Query, QueryPlanner
+
+
+def day(day):
+    return datetime.date(2017, 1, 1) + datetime.timedelta(days=day)
+
+
+class CoverageTest(TestCase):
+    """ Tests for fitbit.coverage """
+
+    def setUp(self):
+        self.key = ('USER', 'activities/steps', None)
+        self.coverage = CoverageIndex()
+
+    def test_merge(self):
+        self.coverage.add(self.key, day(10), day(12))
+        self.coverage.add(self.key, day(0), day(2))
+        self.coverage.add(self.key, day(20), day(25))
+        self.assertEqual(3, len(self.coverage.intervals[self.key]))
+        # Touching intervals are merged
+        self.coverage.add(self.key, '2017-01-04', '2017-01-10')
+        self.assertEqual(
+            [(day(0), day(12)), (day(20), day(25))],
+            self.coverage.intervals[self.key])
+        # As are overlapping ones
+        self.coverage.add(self.key, day(11), day(30))
+        self.assertEqual([(day(0), day(30))], self.coverage.intervals[self.key])
+        # Empty ranges are ignored
+        self.coverage.add(self.key, day(40), day(39))
+        self.assertEqual([(day(0), day(30))], self.coverage.intervals[self.key])
+
+    def test_missing(self):
+        self.coverage.add(self.key, day(5), day(9))
+        self.coverage.add(self.key, day(15), day(19))
+        self.assertEqual([(day(0), day(30))],
+                         self.coverage.missing(('-', 'other', None), day(0), day(30)))
+        self.assertEqual(
+            [(day(0), day(4)), (day(10), day(14)), (day(20), day(30))],
+            self.coverage.missing(self.key, day(0), day(30)))
+        self.assertEqual([(day(10), day(12))],
+                         self.coverage.missing(self.key, day(7), day(12)))
+        self.assertEqual([], self.coverage.missing(self.key, day(5), day(9)))
+        self.assertTrue(self.coverage.covered(self.key, day(16), day(16)))
+        self.assertFalse(self.coverage.covered(self.key, day(9), day(10)))
+
+    def test_save_load(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'coverage.json')
+            self.assertEqual({}, CoverageIndex.load(path).intervals)
+            self.coverage.add(self.key, day(5), day(9))
+            self.coverage.add(('USER', 'activities/heart', '1sec'), day(1), day(1))
+            self.coverage.save(path)
+            self.assertEqual(self.coverage.intervals, CoverageIndex.load(path).intervals)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_planner(self):
+        # The planner only fetches the gaps, and records what it fetched
+        fb = Fitbit('x', 'y')
+        self.coverage.add(self.key, day(0), day(9))
+        planner = QueryPlanner(fb, coverage=self.coverage, user='USER')
+        planner.add_range('activities/steps', day(5), day(14))
+        self.assertEqual([Query('activities/steps', day(10), day(14))], planner.plan())
+        with mock.patch.object(fb, 'make_request') as make_request:
+            make_request.return_value = {}
+            results = planner.execute()
+        self.assertEqual(1, make_request.call_count)
+        self.assertEqual(set((('activities/steps', day(d)) for d in range(10, 15))),
+                         set(results))
+        self.assertEqual([(day(0), day(14))], self.coverage.intervals[self.key])
+
+    def test_planner_sparse(self):
+        # The gaps a window spans between needed dates aren't held
+        fb = Fitbit('x', 'y')
+        planner = QueryPlanner(fb, coverage=self.coverage, user='USER')
+        planner.add('activities/steps', day(0))
+        planner.add('activities/steps', day(9))
+        planner.add('activities/steps', day(10))
+        self.assertEqual([Query('activities/steps', day(0), day(10))], planner.plan())
+        with mock.patch.object(fb, 'make_request') as make_request:
+            make_request.return_value = {}
+            planner.execute()
+        self.assertEqual([(day(0), day(0)), (day(9), day(10))],
+                         self.coverage.intervals[self.key])
+        planner = QueryPlanner(fb, coverage=self.coverage, user='USER')
+        planner.add('activities/steps', day(4))
+        self.assertEqual([Query('activities/steps', day(4), day(4))], planner.plan())
+
+    def test_planner_users(self):
+        # Each user has its own coverage, even when requesting its own data
+        fb = Fitbit('x', 'y')
+        a = fb.for_user('a', 'r')
+        b = fb.for_user('b', 'r')
+        self.assertRaises(ValueError, QueryPlanner, a, coverage=self.coverage)
+        planner = QueryPlanner(a, coverage=self.coverage, user='A')
+        planner.add_range('activities/steps', day(0), day(2))
+        with mock.patch.object(a, 'make_request') as make_request:
+            make_request.return_value = {}
+            planner.execute()
+        planner = QueryPlanner(b, coverage=self.coverage, user='B')
+        planner.add_range('activities/steps', day(0), day(2))
+        self.assertEqual([Query('activities/steps', day(0), day(2))],
+                         planner.plan())
+
+        # Stored users are told apart by their user id
+        b.rate_limit_key = 'B'
+        planner = QueryPlanner(b, coverage=self.coverage)
+        self.assertEqual(('B', 'activities/steps', None),
+                         planner.coverage_key('activities/steps'))
+
+    def test_planner_today(self):
+        # Today's data isn't complete yet, so it is never marked as held
+        fb = Fitbit('x', 'y')
+        today = datetime.date.today()
+        planner = QueryPlanner(fb, coverage=self.coverage, user='USER')
+        planner.add('activities/steps', today)
+        with mock.patch.object(fb, 'make_request') as make_request:
+            make_request.return_value = {}
+            planner.execute()
+        self.assertFalse(self.coverage.covered(self.key, today, today))
@@ -0,0 +1,107 @@
+import datetime
+import mock
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit import endpoints
+
+
+class EndpointsTest(TestCase):
+    """ Tests for the endpoint table in fitbit.endpoints """
+
+    def setUp(self):
+        self.fb = Fitbit('x', 'y')
+
+    def assert_match(self, funcname, args, kwargs, name, fields=None):
+        # Call the named function and check that the request it makes is
+        # matched back to the expected endpoint
+        with mock.patch.object(self.fb, 'make_request') as make_request:
+            getattr(self.fb, funcname)(*args, **kwargs)
+        mr_args, mr_kwargs = make_request.call_args
+        data = mr_kwargs.get('data', mr_args[1] if len(mr_args) > 1 else None)
+        method = mr_kwargs.get('method', 'POST' if data else 'GET')
+        endpoint, values = endpoints.match(method, mr_args[0])
+        self.assertEqual(name, endpoint and endpoint.name)
+        for key, value in (fields or {}).items():
+            self.assertEqual(value, values[key])
+
+    def test_url(self):
+        endpoint = endpoints.BY_NAME['food_detail']
+        self.assertEqual(
+            'https://api.fitbit.com/1/foods/1%25.json',
+            endpoint.url('https://api.fitbit.com', 1, {'food_id': '1%25'}))
+        self.assertEqual(
+            'http://localhost/2/foods/1.json',
+            endpoint.url('http://localhost', 2, {'food_id': 1}))
+        self.assertEqual(('food_id',), endpoint.fields)
+
+    def test_flags(self):
+        self.assertTrue(endpoints.BY_NAME['get_devices'].cacheable)
+        self.assertTrue(endpoints.BY_NAME['get_devices'].idempotent)
+        self.assertFalse(endpoints.BY_NAME['log_activity'].cacheable)
+        self.assertFalse(endpoints.BY_NAME['log_activity'].idempotent)
+        self.assertTrue(endpoints.BY_NAME['update_resource_goal'].idempotent)
+        self.assertFalse(endpoints.BY_NAME['list_subscriptions'].cacheable)
+
+    def test_unknown(self):
+        self.assertEqual((None, None), endpoints.match('GET', 'invalid://do.not.connect'))
+        self.assertEqual((None, None), endpoints.match('PUT', Fitbit.API_ENDPOINT + '/1/activities.json'))
+
+    def test_match(self):
+        date = datetime.date(2016, 1, 2)
+        self.assert_match('user_profile_get', ('USER',), {}, 'user_profile_get', {'user_id': 'USER'})
+        self.assert_match('user_profile_update', ({'a': 1},), {}, 'user_profile_update')
+        self.assert_match('activities', (date,), {}, 'collection',
+                          {'user_id': '-', 'resource': 'activities', 'date': '2016-01-02'})
+        self.assert_match('foods_log_water', (date,), {}, 'collection',
+                          {'resource': 'foods/log/water'})
+        self.assert_match('foods_log_water', (date,), {'data': {'amount': 1}}, 'log_collection',
+                          {'resource': 'foods/log/water'})
+        self.assert_match('delete_foods_log', ('LOG',), {}, 'delete_collection',
+                          {'resource': 'foods/log', 'log_id': 'LOG'})
+        self.assert_match('water_goal', (), {}, 'resource_goal', {'resource': 'foods/log/water'})
+        self.assert_match('water_goal', (), {'target': 1}, 'update_resource_goal',
+                          {'resource': 'foods/log/water'})
+        self.assert_match('activities_daily_goal', (), {'steps': 1}, 'update_resource_goal',
+                          {'resource': 'activities', 'postfix': 's/daily'})
+        self.assert_match('body_weight_goal', (), {}, 'resource_goal', {'resource': 'body/log/weight'})
+        self.assert_match('time_series', ('activities/steps',), {'period': '30d'}, 'time_series',
+                          {'resource': 'activities/steps', 'base_date': 'today', 'end': '30d'})
+        self.assert_match('intraday_time_series', ('activities/heart',), {'detail_level': '1sec'},
+                          'intraday_time_series', {'resource': 'activities/heart', 'detail_level': '1sec'})
+        self.assert_match('intraday_time_series', ('activities/heart', date),
+                          {'start_time': '00:00', 'end_time': '01:00'},
+                          'intraday_time_series', {'time_range': '/time/00:00/01:00'})
+        self.assert_match('recent_activities', (), {}, 'activity_stats', {'qualifier': '/recent'})
+        self.assert_match('activity_stats', (), {}, 'activity_stats', {'qualifier': ''})
+        self.assert_match('frequent_foods', (), {}, 'food_stats', {'qualifier': 'frequent'})
+        self.assert_match('log_activity', ({'a': 1},), {}, 'log_activity')
+        self.assert_match('add_favorite_activity', ('1',), {}, 'add_favorite_activity')
+        self.assert_match('delete_favorite_activity', ('1',), {}, 'delete_favorite_activity')
+        self.assert_match('add_favorite_food', ('1',), {}, 'add_favorite_food')
+        self.assert_match('delete_favorite_food', ('1',), {}, 'delete_favorite_food')
+        self.assert_match('create_food', ({'a': 1},), {}, 'create_food')
+        self.assert_match('get_meals', (), {}, 'get_meals')
+        self.assert_match('get_devices', (), {}, 'get_devices')
+        self.assert_match('get_alarms', ('D',), {}, 'get_alarms')
+        self.assert_match('delete_alarm', ('D', 'A'), {}, 'delete_alarm', {'alarm_id': 'A'})
+        self.assert_match('get_sleep', (date,), {}, 'get_sleep', {'date': '2016-1-2'})
+        self.assert_match('log_sleep', (datetime.datetime(2016, 1, 2, 22), 100), {}, 'log_sleep')
+        self.assert_match('activities_list', (), {}, 'activities_list')
+        self.assert_match('activity_detail', ('1',), {}, 'activity_detail', {'activity_id': '1'})
+        self.assert_match('search_foods', ('ba/na na',), {}, 'search_foods')
+        self.assert_match('food_detail', ('1',), {}, 'food_detail')
+        self.assert_match('food_units', (), {}, 'food_units')
+        self.assert_match('get_bodyweight', (date,), {'end_date': date}, 'body_log',
+                          {'type_': 'weight', 'date_string': '2016-01-02/2016-01-02'})
+        self.assert_match('get_bodyfat', (date,), {}, 'body_log', {'type_': 'fat'})
+        self.assert_match('get_friends', (), {}, 'get_friends')
+        self.assert_match('get_friends_leaderboard', ('7d',), {}, 'get_friends_leaderboard')
+        self.assert_match('invite_friend_by_email', ('a@b.c',), {}, 'invite_friend')
+        self.assert_match('accept_invite', ('U',), {}, 'respond_to_invite', {'other_user_id': 'U'})
+        self.assert_match('get_badges', (), {}, 'get_badges')
+        self.assert_match('list_subscriptions', ('foods',), {}, 'list_subscriptions',
+                          {'collection': '/foods'})
+        self.assert_match('list_subscriptions', (), {}, 'list_subscriptions', {'collection': ''})
+        self.assert_match('subscription', ('S', 'SUB'), {'collection': 'foods'}, 'subscription',
+                          {'collection': '/foods', 'subscription_id': 'S-foods'})
@@ -0,0 +1,180 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import requests_mock
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.export import Exporter, NdjsonWriter, main
+from fitbit.tokens import MemoryTokenStore
+from fitbit.transport import Response, StubTransport
+
+URL = Fitbit.API_ENDPOINT + '/1/user/-/%s'
+TOKENS = {
+    'A': {'access_token': 'a', 'refresh_token': 'r'},
+    'B': {'access_token': 'b', 'refresh_token': 'r'},
+}
+
+
+def responses(transport, fail=()):
+    """ Stub the responses of the users, from their tokens """
+    def user(request):
+        return request['headers']['Authorization'][len('Bearer '):]
+
+    def respond(data):
+        def response(request):
+            if user(request) in fail:
+                return Response(500, b'{"errors": []}')
+            return Response(200, json.dumps(data(user(request))).encode('utf8'))
+        return response
+
+    transport.responses[('GET', URL % 'activities/steps/date/2017-01-01/2017-01-02.json')] = respond(
+        lambda user: {'activities-steps': [
+            {'dateTime': '2017-01-01', 'value': user + '1'},
+            {'dateTime': '2017-01-02', 'value': user + '2'}]})
+    for date in ('2017-01-01', '2017-01-02'):
+        transport.responses[('GET', URL % ('activities/heart/date/%s/1d/1sec.json' % date))] = respond(
+            lambda user, date=date: {
+                'activities-heart': [{'dateTime': date, 'value': {}}],
+                'activities-heart-intraday': {'dataset': [
+                    {'time': '00:00:00', 'value': 60},
+                    {'time': '00:00:01', 'value': 61}]}})
+        transport.responses[('GET', URL % ('foods/log/date/%s.json' % date))] = respond(
+            lambda user, date=date: {'foods': [], 'user': user})
+
+
+class ExportTest(TestCase):
+    """ Tests for fitbit.export """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.threads = threading.active_count()
+        self.transport = StubTransport()
+        self.fb = Fitbit('x', 'y', transport=self.transport,
+                         token_store=MemoryTokenStore(TOKENS))
+        self.exporter = Exporter(
+            self.fb, '2017-01-01', '2017-01-02',
+            time_series=['activities/steps'],
+            intraday=[('activities/heart', '1sec')],
+            collections=['foods/log'], workers=2, queue_size=2, retries=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def records(self, f):
+        return [json.loads(line) for line in f.getvalue().splitlines()]
+
+    def test_export(self):
+        responses(self.transport)
+        f = io.BytesIO()
+        stats = self.exporter.run(['A', 'B'], NdjsonWriter(f))
+        records = self.records(f)
+        self.assertEqual((2, 0, 16, len(f.getvalue())), (
+            stats.done, len(stats.failed), stats.records, stats.bytes))
+        for user in 'AB':
+            user_records = [r for r in records if r['user'] == user]
+            self.assertEqual([
+                {'user': user, 'resource': 'activities/steps',
+                 'date': '2017-01-01', 'value': user.lower() + '1'},
+                {'user': user, 'resource': 'activities/steps',
+                 'date': '2017-01-02', 'value': user.lower() + '2'},
+                {'user': user, 'resource': 'activities/heart',
+                 'date': '2017-01-01', 'time': '00:00:00', 'value': 60},
+                {'user': user, 'resource': 'activities/heart',
+                 'date': '2017-01-01', 'time': '00:00:01', 'value': 61},
+                {'user': user, 'resource': 'foods/log', 'date': '2017-01-01',
+                 'data': {'foods': [], 'user': user.lower()}},
+            ], user_records[:5])
+        self.assertIn('2/2 users done, 0 failed', str(stats))
+
+    def test_resume(self):
+        responses(self.transport, fail=['b'])
+        state = os.path.join(self.tmp_dir, 'export.state')
+        self.exporter.state_path = state
+        f = io.BytesIO()
+        stats = self.exporter.run(['A', 'B'], NdjsonWriter(f))
+        self.assertEqual(1, stats.done)
+        self.assertEqual(['B'], list(stats.failed))
+
+        # Only the failed user is exported again
+        responses(self.transport)
+        f = io.BytesIO()
+        stats = self.exporter.run(['A', 'B'], NdjsonWriter(f))
+        self.assertEqual((1, 1), (stats.done, stats.skipped))
+        self.assertEqual(set('B'), set(r['user'] for r in self.records(f)))
+        stats = self.exporter.run(['A', 'B'], NdjsonWriter(io.BytesIO()))
+        self.assertEqual((0, 2), (stats.done, stats.skipped))
+
+        # The state of another export isn't used
+        other = Exporter(self.fb, '2017-01-01', '2017-01-03',
+                         state_path=state)
+        self.assertRaises(ValueError, other.run, ['A'], NdjsonWriter(f))
+        # One fetched user per worker may wait to be written by default
+        self.assertEqual(other.workers, other.queue_size)
+
+    def test_failed_user(self):
+        # Users failing partway through have none of their records written
+        responses(self.transport)
+        key = ('GET', URL % 'foods/log/date/2017-01-02.json')
+        respond = self.transport.responses[key]
+        self.transport.responses[key] = lambda request: (
+            Response(500, b'{"errors": []}')
+            if request['headers']['Authorization'] == 'Bearer b'
+            else respond(request))
+        f = io.BytesIO()
+        stats = self.exporter.run(['A', 'B'], NdjsonWriter(f))
+        self.assertEqual((1, ['B']), (stats.done, list(stats.failed)))
+        self.assertEqual(8, stats.records)
+        self.assertEqual(set('A'), set(r['user'] for r in self.records(f)))
+
+    def test_slow_writer(self):
+        # The bounded queue holds the workers back, and the progress is
+        # reported meanwhile
+        responses(self.transport)
+        f = io.BytesIO()
+        writer = NdjsonWriter(f)
+        write = writer.write
+
+        def slow_write(record):
+            time.sleep(0.01)
+            return write(record)
+        writer.write = slow_write
+        reports = []
+        stats = self.exporter.run(['A', 'B'], writer, progress=reports.append,
+                                  progress_interval=0)
+        self.assertEqual(16, stats.records)
+        self.assertTrue(reports)
+        self.assertEqual(self.threads, threading.active_count())
+
+    def test_writer_error(self):
+        # Workers are stopped when writing fails
+        responses(self.transport)
+        writer = NdjsonWriter(None)
+        self.assertRaises(AttributeError, self.exporter.run, ['A', 'B'], writer)
+        self.assertEqual(self.threads, threading.active_count())
+
+    def test_command(self):
+        tokens = os.path.join(self.tmp_dir, 'tokens.json')
+        with open(tokens, 'w') as f:
+            json.dump(TOKENS, f)
+        output = os.path.join(self.tmp_dir, 'export.ndjson')
+        with requests_mock.mock() as m:
+            m.get(URL % 'activities/steps/date/2017-01-01/2017-01-01.json',
+                  text=json.dumps({'activities-steps': [
+                      {'dateTime': '2017-01-01', 'value': '5'}]}))
+            self.assertEqual(0, main([
+                '--client-id', 'x', '--client-secret', 'y',
+                '--tokens', tokens, '--users', 'A',
+                '--start', '2017-01-01', '--end', '2017-01-01',
+                '--time-series', 'activities/steps', '--output', output,
+                '--quiet']))
+        with open(output) as f:
+            self.assertEqual([{'user': 'A', 'resource': 'activities/steps',
+                               'date': '2017-01-01', 'value': '5'}],
+                             [json.loads(line) for line in f])
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+HEAVY_MODULES = ['requests', 'requests_oauthlib', 'oauthlib']
+
+
+class ImportTest(TestCase):
+    """
+    Guards the import time of the library, which matters for short lived
+    processes. Each check runs in a fresh interpreter and reports which of
+    the slow to import dependencies got imported.
+    """
+
+    def imported_heavy_modules(self, code):
+        code = '\n'.join([
+            'import sys',
+            code,
+            'print(",".join(m for m in %r if m in sys.modules))' % HEAVY_MODULES,
+        ])
+        output = subprocess.check_output([sys.executable, '-c', code])
+        return [m for m in output.decode('utf8').strip().split(',') if m]
+
+    def test_import_fitbit(self):
+        self.assertEqual([], self.imported_heavy_modules('import fitbit'))
+
+    def test_create_client(self):
+        if sys.version_info < (3, 7):
+            self.skipTest('fitbit.api is imported eagerly before Python 3.7')
+        code = '\n'.join([
+            'from fitbit import Fitbit',
+            'Fitbit("x", "y", access_token="a", refresh_token="r").for_user("b", "s")',
+        ])
+        self.assertEqual([], self.imported_heavy_modules(code))
+
+    def test_first_request(self):
+        # The dependencies are imported once the client needs its session
+        code = '\n'.join([
+            'from fitbit import Fitbit',
+            'Fitbit("x", "y").client.session',
+        ])
+        self.assertEqual(HEAVY_MODULES, self.imported_heavy_modules(code))
@@ -0,0 +1,151 @@
+import datetime
+import json
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.bulk import BulkWriter, entry
+from fitbit.exceptions import HTTPBadRequest, Timeout
+from fitbit.journal import WriteJournal, fingerprint
+from fitbit.tokens import MemoryTokenStore
+from fitbit.transport import Response, StubTransport
+
+URL = Fitbit.API_ENDPOINT + '/1/user/-/%s'
+DATA = {'activityId': 90013, 'startTime': '12:00', 'durationMillis': 600000}
+
+
+class WriteJournalTest(TestCase):
+    """ Tests for fitbit.journal """
+
+    def setUp(self):
+        self.logs = []
+        self.timeouts = []
+        self.transport = StubTransport({
+            ('POST', URL % 'activities.json'): self.post,
+            ('GET', URL % 'activities/date/2017-01-01.json'): self.get,
+        })
+        store = MemoryTokenStore({'a': {'access_token': 'a', 'refresh_token': 'r'}})
+        self.fb = Fitbit('x', 'y', token_store=store,
+                         transport=self.transport).for_stored_user('a')
+        self.journal = WriteJournal()
+
+    def post(self, request):
+        data = request['data']
+        log = {'logId': len(self.logs) + 1,
+               'activityId': data['activityId'],
+               'startTime': data['startTime'],
+               'duration': int(data['durationMillis'])}
+        made, timeout = self.timeouts.pop(0) if self.timeouts else (True, False)
+        if made:
+            self.logs.append(log)
+        if timeout:
+            raise Timeout('Timed out')
+        return Response(201, json.dumps({'activityLog': log}).encode('utf8'))
+
+    def get(self, request):
+        return Response(200, json.dumps({'activities': self.logs}).encode('utf8'))
+
+    def methods(self):
+        return [request['method'] for request in self.transport.requests]
+
+    def test_write(self):
+        response = self.journal.write(self.fb, 'activities', DATA, '2017-01-01')
+        self.assertEqual(1, response['activityLog']['logId'])
+        self.assertEqual(['POST'], self.methods())
+        self.assertEqual('2017-01-01', self.transport.requests[0]['data']['date'])
+        self.assertEqual([], self.journal.pending())
+
+    def test_made_before_timeout(self):
+        # The log was made, so it isn't sent again
+        self.timeouts = [(True, True)]
+        response = self.journal.write(self.fb, 'activities', DATA, '2017-01-01')
+        self.assertEqual({'log': self.logs[0]}, response)
+        self.assertEqual(['POST', 'GET'], self.methods())
+        self.assertEqual(1, len(self.logs))
+
+    def test_not_made(self):
+        self.timeouts = [(False, True)]
+        response = self.journal.write(self.fb, 'activities', DATA, '2017-01-01')
+        self.assertEqual(1, response['activityLog']['logId'])
+        self.assertEqual(['POST', 'GET', 'POST'], self.methods())
+
+    def test_identical_writes(self):
+        # A log claimed by an earlier identical write isn't taken
+        self.journal.write(self.fb, 'activities', DATA, '2017-01-01')
+        self.timeouts = [(False, True)]
+        response = self.journal.write(self.fb, 'activities', DATA, '2017-01-01')
+        self.assertEqual(2, response['activityLog']['logId'])
+        self.assertEqual(2, len(self.logs))
+
+    def test_resume(self):
+        self.timeouts = [(False, True)] * 3
+        self.assertRaises(Timeout, self.journal.write, self.fb, 'activities',
+                          DATA, '2017-01-01')
+        self.assertEqual(1, len(self.journal.pending(self.fb)))
+        self.assertEqual([], self.journal.pending(Fitbit('x', 'y')))
+        self.journal.resume(self.fb)
+        self.assertEqual(1, len(self.logs))
+        self.assertEqual([], self.journal.pending())
+        self.assertRaises(ValueError, self.journal.write, self.fb, 'body', {})
+
+    def test_rejected(self):
+        # Writes the API rejected aren't sent again
+        self.transport.responses[('POST', URL % 'activities.json')] = (
+            lambda request: Response(400, b'{"errors": []}'))
+        self.assertRaises(HTTPBadRequest, self.journal.write, self.fb,
+                          'activities', DATA, '2017-01-01')
+        self.assertEqual([], self.journal.pending())
+        self.assertEqual(1, len(self.journal.rejected(self.fb)))
+        self.journal.resume(self.fb)
+        self.assertEqual(['POST'], self.methods())
+
+    def test_bulk(self):
+        self.timeouts = [(True, True)]
+        entries = [
+            entry(self.fb, 'log_activity', dict(DATA, date='2017-01-01')),
+            entry(self.fb, 'activities', date='2017-01-01', data=DATA),
+        ]
+        results = list(BulkWriter(call=self.journal.call).write(entries))
+        self.assertEqual([1, 2], [result.log_id for result in results])
+        self.assertEqual(['POST', 'GET', 'POST'], self.methods())
+
+    def test_bulk_positional(self):
+        # Positional dates are bound like the collection methods bind them
+        self.timeouts = [(True, True)]
+        entries = [entry(self.fb, 'activities', '2017-01-01', None, DATA)]
+        results = list(BulkWriter(call=self.journal.call).write(entries))
+        self.assertEqual(1, results[0].log_id)
+        self.assertEqual(['POST', 'GET'], self.methods())
+        self.assertEqual(1, len(self.logs))
+
+    def test_bulk_sleep(self):
+        # Sleep is listed on the day it ends
+        logs = []
+
+        def post(request):
+            log = {'logId': 7, 'startTime': '2017-01-01T23:30:00.000',
+                   'duration': int(request['data']['duration'])}
+            logs.append(log)
+            raise Timeout('Timed out')
+
+        self.transport.responses.update({
+            ('POST', URL % 'sleep.json'): post,
+            ('GET', URL % 'sleep/date/2017-01-01.json'): lambda request: Response(
+                200, b'{"sleep": []}'),
+            ('GET', URL % 'sleep/date/2017-01-02.json'): lambda request: Response(
+                200, json.dumps({'sleep': logs}).encode('utf8')),
+        })
+        start = datetime.datetime(2017, 1, 1, 23, 30)
+        entries = [entry(self.fb, 'log_sleep', start, 28800000)]
+        results = list(BulkWriter(call=self.journal.call).write(entries))
+        self.assertEqual(7, results[0].log_id)
+        self.assertEqual(['POST', 'GET', 'GET'], self.methods())
+        self.assertEqual({'startTime': '23:30', 'duration': 28800000,
+                          'date': '2017-01-01'},
+                         self.transport.requests[0]['data'])
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('a', 'activities', '2017-01-01', {'a': 1, 'b': 2}),
+                         fingerprint('a', 'activities', '2017-01-01', {'b': 2, 'a': 1}))
+        self.assertNotEqual(fingerprint('a', 'activities', '2017-01-01', {}),
+                            fingerprint('b', 'activities', '2017-01-01', {}))
@@ -0,0 +1,92 @@
+import datetime
+import mock
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.planner import Query, QueryPlanner, windows
+
+URLBASE = "%s/%s/user" % (Fitbit.API_ENDPOINT, Fitbit.API_VERSION)
+
+
+class PlannerTest(TestCase):
+    """ Tests for batching per-day lookups with fitbit.planner """
+
+    def setUp(self):
+        self.fb = Fitbit('x', 'y')
+        self.day = lambda day: datetime.date(2017, 1, 1) + datetime.timedelta(days=day)
+
+    def test_windows(self):
+        dates = [self.day(d) for d in [40, 0, 1, 30, 31, 29, 0]]
+        self.assertEqual([
+            (self.day(0), self.day(30)),
+            (self.day(31), self.day(40)),
+        ], windows(dates, 31))
+        self.assertEqual([(self.day(5), self.day(5))], windows([self.day(5)], 31))
+        self.assertEqual([], windows([], 31))
+
+    def test_plan(self):
+        planner = QueryPlanner(self.fb, needs=[
+            ('activities', '2017-01-02'),
+            ('activities', datetime.datetime(2017, 1, 1, 12)),
+        ])
+        planner.add_range('activities/steps', self.day(0), self.day(29))
+        planner.add_range('body/log/weight', self.day(0), self.day(59))
+        planner.add_range('sleep/minutesAsleep', self.day(0), self.day(149))
+        self.assertEqual([
+            Query('activities', self.day(0), self.day(0)),
+            Query('activities', self.day(1), self.day(1)),
+            Query('activities/steps', self.day(0), self.day(29)),
+            Query('body/log/weight', self.day(0), self.day(30)),
+            Query('body/log/weight', self.day(31), self.day(59)),
+            Query('sleep/minutesAsleep', self.day(0), self.day(99)),
+            Query('sleep/minutesAsleep', self.day(100), self.day(149)),
+        ], planner.plan())
+
+    def test_time_series(self):
+        planner = QueryPlanner(self.fb, user_id='USER')
+        planner.add('activities/steps', '2017-01-03')
+        planner.add('activities/steps', '2017-01-01')
+        with mock.patch.object(self.fb, 'make_request') as make_request:
+            make_request.return_value = {'activities-steps': [
+                {'dateTime': '2017-01-01', 'value': '10'},
+                {'dateTime': '2017-01-02', 'value': '20'},
+            ]}
+            results = planner.execute()
+        make_request.assert_called_once_with(
+            URLBASE + '/USER/activities/steps/date/2017-01-01/2017-01-03.json')
+        self.assertEqual({
+            ('activities/steps', self.day(0)): '10',
+            ('activities/steps', self.day(2)): None,
+        }, results)
+
+    def test_body_logs(self):
+        planner = QueryPlanner(self.fb)
+        planner.add_range('body/log/fat', '2017-01-01', '2017-01-02')
+        entries = [
+            {'date': '2017-01-02', 'fat': 20, 'logId': 1},
+            {'date': '2017-01-02', 'fat': 21, 'logId': 2},
+        ]
+        with mock.patch.object(self.fb, 'make_request') as make_request:
+            make_request.return_value = {'fat': entries}
+            results = planner.execute()
+        make_request.assert_called_once_with(
+            URLBASE + '/-/body/log/fat/date/2017-01-01/2017-01-02.json')
+        self.assertEqual({
+            ('body/log/fat', self.day(0)): None,
+            ('body/log/fat', self.day(1)): entries,
+        }, results)
+
+    def test_collection(self):
+        planner = QueryPlanner(self.fb)
+        planner.add_range('foods/log/water', '2017-01-01', '2017-01-02')
+        planner.add_range('sleep', '2017-01-01', '2017-01-02')
+        with mock.patch.object(self.fb, 'make_request') as make_request:
+            make_request.side_effect = lambda url, data=None: {'url': url}
+            results = planner.execute()
+        # Water comes from a single time series request
+        self.assertEqual(3, make_request.call_count)
+        make_request.assert_any_call(
+            URLBASE + '/-/foods/log/water/date/2017-01-01/2017-01-02.json')
+        self.assertEqual(
+            {'url': URLBASE + '/-/sleep/date/2017-01-02.json'},
+            results[('sleep', self.day(1))])
@@ -0,0 +1,39 @@
+import pickle
+import socket
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.pool import PoolAdapter, connection_pool
+
+
+class PoolTest(TestCase):
+    """ Tests for sharing connection pools between clients """
+
+    def test_connection_pool(self):
+        pool = connection_pool(maxsize=50, block=True)
+        self.assertEqual(50, pool._pool_maxsize)
+        self.assertTrue(pool._pool_block)
+        self.assertIn(
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            pool.poolmanager.connection_pool_kw['socket_options'])
+
+    def test_no_keepalive(self):
+        pool = connection_pool(keepalive=False)
+        self.assertNotIn('socket_options', pool.poolmanager.connection_pool_kw)
+
+    def test_shared_between_clients(self):
+        # Separate clients, and their user handles, all use the same pool
+        # while keeping their own tokens
+        pool = connection_pool()
+        fb1 = Fitbit('x', 'y', access_token='a1', refresh_token='r1', pool=pool)
+        fb2 = Fitbit('x', 'y', access_token='a2', refresh_token='r2', pool=pool)
+        handle = fb1.for_user('a3', 'r3')
+        for fb in [fb1, fb2, handle]:
+            self.assertIs(pool, fb.client.session.get_adapter(Fitbit.API_ENDPOINT))
+        self.assertEqual('a1', fb1.client.session.token['access_token'])
+        self.assertEqual('a2', fb2.client.session.token['access_token'])
+        self.assertEqual('a3', handle.client.session.token['access_token'])
+
+    def test_pickle(self):
+        pool = pickle.loads(pickle.dumps(PoolAdapter(keepalive=False)))
+        self.assertFalse(pool.keepalive)
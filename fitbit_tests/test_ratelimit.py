@@ -0,0 +1,103 @@
+import mock
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.exceptions import HTTPTooManyRequests
+from fitbit.ratelimit import RateLimiter, SqliteRateLimiter
+from fitbit.tokens import MemoryTokenStore
+from fitbit.transport import Response, StubTransport
+
+PROFILE_URL = Fitbit.API_ENDPOINT + '/1/user/-/profile.json'
+
+
+class RateLimitTest(TestCase):
+    """ Tests for fitbit.ratelimit """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'ratelimit.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_limiter(self, limiter):
+        self.assertEqual(0, limiter.acquire('a'))
+        self.assertEqual(0, limiter.acquire('a'))
+        wait = limiter.acquire('a')
+        self.assertTrue(0 < wait <= 60)
+        # Keys are counted separately
+        self.assertEqual(0, limiter.acquire('b'))
+        limiter.block('b', 120)
+        self.assertTrue(60 < limiter.acquire('b') <= 120)
+
+    def test_limiter(self):
+        self.check_limiter(RateLimiter(limit=2, period=60))
+
+    def test_window(self):
+        limiter = RateLimiter(limit=1, period=0.05)
+        limiter.wait('a')
+        start = time.time()
+        limiter.wait('a')
+        self.assertTrue(time.time() - start > 0.01)
+
+    def test_sqlite(self):
+        limiter = SqliteRateLimiter(self.path, limit=2, period=60)
+        self.check_limiter(limiter)
+        # Other connections, and pickled copies, share the counts
+        other = SqliteRateLimiter(self.path, limit=2, period=60)
+        self.assertTrue(other.acquire('a') > 0)
+        self.assertTrue(pickle.loads(pickle.dumps(limiter)).acquire('a') > 0)
+        self.assertEqual(0, other.acquire('c'))
+        self.assertTrue(0 < limiter.acquire('b') <= 120)
+        limiter.close()
+        other.close()
+
+    def test_fitbit(self):
+        limiter = mock.MagicMock(spec=RateLimiter)
+        transport = StubTransport()
+        store = MemoryTokenStore({'a': {'access_token': 'x', 'refresh_token': 'y'}})
+        fb = Fitbit('x', 'y', transport=transport, token_store=store,
+                    rate_limiter=limiter)
+        transport.add('GET', PROFILE_URL)
+        fb.user_profile_get()
+        limiter.wait.assert_called_once_with(None)
+
+        # Stored users are limited separately, and 429s block them
+        transport.responses[('GET', PROFILE_URL)] = Response(
+            429, b'{"errors": []}', {'Retry-After': '30'})
+        self.assertRaises(HTTPTooManyRequests,
+                          fb.for_stored_user('a').user_profile_get)
+        limiter.wait.assert_called_with('a')
+        limiter.block.assert_called_once_with('a', 30)
+
+    def test_fitbit_handles(self):
+        # Handles of users which aren't stored are limited separately too
+        limiter = RateLimiter(limit=2, period=60)
+        transport = StubTransport()
+        transport.add('GET', PROFILE_URL)
+        fb = Fitbit('x', 'y', transport=transport, rate_limiter=limiter)
+        a, b = fb.for_user('a', 'r'), fb.for_user('b', 'r')
+        a.user_profile_get()
+        a.user_profile_get()
+        self.assertNotEqual(a._user_key(), b._user_key())
+        self.assertTrue(limiter.acquire(a._user_key()) > 0)
+        self.assertEqual(0, limiter.acquire(b._user_key()))
+
+        # Refreshing the token keeps the user's count
+        key = a._user_key()
+        a.client.token = {'access_token': 'a2', 'refresh_token': 'r2'}
+        self.assertEqual(key, a._user_key())
+        self.assertEqual(key, a.with_raw()._user_key())
+
+        # And a 429 only blocks its own user
+        c = fb.for_user('c', 'r')
+        transport.responses[('GET', PROFILE_URL)] = Response(
+            429, b'{"errors": []}', {'Retry-After': '30'})
+        self.assertRaises(HTTPTooManyRequests, b.user_profile_get)
+        self.assertEqual(0, limiter.acquire(c._user_key()))
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.exceptions import HTTPNotFound
+from fitbit.ratelimit import SqliteRateLimiter
+from fitbit.runner import Runner
+from fitbit.tokens import SqliteTokenStore
+from fitbit.transport import Response, StubTransport
+
+PROFILE_URL = Fitbit.API_ENDPOINT + '/1/user/-/profile.json'
+
+
+def profile(fitbit, suffix):
+    response = fitbit.user_profile_get()
+    return response['user']['aboutMe'] + suffix, os.getpid()
+
+
+def missing(fitbit):
+    return fitbit.get_devices()
+
+
+class RunnerTest(TestCase):
+    """ Tests for fitbit.runner """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.token_db = os.path.join(self.tmp_dir, 'tokens.db')
+        store = SqliteTokenStore(self.token_db)
+        store.set_many(dict(
+            (user_id, {'access_token': user_id, 'refresh_token': user_id})
+            for user_id in 'abcde'))
+        store.close()
+        self.limiter = SqliteRateLimiter(
+            os.path.join(self.tmp_dir, 'ratelimit.db'))
+        transport = StubTransport({('GET', PROFILE_URL): Response(
+            200, b'{"user": {"aboutMe": "hello"}}')})
+        self.runner = Runner('x', 'y', self.token_db, processes=2,
+                             rate_limiter=self.limiter, transport=transport,
+                             max_queued=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run(self):
+        results = list(self.runner.run(profile, 'abcdef', '!'))
+        self.assertEqual(6, len(results))
+        results = dict((user_id, (result, error))
+                       for user_id, result, error in results)
+        self.assertIsInstance(results.pop('f')[1], KeyError)
+        self.assertEqual(set(['hello!']),
+                         set(result[0] for result, error in results.values()))
+        # The work was shared by the workers
+        self.assertEqual(2, len(set(result[1] for result, error in results.values())))
+        # Every request went through the shared rate limiter
+        counts = self.limiter.db.execute(
+            'SELECT key, count FROM fitbit_rate_limits').fetchall()
+        self.assertEqual(dict((user_id, 1) for user_id in 'abcde'), dict(counts))
+
+    def test_errors(self):
+        for user_id, result, error in self.runner.run(missing, 'ab'):
+            self.assertIsNone(result)
+            self.assertIsInstance(error, HTTPNotFound)
+
+    def test_stop_early(self):
+        for result in self.runner.run(profile, 'abcde', ''):
+            break
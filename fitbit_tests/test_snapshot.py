@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.catalog import ActivityCatalog, FoodCatalog
+from fitbit.snapshot import Snapshot, tables_from_catalogs, write_snapshot
+from fitbit.transport import StubTransport
+
+ACTIVITIES = {
+    90009: {'id': 90009, 'name': 'Running', 'categoryId': 1},
+    90010: {'id': 90010, 'name': 'Slow', 'parentId': 90009},
+    17151: {'id': 17151, 'name': 'Walking', 'categoryId': 1},
+}
+
+
+def _lookup(path, queue):
+    with Snapshot(path) as snapshot:
+        queue.put(snapshot.get('activities', 17151))
+
+
+class SnapshotTest(TestCase):
+    """ Tests for fitbit.snapshot """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'catalog.snap')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get(self):
+        write_snapshot(self.path, {
+            'activities': ACTIVITIES,
+            'activity_names': {'running': 90009, u'caf\xe9': 1},
+            'empty': {},
+        })
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(5, len(snapshot))
+            for activity_id, activity in ACTIVITIES.items():
+                self.assertEqual(activity,
+                                 snapshot.get('activities', activity_id))
+            self.assertEqual(ACTIVITIES[90009],
+                             snapshot.get('activities', '90009'))
+            self.assertIsNone(snapshot.get('activities', 1))
+            self.assertIsNone(snapshot.get('activities', 'running'))
+            self.assertEqual(90009, snapshot.get('activity_names', 'running'))
+            self.assertEqual(1, snapshot.get('activity_names', u'caf\xe9'))
+            self.assertEqual('x', snapshot.get('activity_names', 'run', 'x'))
+            self.assertIsNone(snapshot.get('empty', 1))
+            self.assertEqual([17151, 90009, 90010],
+                             snapshot.keys('activities'))
+            self.assertEqual([u'caf\xe9', 'running'],
+                             snapshot.keys('activity_names'))
+            self.assertRaises(KeyError, snapshot.get, 'foods', 1)
+
+    def test_invalid(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"activities": {}}')
+        self.assertRaises(ValueError, Snapshot, self.path)
+        self.assertRaises(ValueError, write_snapshot, self.path, {'x' * 33: {}})
+
+    def test_replace(self):
+        # Snapshots are replaced atomically, open ones keep the old data
+        write_snapshot(self.path, {'activities': ACTIVITIES})
+        old = Snapshot(self.path)
+        write_snapshot(self.path, {'activities': {1: {'id': 1}}})
+        with Snapshot(self.path) as new:
+            self.assertEqual({'id': 1}, new.get('activities', 1))
+        self.assertEqual(ACTIVITIES[90009], old.get('activities', 90009))
+        self.assertIsNone(old.get('activities', 1))
+        old.close()
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_from_catalogs(self):
+        fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                    transport=StubTransport())
+        activities = ActivityCatalog(fb)
+        activities._load(ACTIVITIES, 0)
+        foods = FoodCatalog(fb)
+        foods.add([{'foodId': 1, 'name': 'Banana', 'units': [2]}])
+        foods.units = [{'id': 2, 'name': 'slice'}]
+        write_snapshot(self.path, tables_from_catalogs(activities, foods))
+        foods.close()
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(90009, snapshot.get('activity_names', 'running'))
+            self.assertIsNone(snapshot.get('activity_names', 'slow'))
+            self.assertEqual('Slow', snapshot.get('activities', 90010)['name'])
+            self.assertEqual('Banana', snapshot.get('foods', 1)['name'])
+            self.assertEqual('slice', snapshot.get('food_units', 2)['name'])
+
+    def test_processes(self):
+        write_snapshot(self.path, {'activities': ACTIVITIES})
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_lookup,
+                                          args=(self.path, queue))
+        process.start()
+        self.assertEqual(ACTIVITIES[17151], queue.get(timeout=10))
+        process.join()
@@ -0,0 +1,93 @@
+import json
+import os
+import pickle
+import requests_mock
+import shutil
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from freezegun import freeze_time
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.spec import FitbitClientSpec
+from fitbit.tokens import SqliteTokenStore
+
+TOKEN = {'access_token': 'a', 'refresh_token': 'r', 'expires_at': 1483530000}
+
+
+def access_token(spec):
+    return spec.client().client.token['access_token']
+
+
+class SpecTest(TestCase):
+    """ Tests for fitbit.spec """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.token_db = os.path.join(self.tmp_dir, 'tokens.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pickle(self):
+        spec = FitbitClientSpec('x', 'y', token=TOKEN, timeout=10,
+                                system=Fitbit.METRIC)
+        self.assertEqual((('timeout', 10),), spec.options)
+        self.assertEqual(spec, pickle.loads(pickle.dumps(spec)))
+        self.assertTrue(len(pickle.dumps(spec, -1)) < 300)
+
+        fb = spec.client()
+        self.assertEqual('y', fb.client.client_secret)
+        self.assertEqual(10, fb.client.timeout)
+        self.assertEqual(Fitbit.METRIC, fb.system)
+        self.assertEqual(TOKEN, fb.client.token)
+        # Clients of the same app share a pool
+        other = FitbitClientSpec('x', 'y', token=TOKEN, timeout=10,
+                                 system=Fitbit.METRIC).client()
+        self.assertIsNotNone(fb.client._pool_owner)
+        self.assertIs(fb.client._pool_owner, other.client._pool_owner)
+
+    def test_secret_env(self):
+        spec = FitbitClientSpec('x', secret_env='TEST_FITBIT_SECRET', token=TOKEN)
+        os.environ['TEST_FITBIT_SECRET'] = 'secret'
+        try:
+            self.assertEqual('secret', spec.client().client.client_secret)
+        finally:
+            del os.environ['TEST_FITBIT_SECRET']
+        self.assertNotIn('secret', repr(pickle.dumps(spec)))
+
+    def test_from_fitbit(self):
+        fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                    system=Fitbit.METRIC, timeout=5)
+        spec = FitbitClientSpec.from_fitbit(fb)
+        self.assertEqual(FitbitClientSpec(
+            'x', 'y', token={'access_token': 'a', 'refresh_token': 'r'},
+            system=Fitbit.METRIC, timeout=5), spec)
+        spec = FitbitClientSpec.from_fitbit(fb, user_id='A', token_db='t.db')
+        self.assertIsNone(spec.token)
+
+    @freeze_time(datetime.fromtimestamp(1483563319))
+    def test_token_store(self):
+        store = SqliteTokenStore(self.token_db)
+        store.set('A', TOKEN)
+        spec = FitbitClientSpec('x', 'y', user_id='A', token_db=self.token_db)
+        fb = spec.client()
+        self.assertEqual(TOKEN, fb.client.token)
+        # Refreshed tokens are saved to the store
+        token = {'access_token': 'b', 'refresh_token': 's',
+                 'expires_at': 1483570000}
+        with requests_mock.mock() as m:
+            m.post(fb.client.refresh_token_url, text=json.dumps(token))
+            m.get(Fitbit.API_ENDPOINT + '/1/user/-/profile.json', text='{}')
+            fb.user_profile_get()
+        self.assertEqual(token, store.get('A'))
+        store.close()
+
+    def test_process_pool(self):
+        specs = [FitbitClientSpec('x', 'y', token={
+            'access_token': str(i), 'refresh_token': 'r'}) for i in range(4)]
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(['0', '1', '2', '3'],
+                             list(executor.map(access_token, specs)))
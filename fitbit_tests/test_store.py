@@ -0,0 +1,118 @@
+import datetime
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from fitbit.store import TimeSeriesStore, timestamp
+
+DAY = 86400
+BASE = timestamp('2017-01-01')
+
+STEPS = {'activities-steps': [
+    {'dateTime': '2017-01-01', 'value': '100'},
+    {'dateTime': '2017-01-02', 'value': '200'},
+    {'dateTime': '2017-01-03', 'value': '300'},
+]}
+
+
+def intraday(date, values, interval=1, dataset_type='second'):
+    return {
+        'activities-heart': [{'dateTime': date, 'value': {'heartRateZones': []}}],
+        'activities-heart-intraday': {
+            'dataset': [{'time': '00:%02d:%02d' % divmod(i, 60), 'value': value}
+                        for i, value in enumerate(values)],
+            'datasetInterval': interval,
+            'datasetType': dataset_type,
+        },
+    }
+
+
+class TimeSeriesStoreTest(TestCase):
+    """ Tests for fitbit.store.TimeSeriesStore """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = TimeSeriesStore(self.tmp_dir)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_timestamp(self):
+        self.assertEqual(0, timestamp('1970-01-01'))
+        self.assertEqual(3661, timestamp('1970-01-01 01:01:01'))
+        self.assertEqual(60, timestamp('1970-01-01T00:01'))
+        self.assertEqual(DAY, timestamp(datetime.date(1970, 1, 2)))
+        self.assertRaises(ValueError, timestamp, 'yesterday')
+
+    def test_time_series(self):
+        self.store.add_response('U', STEPS)
+        series = self.store.range('U', 'activities/steps', '1d',
+                                  '2017-01-02', '2017-01-03')
+        self.assertEqual([BASE + DAY, BASE + 2 * DAY], list(series.timestamps))
+        self.assertEqual([200, 300], list(series.values))
+        self.assertEqual((datetime.datetime(2017, 1, 3), 300),
+                         self.store.latest('U', 'activities/steps', '1d'))
+        self.assertIsNone(self.store.latest('U', 'activities/calories', '1d'))
+        self.assertEqual([], list(self.store.range(
+            'V', 'activities/steps', '1d', '2017-01-01', '2017-01-03').values))
+
+        # A day written again replaces the old one
+        self.store.add_response('U', {'activities-steps': [
+            {'dateTime': '2017-01-02', 'value': '250'}]})
+        series = self.store.range('U', 'activities/steps', '1d',
+                                  '2017-01-01', '2017-01-31')
+        self.assertEqual([100, 250, 300], list(series.values))
+
+        # Reopened from the files
+        store = TimeSeriesStore(self.tmp_dir)
+        series = store.range('U', 'activities/steps', '1d',
+                             '2016-12-01', datetime.date(2017, 1, 2))
+        self.assertEqual([100, 250], list(series.values))
+        store.close()
+        self.assertTrue(os.path.exists(os.path.join(
+            self.tmp_dir, 'U', 'activities.steps', '1d', 'index.json')))
+
+    def test_reader(self):
+        # A store reading while another writes sees the days it adds
+        reader = TimeSeriesStore(self.tmp_dir)
+        self.assertIsNone(reader.latest('U', 'activities/steps', '1d'))
+        self.store.add_response('U', STEPS)
+        self.assertEqual((datetime.datetime(2017, 1, 3), 300),
+                         reader.latest('U', 'activities/steps', '1d'))
+        self.store.add_response('U', {'activities-steps': [
+            {'dateTime': '2017-01-04', 'value': '400'}]})
+        series = reader.range('U', 'activities/steps', '1d',
+                              '2017-01-01', '2017-01-31')
+        self.assertEqual([100, 200, 300, 400], list(series.values))
+        reader.close()
+
+    def test_intraday(self):
+        self.store.add_response('U', intraday('2017-01-02', range(120)))
+        self.store.add_response('U', intraday('2017-01-01', [60, 61, 'x']))
+        series = self.store.range('U', 'activities/heart', '1sec',
+                                  '2017-01-01', '2017-01-02 00:01:00')
+        self.assertEqual([BASE, BASE + 1] + list(range(BASE + DAY,
+                                                       BASE + DAY + 61)),
+                         list(series.timestamps))
+        self.assertEqual([60, 61] + list(range(61)), list(series.values))
+        # The daily heart rate zones aren't numbers
+        self.assertIsNone(self.store.latest('U', 'activities/heart', '1d'))
+
+        resampled = self.store.resample('U', 'activities/heart', '1sec',
+                                        '2017-01-02', '2017-01-02', 60)
+        self.assertEqual([BASE + DAY, BASE + DAY + 60],
+                         list(resampled.timestamps))
+        self.assertEqual([29.5, 89.5], list(resampled.values))
+        resampled = self.store.resample('U', 'activities/heart', '1sec',
+                                        '2017-01-01', '2017-01-02', DAY, 'max')
+        self.assertEqual([61, 119], list(resampled.values))
+        self.assertEqual(
+            (datetime.datetime(2017, 1, 2, 0, 1, 59), 119),
+            self.store.latest('U', 'activities/heart', '1sec'))
+
+        self.store.add_response('U', intraday('2017-01-01', [5], 15, 'minute'))
+        self.assertEqual([5], list(self.store.range(
+            'U', 'activities/heart', '15min', '2017-01-01', '2017-01-01').values))
@@ -0,0 +1,178 @@
+import json
+import os
+import requests_mock
+import shutil
+import tempfile
+import threading
+import time
+
+from datetime import datetime
+from freezegun import freeze_time
+from unittest import TestCase
+
+from fitbit import Fitbit
+from fitbit.tokens import (
+    FileTokenStore, MemoryTokenStore, SqliteTokenStore, WriteBehindTokenStore)
+from fitbit.transport import StubTransport
+
+PROFILE_URL = Fitbit.API_ENDPOINT + '/1/user/-/profile.json'
+
+
+def token(name, expires_at=None):
+    token = {'access_token': 'access_%s' % name,
+             'refresh_token': 'refresh_%s' % name}
+    if expires_at:
+        token['expires_at'] = expires_at
+    return token
+
+
+class TokenStoreTest(TestCase):
+    """ Tests for fitbit.tokens """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_store(self, store):
+        self.assertIsNone(store.get('a'))
+        store.set('a', token('a'))
+        store.set_many({'b': token('b'), 'c': token('c')})
+        self.assertEqual(token('a'), store.get('a'))
+        self.assertEqual({'a': token('a'), 'c': token('c')},
+                         store.get_many(['a', 'c', 'unknown']))
+        self.assertEqual(['a', 'b', 'c'], sorted(store.get_many()))
+        store.set('a', token('a2'))
+        self.assertEqual(token('a2'), store.get('a'))
+        store.delete('b')
+        self.assertIsNone(store.get('b'))
+        store.flush()
+
+    def test_memory(self):
+        self.check_store(MemoryTokenStore())
+
+    def test_file(self):
+        path = os.path.join(self.tmp_dir, 'tokens.json')
+        self.check_store(FileTokenStore(path))
+        self.assertEqual({'a': token('a2'), 'c': token('c')},
+                         FileTokenStore(path).get_many())
+
+    def test_sqlite(self):
+        path = os.path.join(self.tmp_dir, 'tokens.db')
+        store = SqliteTokenStore(path)
+        self.check_store(store)
+        store.close()
+        store = SqliteTokenStore(path)
+        self.assertEqual({'a': token('a2'), 'c': token('c')}, store.get_many())
+        # Many users at once
+        store.set_many(dict((str(i), token(i)) for i in range(1200)))
+        self.assertEqual(1200, len(store.get_many(str(i) for i in range(1200))))
+        store.close()
+
+    def test_write_behind(self):
+        backend = MemoryTokenStore()
+        store = WriteBehindTokenStore(backend, interval=60)
+        self.check_store(store)
+        # check_store flushed, so everything was written
+        self.assertEqual({'a': token('a2'), 'c': token('c')}, backend.tokens)
+
+        # Tokens are queued, but visible straight away
+        store.set('d', token('d'))
+        self.assertEqual(token('d'), store.get('d'))
+        self.assertNotIn('d', backend.tokens)
+        store.close()
+        self.assertEqual(token('d'), backend.tokens['d'])
+        self.assertRaises(ValueError, store.set, 'e', token('e'))
+
+    def test_write_behind_batches(self):
+        backend = MemoryTokenStore()
+        batches = []
+        set_many = backend.set_many
+        backend.set_many = lambda tokens: batches.append(tokens) or set_many(tokens)
+        store = WriteBehindTokenStore(backend, interval=60, max_batch=3)
+        store.set('a', token('a'))
+        store.set('a', token('a2'))
+        store.set('b', token('b'))
+        store.set('c', token('c'))
+        # A full batch is written without waiting for the interval
+        for i in range(100):
+            if batches:
+                break
+            time.sleep(0.01)
+        self.assertEqual([{'a': token('a2'), 'b': token('b'), 'c': token('c')}],
+                         batches)
+        store.close()
+
+    def test_write_behind_failure(self):
+        backend = MemoryTokenStore()
+        set_many = backend.set_many
+        backend.set_many = lambda tokens: 1 / 0
+        store = WriteBehindTokenStore(backend, interval=60)
+        store.set('a', token('a'))
+        self.assertRaises(ZeroDivisionError, store.flush)
+        # Nothing is lost
+        backend.set_many = set_many
+        store.close()
+        self.assertEqual({'a': token('a')}, backend.tokens)
+
+    def test_write_behind_in_flight(self):
+        # A batch being written is still read from the queue
+        backend = MemoryTokenStore({'a': token('old')})
+        set_many = backend.set_many
+        writing, written = threading.Event(), threading.Event()
+
+        def slow_set_many(tokens):
+            writing.set()
+            written.wait(5)
+            set_many(tokens)
+        backend.set_many = slow_set_many
+        store = WriteBehindTokenStore(backend, interval=60)
+        store.set('a', token('new'))
+        flush = threading.Thread(target=store.flush)
+        flush.start()
+        self.assertTrue(writing.wait(5))
+        self.assertEqual(token('new'), store.get('a'))
+        self.assertEqual({'a': token('new')}, store.get_many())
+        written.set()
+        flush.join()
+        self.assertEqual(token('new'), store.get('a'))
+        store.close()
+
+
+class StoredUserTest(TestCase):
+    """ Tests for Fitbit objects getting their tokens from a token store """
+
+    def setUp(self):
+        self.store = MemoryTokenStore({
+            'a': token('a', expires_at=1483530000),
+            'b': token('b'),
+        })
+        self.transport = StubTransport()
+        self.fb = Fitbit('x', 'y', token_store=self.store,
+                         transport=self.transport)
+
+    def test_for_stored_user(self):
+        self.transport.add('GET', PROFILE_URL)
+        self.fb.for_stored_user('b').user_profile_get()
+        self.assertEqual('Bearer access_b',
+                         self.transport.requests[0]['headers']['Authorization'])
+        self.assertRaises(KeyError, self.fb.for_stored_user, 'unknown')
+
+    def test_for_stored_users(self):
+        handles = self.fb.for_stored_users()
+        self.assertEqual(['a', 'b'], sorted(handles))
+        self.assertEqual(token('b'), handles['b'].client.token)
+        self.assertEqual(['a'], list(self.fb.for_stored_users(['a', 'c'])))
+
+    @freeze_time(datetime.fromtimestamp(1483563319))
+    def test_refresh(self):
+        # Refreshed tokens are saved to the store
+        new_token = token('new', expires_at=1483570000)
+        self.transport.add('GET', PROFILE_URL)
+        with requests_mock.mock() as m:
+            m.post(self.fb.client.refresh_token_url, text=json.dumps(new_token))
+            self.fb.for_stored_user('a').user_profile_get()
+        self.assertEqual(new_token, self.store.get('a'))
+        self.assertEqual('Bearer access_new',
+                         self.transport.requests[0]['headers']['Authorization'])
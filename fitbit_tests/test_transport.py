@@ -0,0 +1,325 @@
+import io
+import json
+import mock
+import os
+import shutil
+import tempfile
+import requests
+import requests_mock
+import threading
+
+from datetime import datetime
+from freezegun import freeze_time
+from unittest import TestCase, skipIf
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+from fitbit import Fitbit
+from fitbit.cache import ResponseCache
+from fitbit.exceptions import (
+    HTTPNotFound, HTTPTooManyRequests, HTTPUnauthorized, Timeout)
+from fitbit.transport import (
+    HttpxTransport, RequestsTransport, Response, StubTransport,
+    Urllib3Transport)
+
+PROFILE_URL = Fitbit.API_ENDPOINT + '/1/user/-/profile.json'
+PROFILE = b'{"user":{"aboutMe": "python-fitbit developer"}}'
+
+
+class TransportClientTest(TestCase):
+    """ Tests for clients sending their requests through a transport """
+
+    def setUp(self):
+        self.transport = StubTransport()
+        self.refresh_cb = mock.MagicMock()
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         refresh_cb=self.refresh_cb, transport=self.transport,
+                         timeout=10)
+
+    def test_bearer(self):
+        self.transport.add('GET', PROFILE_URL, content=PROFILE)
+        self.assertEqual('python-fitbit developer',
+                         self.fb.user_profile_get()['user']['aboutMe'])
+        request, = self.transport.requests
+        self.assertEqual('Bearer a', request['headers']['Authorization'])
+        self.assertEqual(self.fb.system, request['headers']['Accept-Language'])
+        self.assertEqual(10, request['timeout'])
+        self.assertEqual({}, request['data'])
+
+    def test_user_handles(self):
+        # Handles share the transport, with their own tokens
+        self.transport.add('GET', PROFILE_URL, content=PROFILE)
+        self.fb.for_user('b', 's').user_profile_get()
+        self.assertEqual('Bearer b', self.transport.requests[0]['headers']['Authorization'])
+        self.assertIsNone(self.fb.client._session)
+
+    def test_post(self):
+        url = Fitbit.API_ENDPOINT + '/1/user/-/activities.json'
+        self.transport.add('POST', url, status_code=201, content=b'{"activityLog": {}}')
+        self.fb.log_activity({'activityId': 1})
+        self.assertEqual({'activityId': 1}, self.transport.requests[0]['data'])
+
+    def test_errors(self):
+        self.transport.add('GET', PROFILE_URL, status_code=401, content=json.dumps({
+            'errors': [{'errorType': 'invalid_token', 'message': 'Nope'}]
+        }).encode('utf8'))
+        self.assertRaises(HTTPUnauthorized, self.fb.user_profile_get)
+
+    @freeze_time(datetime.fromtimestamp(1483563319))
+    def test_refresh_expired(self):
+        # Expired tokens are refreshed before the request
+        handle = self.fb.for_user('a', 'r', expires_at=1483530000,
+                                  refresh_cb=self.refresh_cb)
+        self.transport.add('GET', PROFILE_URL, content=PROFILE)
+        token = {
+            'access_token': 'new_access_token',
+            'refresh_token': 'new_refresh_token',
+            'expires_at': 1483570000,
+        }
+        with requests_mock.mock() as m:
+            m.post(handle.client.refresh_token_url, text=json.dumps(token))
+            handle.user_profile_get()
+        self.refresh_cb.assert_called_once_with(token)
+        self.assertEqual('Bearer new_access_token',
+                         self.transport.requests[0]['headers']['Authorization'])
+        self.assertEqual(token, handle.client.token)
+
+    def test_refresh_expired_token_error(self):
+        # A 401 for an expired token refreshes it and tries again
+        responses = [
+            Response(401, json.dumps({'errors': [{
+                'errorType': 'expired_token', 'message': 'Expired'
+            }]}).encode('utf8')),
+            Response(200, PROFILE),
+        ]
+        self.transport.responses[('GET', PROFILE_URL)] = lambda request: responses.pop(0)
+        token = {'access_token': 'new_access_token', 'refresh_token': 'new_refresh_token'}
+        with requests_mock.mock() as m:
+            m.post(self.fb.client.refresh_token_url, text=json.dumps(token))
+            self.fb.user_profile_get()
+        self.refresh_cb.assert_called_once_with(token)
+        self.assertEqual(['Bearer a', 'Bearer new_access_token'], [
+            request['headers']['Authorization'] for request in self.transport.requests])
+
+
+class RawResponseTest(TestCase):
+    """ Tests for raw responses, and streaming responses to files """
+
+    def setUp(self):
+        self.transport = StubTransport()
+        self.transport.add('GET', PROFILE_URL, content=PROFILE,
+                           headers={'Content-Type': 'application/json'})
+        self.fb = Fitbit('x', 'y', access_token='a', refresh_token='r',
+                         transport=self.transport)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_raw(self):
+        response = self.fb.make_request(PROFILE_URL, raw=True)
+        self.assertEqual((200, PROFILE), (response.status_code, response.content))
+        self.assertEqual('application/json', response.headers['Content-Type'])
+        self.assertEqual('python-fitbit developer',
+                         self.fb.make_request(PROFILE_URL)['user']['aboutMe'])
+
+        raw = self.fb.with_raw()
+        self.assertEqual(PROFILE, raw.user_profile_get().content)
+        self.assertEqual(PROFILE, raw.for_user('b', 's').user_profile_get().content)
+        self.assertFalse(self.fb.raw)
+        self.assertIsInstance(raw.with_raw(False).user_profile_get(), dict)
+        # Errors are still raised
+        self.assertRaises(HTTPNotFound, raw.activities_list)
+
+    def test_raw_cache(self):
+        # Raw responses skip the cache, but writes still evict stale reads
+        self.fb.cache = ResponseCache()
+        self.fb.user_profile_get()
+        self.assertEqual(PROFILE,
+                         self.fb.make_request(PROFILE_URL, raw=True).content)
+        self.assertEqual(2, len(self.transport.requests))
+        self.transport.add('POST', PROFILE_URL, content=b'{}')
+        self.fb.make_request(PROFILE_URL, data={'aboutMe': 'x'}, raw=True)
+        self.assertEqual({}, dict(self.fb.cache.keys))
+
+    def test_stream_to_file(self):
+        path = os.path.join(self.tmp_dir, 'profile.json')
+        response = self.fb.stream_to_file(PROFILE_URL, path, chunk_size=4)
+        self.assertEqual((200, len(PROFILE)), (response.status_code, response.size))
+        self.assertEqual('application/json', response.headers['Content-Type'])
+        with open(path, 'rb') as f:
+            self.assertEqual(PROFILE, f.read())
+        self.assertEqual(['profile.json'], os.listdir(self.tmp_dir))
+
+        f = io.BytesIO()
+        self.fb.stream_to_file(PROFILE_URL, f)
+        self.assertEqual(PROFILE, f.getvalue())
+        self.assertEqual('Bearer a',
+                         self.transport.requests[-1]['headers']['Authorization'])
+
+    def test_stream_errors(self):
+        path = os.path.join(self.tmp_dir, 'missing.json')
+        url = Fitbit.API_ENDPOINT + '/1/missing.json'
+        self.assertRaises(HTTPNotFound, self.fb.stream_to_file, url, path)
+        self.assertFalse(os.path.exists(path))
+
+        self.fb.rate_limiter = mock.MagicMock()
+        self.transport.add('GET', url, status_code=429,
+                           headers={'Retry-After': '30'})
+        self.assertRaises(HTTPTooManyRequests, self.fb.stream_to_file, url, path)
+        self.fb.rate_limiter.block.assert_called_once_with(
+            self.fb._user_key(), 30)
+
+    def test_stream_interrupted(self):
+        # The partly written file is removed
+        def iter_bytes(chunk_size):
+            yield PROFILE[:4]
+            raise Timeout('Timed out')
+        response = Response(200, PROFILE)
+        response.iter_bytes = iter_bytes
+        self.transport.responses[('GET', PROFILE_URL)] = lambda request: response
+        path = os.path.join(self.tmp_dir, 'profile.json')
+        self.assertRaises(Timeout, self.fb.stream_to_file, PROFILE_URL, path)
+        self.assertEqual([], os.listdir(self.tmp_dir))
+
+    def test_stream_refresh(self):
+        # A 401 for an expired token refreshes it and tries again
+        responses = [
+            Response(401, json.dumps({'errors': [{
+                'errorType': 'expired_token', 'message': 'Expired'
+            }]}).encode('utf8')),
+            Response(200, PROFILE),
+        ]
+        self.transport.responses[('GET', PROFILE_URL)] = lambda request: responses.pop(0)
+        self.fb.client.refresh_cb = mock.MagicMock()
+        token = {'access_token': 'new_access_token', 'refresh_token': 'new_refresh_token'}
+        f = io.BytesIO()
+        with requests_mock.mock() as m:
+            m.post(self.fb.client.refresh_token_url, text=json.dumps(token))
+            self.fb.stream_to_file(PROFILE_URL, f)
+        self.assertEqual(PROFILE, f.getvalue())
+        self.assertEqual(['Bearer a', 'Bearer new_access_token'], [
+            request['headers']['Authorization'] for request in self.transport.requests])
+
+    def test_session_stream(self):
+        # Without a transport, through the requests session
+        fb = Fitbit('x', 'y', access_token='a', refresh_token='r')
+        f = io.BytesIO()
+        with requests_mock.mock() as m:
+            m.get(PROFILE_URL, content=PROFILE)
+            fb.stream_to_file(PROFILE_URL, f)
+            self.assertEqual(PROFILE,
+                             fb.make_request(PROFILE_URL, raw=True).content)
+        self.assertEqual(PROFILE, f.getvalue())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({
+            'path': self.path,
+            'authorization': self.headers.get('Authorization'),
+        }).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(201)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TransportTest(TestCase):
+    """ Tests for the transports themselves, against a local server """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), _Handler)
+        cls.url = 'http://127.0.0.1:%s/1/foods.json' % cls.server.server_port
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def check_transport(self, transport):
+        try:
+            response = transport.send('GET', self.url, headers={'Authorization': 'Bearer a'})
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({'path': '/1/foods.json', 'authorization': 'Bearer a'},
+                             json.loads(response.content.decode('utf8')))
+            response = transport.send('POST', self.url, data={'a': 1, 'b': ['c', 'd']})
+            self.assertEqual(201, response.status_code)
+            self.assertEqual(b'a=1&b=c&b=d', response.content)
+            with transport.stream('GET', self.url) as response:
+                self.assertEqual(200, response.status_code)
+                content = b''.join(response.iter_bytes(4))
+            self.assertEqual('/1/foods.json', json.loads(content.decode('utf8'))['path'])
+        finally:
+            transport.close()
+
+    def test_requests(self):
+        self.check_transport(RequestsTransport())
+
+    def test_urllib3(self):
+        self.check_transport(Urllib3Transport())
+
+    @skipIf(httpx is None, 'httpx is not installed')
+    def test_httpx(self):
+        self.check_transport(HttpxTransport())
+
+    def test_requests_timeout(self):
+        transport = RequestsTransport()
+        with requests_mock.mock() as m:
+            m.get(PROFILE_URL, exc=requests.Timeout('Timed out'))
+            self.assertRaises(Timeout, transport.send, 'GET', PROFILE_URL)
+
+    @skipIf(httpx is None or h2 is None, 'httpx[http2] is not installed')
+    def test_httpx_http2(self):
+        # Over plain HTTP, httpx falls back to HTTP/1.1
+        transport = HttpxTransport(http2=True)
+        self.assertTrue(transport.client._transport._pool._http2)
+        self.check_transport(transport)
+
+    @skipIf(httpx is None or h2 is None, 'httpx[http2] is not installed')
+    def test_http2_shortcut(self):
+        fb = Fitbit('x', 'y', http2=True)
+        self.assertIsInstance(fb.client.transport, HttpxTransport)
+        self.assertTrue(fb.client.transport.client._transport._pool._http2)
+        # User handles multiplex over the same connections
+        self.assertIs(fb.client.transport, fb.for_user('a', 'r').client.transport)
+
+    @skipIf(httpx is None, 'httpx is not installed')
+    def test_httpx_timeout(self):
+        def handler(request):
+            raise httpx.ReadTimeout('Timed out', request=request)
+        transport = HttpxTransport(client=httpx.Client(transport=httpx.MockTransport(handler)))
+        self.assertRaises(Timeout, transport.send, 'GET', PROFILE_URL)
+
+    def test_stub(self):
+        transport = StubTransport()
+        self.assertEqual(404, transport.send('GET', PROFILE_URL).status_code)
+        with transport.stream('GET', PROFILE_URL) as response:
+            self.assertEqual(b'{"errors": []}', b''.join(response.iter_bytes(3)))